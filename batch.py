@@ -0,0 +1,164 @@
+"""
+This file runs simulations without pygame.
+A batch run builds a simulation from its parameters and steps it as fast as possible until one of its stopping
+criteria is met, by default when nobody is infected, returning the number of susceptible, infected and recovered
+people after every frame. Run this file directly to use it from the command line, for example:
+
+    python batch.py --families 20 --family-size 50 --initial-infected 5 --output run.csv
+"""
+from __future__ import annotations
+import argparse
+import csv
+import sys
+from typing import Optional
+from mobility import MOBILITY_MODELS, make_mobility
+from recording import Recorder
+from simulation import Simulation, WORLD_SIZE
+from stopping import MaxFrames, StoppingCriterion, add_stopping_arguments, criteria_from_arguments, \
+    default_criteria, first_met
+from vector_simulation import VectorSimulation
+
+
+def build_simulation(num_family: int, family_size: int, speed: int, recover_period: int, initial_infected: int,
+                     close_contact_distance: int, fps: int, infectivity: float, brownian: bool = False,
+                     vectorized: bool = False, seed: Optional[int] = None, recovery_shape: Optional[float] = None,
+                     world_size: int = WORLD_SIZE, mobility: Optional[str] = None) -> Simulation | VectorSimulation:
+    """Return a new simulation with the given parameters. The parameters mean the same as in Simulation, so
+    recover_period is in frames, except that mobility is the name of a mobility model in MOBILITY_MODELS, with its
+    default parameters. If vectorized is True, return a VectorSimulation instead of a Simulation.
+
+    Preconditions:
+    - initial_infected <= num_family * family_size
+    """
+    engine = VectorSimulation if vectorized else Simulation
+    return engine(num_family, family_size, speed, recover_period, initial_infected, close_contact_distance, fps,
+                  infectivity, brownian, seed, recovery_shape, world_size,
+                  None if mobility is None else make_mobility(mobility))
+
+
+def run_until_done(simulation: Simulation | VectorSimulation, max_frames: Optional[int] = None,
+                   recorder: Optional[Recorder] = None,
+                   criteria: Optional[list[StoppingCriterion]] = None) -> list[tuple[int, int, int]]:
+    """Step simulation until one of criteria is met and return its (susceptible, infected, recovered) counts,
+    starting with the counts before the first frame. If criteria is None, stop when nobody is infected. Either way,
+    if max_frames is not None, also stop once the simulation reaches frame max_frames. If recorder is not None,
+    every frame, including the one before the first step, is recorded with it.
+
+    Preconditions:
+    - max_frames is None or max_frames >= 0
+    """
+    if criteria is None:
+        criteria = default_criteria(max_frames)
+    elif max_frames is not None:
+        criteria = criteria + [MaxFrames(max_frames)]
+    series = [simulation.counts()]
+    if recorder is not None:
+        recorder.record(simulation.snapshot())
+    while first_met(criteria, simulation.frame_num, series) is None:
+        simulation.frame()
+        series.append(simulation.counts())
+        if recorder is not None:
+            recorder.record(simulation.snapshot())
+    return series
+
+
+def run_headless(num_family: int, family_size: int, speed: int, recover_period: int, initial_infected: int,
+                 close_contact_distance: int, fps: int, infectivity: float, brownian: bool = False,
+                 vectorized: bool = False, max_frames: Optional[int] = None, seed: Optional[int] = None,
+                 recovery_shape: Optional[float] = None, world_size: int = WORLD_SIZE,
+                 criteria: Optional[list[StoppingCriterion]] = None,
+                 mobility: Optional[str] = None) -> list[tuple[int, int, int]]:
+    """Build a simulation with the given parameters, run it until one of criteria is met, as in run_until_done,
+    and return the (susceptible, infected, recovered) counts for every frame.
+
+    Preconditions:
+    - initial_infected <= num_family * family_size
+    """
+    simulation = build_simulation(num_family, family_size, speed, recover_period, initial_infected,
+                                  close_contact_distance, fps, infectivity, brownian, vectorized, seed, recovery_shape,
+                                  world_size, mobility)
+    return run_until_done(simulation, max_frames, criteria=criteria)
+
+
+def summarize(series: list[tuple[int, int, int]]) -> dict[str, float]:
+    """Return the headline numbers of one run from its (susceptible, infected, recovered) counts:
+    - peak_infected: the most people infected at once
+    - time_to_peak: the first frame with peak_infected people infected
+    - attack_rate: the fraction of people who were infected at some point by the last frame
+    - duration: the number of frames the run lasted
+
+    Preconditions:
+    - series != []
+    """
+    infected = [counts[1] for counts in series]
+    peak = max(infected)
+    population = sum(series[0])
+    return {
+        'peak_infected': peak,
+        'time_to_peak': infected.index(peak),
+        'attack_rate': (population - series[-1][0]) / population if population > 0 else 0.0,
+        'duration': len(series) - 1
+    }
+
+
+def parse_arguments(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    """Return the command line arguments of a batch run. The defaults are the defaults of the pygame inputs, with
+    the recovery period and speed converted the same way Runner converts them.
+    """
+    parser = argparse.ArgumentParser(description='Run one simulation without a display.')
+    parser.add_argument('--families', type=int, default=5, help='number of families')
+    parser.add_argument('--family-size', type=int, default=5, help='number of people in each family')
+    parser.add_argument('--speed', type=int, default=6, help='pixels moved per frame')
+    parser.add_argument('--recover-period', type=int, default=72, help='frames until a person recovers')
+    parser.add_argument('--recovery-shape', type=float, default=None,
+                        help='draw each recovery period from a gamma distribution with this shape')
+    parser.add_argument('--initial-infected', type=int, default=1, help='number of people infected at the start')
+    parser.add_argument('--close-contact-distance', type=int, default=100, help='close contact distance in pixels')
+    parser.add_argument('--world-size', type=int, default=WORLD_SIZE, help='side of the square people move in')
+    parser.add_argument('--fps', type=int, default=24, help='frames per second of the simulation')
+    parser.add_argument('--infectivity', type=float, default=0.2, help='the rate of infection')
+    parser.add_argument('--brownian', action='store_true', help='move people in brownian motion')
+    parser.add_argument('--mobility', choices=list(MOBILITY_MODELS), default=None,
+                        help='move people with this mobility model instead')
+    parser.add_argument('--vectorized', action='store_true', help='use VectorSimulation')
+    parser.add_argument('--max-frames', type=int, default=None, help='stop after this many frames')
+    add_stopping_arguments(parser)
+    parser.add_argument('--seed', type=int, default=None, help='seed for the random numbers of the run')
+    parser.add_argument('--output', default=None, help='CSV file to write, instead of standard output')
+    parser.add_argument('--profile', default=None, help='JSON file to export the frame profile of the run to')
+    parser.add_argument('--record', default=None, help='file to record every frame of the run to, for replay')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Run one simulation from the command line arguments and write frame, susceptible, infected and recovered
+    as CSV, along with the frame profile and the recording if they were asked for.
+    """
+    args = parse_arguments(argv)
+    simulation = build_simulation(args.families, args.family_size, args.speed, args.recover_period,
+                                  args.initial_infected, args.close_contact_distance, args.fps, args.infectivity,
+                                  args.brownian, args.vectorized, args.seed, args.recovery_shape, args.world_size,
+                                  args.mobility)
+    profiler = simulation.enable_profiling() if args.profile is not None else None
+    recorder = Recorder(args.record, args.families, args.family_size, args.world_size) \
+        if args.record is not None else None
+    try:
+        series = run_until_done(simulation, recorder=recorder, criteria=criteria_from_arguments(args))
+    finally:
+        if recorder is not None:
+            recorder.close()
+    if profiler is not None:
+        profiler.export(args.profile)
+    output = sys.stdout if args.output is None else open(args.output, 'w', newline='', encoding='utf-8')
+    try:
+        writer = csv.writer(output)
+        writer.writerow(['frame', 'susceptible', 'infected', 'recovered'])
+        for frame, counts in enumerate(series):
+            writer.writerow([frame, *counts])
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+This file contains benchmarks for the simulation backend. Run it directly to print how the time per frame grows
+with the population for both Simulation and VectorSimulation, how long each mobility model takes to move everyone,
+the memory the simulations use and how long importing them takes next to importing the GUI.
+"""
+from __future__ import annotations
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Optional
+import numpy as np
+from mobility import MOBILITY_MODELS, make_mobility
+from simulation import NODE_RADIUS, WORLD_SIZE, Simulation
+from vector_simulation import VectorSimulation
+
+FAMILY_SIZE = 10
+# What print_startup times importing, as (label, modules, extra environment variables)
+STARTUP_CASES = [
+    ('simulation', ['simulation'], {}),
+    ('backend', ['simulation', 'vector_simulation', 'batch', 'checkpoint'], {}),
+    ('main', ['main'], {}),
+    ('frontend', ['frontend'], {}),
+    ('frontend, debug', ['frontend'], {'SIMULATION_DEBUG': '1'})
+]
+BASE_POPULATION = 1000
+BASE_CLOSE_CONTACT_DISTANCE = 20
+
+
+def time_frames(population: int, frames: int, close_contact_distance: int, vectorized: bool = False) -> float:
+    """Return the average number of seconds one frame takes for a simulation with population people, about a
+    third of whom start infected. If vectorized is True, time VectorSimulation instead of Simulation.
+
+    Preconditions:
+    - population >= FAMILY_SIZE
+    - frames >= 1
+    - close_contact_distance >= 1
+    """
+    num_family = population // FAMILY_SIZE
+    engine = VectorSimulation if vectorized else Simulation
+    simulation = engine(num_family, FAMILY_SIZE, 5, 10 * frames, num_family * FAMILY_SIZE // 3,
+                        close_contact_distance, 24, 0.2)
+    start = time.perf_counter()
+    for _ in range(frames):
+        simulation.frame()
+    return (time.perf_counter() - start) / frames
+
+
+def benchmark_scaling(populations: list[int], frames: int = 10,
+                      vectorized: bool = False) -> list[tuple[int, float]]:
+    """Return (population, seconds per frame) for every population in populations.
+
+    The simulation square does not grow with the population, so the close contact distance shrinks as the
+    population grows to keep the expected number of people in range of each patient the same. With a constant
+    number of contacts per patient the frame time should grow about linearly with the population.
+
+    Preconditions:
+    - all(population >= FAMILY_SIZE for population in populations)
+    """
+    results = []
+    for population in populations:
+        distance = max(1, round(BASE_CLOSE_CONTACT_DISTANCE * (BASE_POPULATION / population) ** 0.5))
+        results.append((population, time_frames(population, frames, distance, vectorized)))
+    return results
+
+
+def print_scaling(populations: list[int], vectorized: bool = False) -> None:
+    """Print the frame times for each population in populations, along with the time per person."""
+    print('VectorSimulation' if vectorized else 'Simulation')
+    print(f'{"population":>12}{"ms/frame":>12}{"us/person":>12}')
+    for population, seconds in benchmark_scaling(populations, vectorized=vectorized):
+        print(f'{population:>12}{seconds * 1000:>12.2f}{seconds * 1e6 / population:>12.2f}')
+
+
+def time_mobility(name: str, population: int, frames: int = 20) -> float:
+    """Return the average number of seconds the mobility model called name takes to move population people one
+    frame, in a world of WORLD_SIZE pixels.
+
+    Preconditions:
+    - name in MOBILITY_MODELS
+    - population >= 1 and frames >= 1
+    """
+    rng = np.random.default_rng(0)
+    positions = rng.uniform(NODE_RADIUS, WORLD_SIZE - NODE_RADIUS, size=(population, 2))
+    speeds = np.full(population, 5.0)
+    model = make_mobility(name)
+    model.start(positions, speeds, np.arange(population) // FAMILY_SIZE + 1, rng, NODE_RADIUS,
+                WORLD_SIZE - NODE_RADIUS)
+    start = time.perf_counter()
+    for _ in range(frames):
+        positions = model.move(positions, speeds, rng, NODE_RADIUS, WORLD_SIZE - NODE_RADIUS)
+    return (time.perf_counter() - start) / frames
+
+
+def print_mobility(population: int) -> None:
+    """Print the time every mobility model takes to move population people one frame, along with the time per
+    person.
+    """
+    print(f'{"mobility":>12}{"ms/frame":>12}{"ns/person":>12}')
+    for name in MOBILITY_MODELS:
+        seconds = time_mobility(name, population)
+        print(f'{name:>12}{seconds * 1000:>12.2f}{seconds * 1e9 / population:>12.1f}')
+
+
+def memory_per_10k(num_family: int, family_size: int, vectorized: bool = False) -> float:
+    """Return the megabytes allocated to build a simulation of num_family families of family_size people, scaled
+    to 10 000 people.
+
+    Preconditions:
+    - num_family >= 1 and family_size >= 1
+    """
+    engine = VectorSimulation if vectorized else Simulation
+    tracemalloc.start()
+    simulation = engine(num_family, family_size, 5, 100, 1, 20, 24, 0.2)
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del simulation
+    return allocated / 2 ** 20 * 10000 / (num_family * family_size)
+
+
+def print_memory() -> None:
+    """Print the memory used per 10 000 people for families of 10 and of 50 people."""
+    print(f'{"engine":>18}{"family size":>14}{"MB/10k people":>16}')
+    for vectorized in (False, True):
+        for num_family, family_size in ((1000, 10), (200, 50)):
+            megabytes = memory_per_10k(num_family, family_size, vectorized)
+            name = 'VectorSimulation' if vectorized else 'Simulation'
+            print(f'{name:>18}{family_size:>14}{megabytes:>16.2f}')
+
+
+def import_seconds(modules: list[str], environment: Optional[dict[str, str]] = None, repeats: int = 5) -> float:
+    """Return the fewest seconds importing modules took, in a new Python process each time over repeats processes,
+    with environment added to the environment variables. Every process starts with nothing imported, which is the
+    cost of starting a program that imports modules.
+
+    Preconditions:
+    - repeats >= 1
+    """
+    code = ('import time\n'
+            'start = time.perf_counter()\n'
+            f'import {", ".join(modules)}\n'
+            'print(time.perf_counter() - start)')
+    env = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT='1', **(environment or {}))
+    directory = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    for _ in range(repeats):
+        result = subprocess.run([sys.executable, '-c', code], cwd=directory, env=env, capture_output=True, text=True,
+                                check=True)
+        times.append(float(result.stdout.split()[-1]))
+    return min(times)
+
+
+def print_startup() -> None:
+    """Print how long importing the backend takes next to importing the GUI, with and without contract checking."""
+    print(f'{"import":>18}{"ms":>10}')
+    for label, modules, environment in STARTUP_CASES:
+        print(f'{label:>18}{import_seconds(modules, environment) * 1000:>10.1f}')
+
+
+if __name__ == '__main__':
+    print_startup()
+    print_scaling([1000, 2000, 4000, 8000, 16000])
+    print_scaling([10000, 50000, 100000, 200000], vectorized=True)
+    print_mobility(100000)
+    print_memory()
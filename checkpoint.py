@@ -0,0 +1,102 @@
+"""
+This file saves and restores simulations.
+A checkpoint holds the complete state of a Simulation or a VectorSimulation, including its random numbers, in one
+uncompressed NumPy .npz file with a format version, so a run can be stopped and carried on exactly where it was, even
+in another process. A checkpoint can also be forked: each fork continues from the same frame with its own random
+numbers, which answers "what if" questions from the middle of an outbreak. For example:
+
+    python checkpoint.py outbreak.npz --seeds 1 2 3 4 --max-frames 2000
+"""
+from __future__ import annotations
+import argparse
+import csv
+import multiprocessing
+import sys
+from typing import Any, Optional
+import numpy as np
+from batch import run_until_done, summarize
+from simulation import Simulation
+from vector_simulation import VectorSimulation
+
+CHECKPOINT_VERSION = 4
+ENGINES = {'simulation': Simulation, 'vector': VectorSimulation}
+
+
+def save_checkpoint(simulation: Simulation | VectorSimulation, path: str) -> None:
+    """Save the complete state of simulation to a checkpoint file at path."""
+    with open(path, 'wb') as file:
+        np.savez(file, checkpoint_version=CHECKPOINT_VERSION, **simulation.get_state())
+
+
+def load_state(path: str) -> dict[str, Any]:
+    """Return the state saved in the checkpoint file at path, with every number as a Python number and every array
+    as a NumPy array, ready to be restored or forked any number of times.
+    """
+    with np.load(path, allow_pickle=False) as checkpoint:
+        state = {name: checkpoint[name] for name in checkpoint.files}
+    version = int(state.pop('checkpoint_version', -1))
+    if version != CHECKPOINT_VERSION:
+        raise ValueError(f'{path} is a checkpoint of version {version}, but version {CHECKPOINT_VERSION} is needed')
+    return {name: value.item() if value.ndim == 0 else value for name, value in state.items()}
+
+
+def restore(state: dict[str, Any], seed: Optional[int] = None) -> Simulation | VectorSimulation:
+    """Return a simulation of the right engine that carries on from state. If seed is not None, it draws new random
+    numbers from seed instead of the ones the saved simulation would have drawn.
+    """
+    return ENGINES[state['engine']].from_state(state, seed)
+
+
+def load_checkpoint(path: str) -> Simulation | VectorSimulation:
+    """Return the simulation saved in the checkpoint file at path, carrying on exactly where it was saved."""
+    return restore(load_state(path))
+
+
+def fork(state: dict[str, Any], seeds: list[int]) -> list[Simulation | VectorSimulation]:
+    """Return one simulation for each seed, all carrying on from state with different random numbers. The state is
+    read once and only copied into each fork.
+    """
+    return [restore(state, seed) for seed in seeds]
+
+
+def run_fork(task: tuple[str, int, Optional[int]]) -> list[tuple[int, int, int]]:
+    """Load a checkpoint, fork it with one seed and run the fork until nobody is infected, in a worker process.
+    task is (path, seed, max_frames), and the counts of every frame from the checkpoint on are returned.
+    """
+    path, seed, max_frames = task
+    return run_until_done(restore(load_state(path), seed), max_frames)
+
+
+def run_forks(path: str, seeds: list[int], max_frames: Optional[int] = None,
+              processes: Optional[int] = None) -> list[list[tuple[int, int, int]]]:
+    """Run one fork of the checkpoint at path for each seed over a pool of processes, and return the
+    (susceptible, infected, recovered) counts of every frame of each fork, in the order of seeds. max_frames is the
+    frame number each fork stops at, as in run_until_done.
+    """
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(run_fork, [(path, seed, max_frames) for seed in seeds])
+
+
+def parse_arguments(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    """Return the command line arguments for forking a checkpoint."""
+    parser = argparse.ArgumentParser(description='Run forks of a checkpoint with different random numbers.')
+    parser.add_argument('checkpoint', help='checkpoint file saved by save_checkpoint')
+    parser.add_argument('--seeds', type=int, nargs='+', default=list(range(10)), help='one fork per seed')
+    parser.add_argument('--max-frames', type=int, default=None, help='stop every fork at this frame')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes, every core by default')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Run forks of a checkpoint from the command line arguments and print the headline numbers of each fork."""
+    args = parse_arguments(argv)
+    writer = csv.writer(sys.stdout)
+    writer.writerow(['seed', 'peak_infected', 'time_to_peak', 'attack_rate', 'duration'])
+    for seed, series in zip(args.seeds, run_forks(args.checkpoint, args.seeds, args.max_frames, args.processes)):
+        summary = summarize(series)
+        writer.writerow([seed, summary['peak_infected'], summary['time_to_peak'], summary['attack_rate'],
+                         summary['duration']])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+"""
+This file switches runtime contract checking on and off.
+Checking the preconditions and representation invariants of every call is slow, and importing python_ta to do it
+takes longer than importing the whole simulation, so it is off unless the SIMULATION_DEBUG environment variable is
+set to something other than 0. Classes use the check_contracts from here instead of python_ta's:
+
+    SIMULATION_DEBUG=1 python main.py
+"""
+from __future__ import annotations
+import os
+from typing import Any
+
+DEBUG = os.environ.get('SIMULATION_DEBUG', '0') not in ('', '0')
+
+if DEBUG:
+    from python_ta.contracts import check_contracts
+else:
+    def check_contracts(function_or_class: Any) -> Any:
+        """Return function_or_class unchanged, since contract checking is off."""
+        return function_or_class
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['os', 'python_ta.contracts'],  # the names (strs) of imported modules
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'disable': ['E9999'],
+        'max-line-length': 120
+    })
@@ -0,0 +1,415 @@
+"""
+This file runs Monte Carlo ensembles.
+An ensemble runs many replicates of one set of parameters over a pool of processes, each with its own seed, and
+folds the (susceptible, infected, recovered) counts of every frame of every replicate into running statistics as the
+replicates finish: the mean and variance by Welford's method and quantiles from a histogram of each frame. No
+trajectory is kept once it has been folded in, so the memory an ensemble takes depends on how many frames the
+replicates last and not on how many replicates there are.
+
+An ensemble can also stop early, once the confidence interval of the mean of one of the headline numbers of a run,
+such as the attack rate, is narrower than a tolerance. For example:
+
+    python ensemble.py --families 20 --family-size 50 --replicates 1000 --output ensemble.csv
+    python ensemble.py --families 20 --family-size 50 --replicates 1000 --metric attack_rate --tolerance 0.01
+"""
+from __future__ import annotations
+import argparse
+import csv
+import multiprocessing
+import sys
+from typing import Any, Callable, Optional
+import numpy as np
+from batch import run_headless, summarize
+from mobility import MOBILITY_MODELS
+from simulation import WORLD_SIZE
+from stopping import StoppingCriterion, add_stopping_arguments, criteria_from_arguments
+from sweep import DEFAULT_PARAMETERS, METRICS, replicate_seed
+
+# The most histogram bins kept for each frame and state; populations smaller than this get one bin per count
+MAX_BINS = 64
+# The quantiles written by main, and the ones the frontend shades between
+LOWER_QUANTILE, UPPER_QUANTILE = 0.05, 0.95
+STATE_NAMES = ['susceptible', 'infected', 'recovered']
+# The fewest replicates an ensemble finishes before it may stop early, so the first few runs, which are the quickest
+# ones to finish, cannot end it
+MIN_REPLICATES = 30
+
+
+class EnsembleStatistics:
+    """Running statistics of the (susceptible, infected, recovered) counts of every frame over the replicates of an
+    ensemble. A replicate that ends before the others stays at its last counts for the frames after it ends, since
+    nothing changes once nobody is infected, so every frame has a value from every replicate added.
+
+    Quantiles come from a histogram of MAX_BINS bins per frame and state, so they are exact to within one bin,
+    population / MAX_BINS people, however many replicates are added.
+
+    Instance Attributes:
+    - population: the number of people in every replicate
+    - count: the number of replicates added
+
+    Private Instance Attributes:
+    - _bins: the number of histogram bins per frame and state
+    - _mean: a (frames, 3) array of the mean counts of every frame
+    - _squares: a (frames, 3) array of the sums of squared differences from the mean, as in Welford's method
+    - _histogram: a (frames, 3, _bins) array of how many replicates had counts in each bin in every frame
+    - _final_mean, _final_squares, _final_histogram: the same for the last counts of every replicate, which
+    fill in the frames of the replicates added so far whenever a longer replicate is added
+    - _metric_mean, _metric_squares: the same as _mean and _squares for the headline numbers of every replicate,
+    in the order of METRICS
+
+    Representation Invariants:
+    - self.population > 0
+    - self.count >= 0
+    - self._mean.shape == self._squares.shape == (len(self), 3)
+    - self._histogram.shape == (len(self), 3, self._bins)
+    - (self._histogram.sum(axis=2) == self.count).all()
+    """
+    population: int
+    count: int
+    _bins: int
+    _mean: np.ndarray
+    _squares: np.ndarray
+    _histogram: np.ndarray
+    _final_mean: np.ndarray
+    _final_squares: np.ndarray
+    _final_histogram: np.ndarray
+    _metric_mean: np.ndarray
+    _metric_squares: np.ndarray
+
+    def __init__(self, population: int) -> None:
+        """Initialize statistics of no replicates of the given population."""
+        self.population = population
+        self.count = 0
+        self._bins = min(population + 1, MAX_BINS)
+        self._mean = np.zeros((0, 3))
+        self._squares = np.zeros((0, 3))
+        self._histogram = np.zeros((0, 3, self._bins), dtype=np.int64)
+        self._final_mean = np.zeros(3)
+        self._final_squares = np.zeros(3)
+        self._final_histogram = np.zeros((3, self._bins), dtype=np.int64)
+        self._metric_mean = np.zeros(len(METRICS))
+        self._metric_squares = np.zeros(len(METRICS))
+
+    def __len__(self) -> int:
+        """Return the number of frames of the longest replicate added, counting the frame before the first step."""
+        return len(self._mean)
+
+    def add(self, series: np.ndarray) -> None:
+        """Fold the (susceptible, infected, recovered) counts of every frame of one replicate into the statistics.
+
+        Preconditions:
+        - series.shape[1] == 3 and len(series) > 0
+        - (series.sum(axis=1) == self.population).all()
+        """
+        summary = summarize(series.tolist())
+        metrics = np.array([summary[metric] for metric in METRICS], dtype=np.float64)
+        series = np.asarray(series, dtype=np.float64)
+        if len(series) > len(self):
+            self._extend(len(series))
+        elif len(series) < len(self):
+            series = np.concatenate((series, np.repeat(series[-1:], len(self) - len(series), axis=0)))
+        self.count += 1
+        self._mean, self._squares = welford(self._mean, self._squares, self.count, series)
+        frames = np.arange(len(self))[:, np.newaxis]
+        self._histogram[frames, np.arange(3), self._bin(series)] += 1
+
+        final = series[-1]
+        self._final_mean, self._final_squares = welford(self._final_mean, self._final_squares, self.count, final)
+        self._final_histogram[np.arange(3), self._bin(final)] += 1
+        self._metric_mean, self._metric_squares = welford(self._metric_mean, self._metric_squares, self.count,
+                                                          metrics)
+
+    def _extend(self, frames: int) -> None:
+        """Add frames up to the given number, where every replicate added so far is at its last counts."""
+        extra = frames - len(self)
+        self._mean = np.concatenate((self._mean, np.tile(self._final_mean, (extra, 1))))
+        self._squares = np.concatenate((self._squares, np.tile(self._final_squares, (extra, 1))))
+        self._histogram = np.concatenate((self._histogram, np.tile(self._final_histogram, (extra, 1, 1))))
+
+    def _bin(self, counts: np.ndarray) -> np.ndarray:
+        """Return the histogram bin of every count in counts."""
+        return (counts * self._bins // (self.population + 1)).astype(np.int64)
+
+    def mean(self) -> np.ndarray:
+        """Return a (frames, 3) array of the mean (susceptible, infected, recovered) counts of every frame."""
+        return self._mean.copy()
+
+    def variance(self) -> np.ndarray:
+        """Return a (frames, 3) array of the sample variance of the counts of every frame, or zeros before the
+        second replicate is added.
+        """
+        if self.count < 2:
+            return np.zeros_like(self._squares)
+        return self._squares / (self.count - 1)
+
+    def confidence_interval(self, z: float = 1.96) -> tuple[np.ndarray, np.ndarray]:
+        """Return the (lower, upper) bounds of the confidence interval of the mean counts of every frame, z standard
+        errors either side of the mean. The default z gives a 95% interval.
+        """
+        error = z * np.sqrt(self.variance() / max(self.count, 1))
+        return self._mean - error, self._mean + error
+
+    def metric_interval(self, metric: str, z: float = 1.96) -> tuple[float, float]:
+        """Return the mean of metric, one of METRICS, over the replicates, and the half width of its confidence
+        interval, z standard errors. The half width is infinite before the second replicate is added.
+        """
+        i = METRICS.index(metric)
+        if self.count < 2:
+            return float(self._metric_mean[i]), float('inf')
+        return float(self._metric_mean[i]), z * float(np.sqrt(self._metric_squares[i] / (self.count - 1) / self.count))
+
+    def quantile(self, q: float) -> np.ndarray:
+        """Return a (frames, 3) array of the q quantile of the counts of every frame, interpolated within the
+        histogram bin it falls in.
+
+        Preconditions:
+        - 0 <= q <= 1
+        - self.count > 0
+        """
+        cumulative = np.cumsum(self._histogram, axis=2)
+        target = q * self.count
+        # The first bin whose cumulative count reaches the target
+        bins = np.minimum((cumulative < target).sum(axis=2), self._bins - 1)
+        in_bin = np.take_along_axis(self._histogram, bins[..., np.newaxis], axis=2)[..., 0]
+        before = np.take_along_axis(cumulative, bins[..., np.newaxis], axis=2)[..., 0] - in_bin
+        fraction = np.where(in_bin > 0, (target - before) / np.maximum(in_bin, 1), 0.0)
+        # Bin b holds the counts from b * width up to (b + 1) * width, spread evenly from its first count to its last
+        width = (self.population + 1) / self._bins
+        return np.minimum(bins * width + fraction * (width - 1), self.population)
+
+
+def welford(mean: np.ndarray, squares: np.ndarray, count: int, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Return the mean and sum of squared differences from the mean after adding values as the count-th sample,
+    from the ones before it, by Welford's method.
+
+    Preconditions:
+    - count >= 1
+    """
+    delta = values - mean
+    mean = mean + delta / count
+    return mean, squares + delta * (values - mean)
+
+
+def run_replicate(task: tuple[dict[str, Any], int, int, Optional[list[StoppingCriterion]]]) -> tuple[int, np.ndarray]:
+    """Run one replicate in a worker process and return (replicate, counts), where counts are its (susceptible,
+    infected, recovered) counts of every frame as an array. task is (parameters, replicate, seed, criteria), where
+    criteria are the stopping criteria of the run, or None to stop when nobody is infected.
+    """
+    parameters, replicate, seed, criteria = task
+    return replicate, np.array(run_headless(**parameters, seed=seed, criteria=criteria), dtype=np.int64)
+
+
+class Ensemble:
+    """Replicates of one set of parameters run over a pool of processes, with their statistics kept up to date as
+    they finish.
+
+    If tolerance is not None, the ensemble stops early once at least min_replicates have finished and the 95%
+    confidence interval of the mean of metric is no more than tolerance either side of the mean. Replicates finish
+    in no set order, and the ones that finish first tend to be the short ones, which is what min_replicates guards
+    against.
+
+    The pool is made with the spawn start method, so an ensemble can be started from the frontend, which has a
+    display and a worker thread that a forked process must not inherit.
+
+    Instance Attributes:
+    - parameters: the parameters of run_headless every replicate runs with
+    - replicates: the number of replicates
+    - base_seed: the seed the seed of every replicate is derived from
+    - processes: the number of worker processes, or None to use every core
+    - criteria: the stopping criteria of every replicate, or None to run each until nobody is infected
+    - metric: the headline number, one of METRICS, whose confidence interval decides when to stop early
+    - tolerance: the half width of the confidence interval of metric to stop at, or None to run every replicate
+    - min_replicates: the fewest replicates to finish before stopping early
+    - statistics: the EnsembleStatistics of the replicates finished so far
+
+    Private Instance Attributes:
+    - _pool: the pool the replicates run in, or None when the ensemble is not running
+    - _results: an iterator over (replicate, counts) of the replicates as they finish, or None when not running
+    - _done: the replicates folded into statistics, so a restart only runs the others
+
+    Representation Invariants:
+    - self.replicates >= 1
+    - self.processes is None or self.processes >= 1
+    - 0 <= self.statistics.count <= self.replicates
+    - self.statistics.count == len(self._done)
+    - self.metric in METRICS
+    - self.tolerance is None or self.tolerance > 0
+    """
+    parameters: dict[str, Any]
+    replicates: int
+    base_seed: int
+    processes: Optional[int]
+    criteria: Optional[list[StoppingCriterion]]
+    metric: str
+    tolerance: Optional[float]
+    min_replicates: int
+    statistics: EnsembleStatistics
+    _pool: Optional[multiprocessing.pool.Pool]
+    _results: Optional[Any]
+    _done: set[int]
+
+    def __init__(self, parameters: dict[str, Any], replicates: int, base_seed: int = 0,
+                 processes: Optional[int] = None, criteria: Optional[list[StoppingCriterion]] = None,
+                 metric: str = 'attack_rate', tolerance: Optional[float] = None,
+                 min_replicates: int = MIN_REPLICATES) -> None:
+        """Initialize the ensemble, filling in DEFAULT_PARAMETERS for the parameters that are not given."""
+        self.parameters = dict(DEFAULT_PARAMETERS)
+        self.parameters.update(parameters)
+        self.replicates = replicates
+        self.base_seed = base_seed
+        self.processes = processes
+        self.criteria = criteria
+        self.metric = metric
+        self.tolerance = tolerance
+        self.min_replicates = min_replicates
+        self.statistics = EnsembleStatistics(self.parameters['num_family'] * self.parameters['family_size'])
+        self._pool = None
+        self._results = None
+        self._done = set()
+
+    def start(self) -> None:
+        """Start running the replicates that have not finished yet in the background. Their counts are folded into
+        statistics by poll. Replicates finish in no set order, so after close the ones still missing are not
+        necessarily the last ones.
+        """
+        if self._pool is not None or self.finished():
+            return
+        tasks = [(self.parameters, replicate, replicate_seed(self.base_seed, self.parameters, replicate),
+                  self.criteria) for replicate in range(self.replicates) if replicate not in self._done]
+        self._pool = multiprocessing.get_context('spawn').Pool(self.processes)
+        self._results = self._pool.imap_unordered(run_replicate, tasks)
+
+    def poll(self) -> int:
+        """Fold every replicate that has finished since the last call into statistics without waiting, and return
+        how many there were. The pool is closed once every replicate has finished or the ensemble has converged.
+        """
+        added = 0
+        while self._results is not None:
+            try:
+                replicate, series = self._results.next(timeout=0)
+            except multiprocessing.TimeoutError:
+                break
+            except StopIteration:
+                self.close()
+                break
+            self._add(replicate, series)
+            added += 1
+            if self.converged():
+                self.close()
+        return added
+
+    def run(self, on_replicate: Optional[Callable[[EnsembleStatistics], None]] = None) -> EnsembleStatistics:
+        """Run every replicate that has not finished yet, or until the ensemble converges, and return the
+        statistics. on_replicate is called with the statistics after each replicate is folded in.
+
+        If the user presses Ctrl+C, the worker processes are stopped and the statistics of the replicates finished
+        so far are returned.
+        """
+        self.start()
+        if self._results is None:
+            # Every replicate has finished or the ensemble has converged already
+            return self.statistics
+        try:
+            for replicate, series in self._results:
+                self._add(replicate, series)
+                if on_replicate is not None:
+                    on_replicate(self.statistics)
+                if self.converged():
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.close()
+        return self.statistics
+
+    def _add(self, replicate: int, series: np.ndarray) -> None:
+        """Fold the counts of a finished replicate into statistics."""
+        self.statistics.add(series)
+        self._done.add(replicate)
+
+    def converged(self) -> bool:
+        """Return whether the ensemble can stop early, because at least min_replicates have finished and the
+        confidence interval of metric is within tolerance.
+        """
+        return self.tolerance is not None and self.statistics.count >= self.min_replicates and \
+            self.statistics.metric_interval(self.metric)[1] <= self.tolerance
+
+    def finished(self) -> bool:
+        """Return whether every replicate has finished or the ensemble has converged."""
+        return self.statistics.count == self.replicates or self.converged()
+
+    def close(self) -> None:
+        """Stop the worker processes. Replicates that have not finished are dropped, and start runs them again."""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+        self._pool = None
+        self._results = None
+
+
+def parse_arguments(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    """Return the command line arguments of an ensemble."""
+    parser = argparse.ArgumentParser(description='Run replicates of one simulation and summarize every frame.')
+    parser.add_argument('--families', type=int, default=5, help='number of families')
+    parser.add_argument('--family-size', type=int, default=5, help='number of people in each family')
+    parser.add_argument('--speed', type=int, default=6, help='pixels moved per frame')
+    parser.add_argument('--recover-period', type=int, default=72, help='frames until a person recovers')
+    parser.add_argument('--recovery-shape', type=float, default=None,
+                        help='draw each recovery period from a gamma distribution with this shape')
+    parser.add_argument('--initial-infected', type=int, default=1, help='number of people infected at the start')
+    parser.add_argument('--close-contact-distance', type=int, default=100, help='close contact distance in pixels')
+    parser.add_argument('--world-size', type=int, default=WORLD_SIZE, help='side of the square people move in')
+    parser.add_argument('--fps', type=int, default=24, help='frames per second of the simulation')
+    parser.add_argument('--infectivity', type=float, default=0.2, help='the rate of infection')
+    parser.add_argument('--brownian', action='store_true', help='move people in brownian motion')
+    parser.add_argument('--mobility', choices=list(MOBILITY_MODELS), default=None,
+                        help='move people with this mobility model instead')
+    parser.add_argument('--vectorized', action='store_true', help='use VectorSimulation')
+    parser.add_argument('--max-frames', type=int, default=None, help='stop every replicate after this many frames')
+    add_stopping_arguments(parser)
+    parser.add_argument('--replicates', type=int, default=100, help='number of replicates')
+    parser.add_argument('--seed', type=int, default=0, help='the seed every replicate seed is derived from')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes, every core by default')
+    parser.add_argument('--metric', choices=METRICS, default='attack_rate',
+                        help='the headline number whose confidence interval --tolerance applies to')
+    parser.add_argument('--tolerance', type=float, default=None,
+                        help='stop once the 95%% confidence interval of --metric is this narrow either side')
+    parser.add_argument('--min-replicates', type=int, default=MIN_REPLICATES,
+                        help='the fewest replicates to run before stopping early')
+    parser.add_argument('--output', default=None, help='CSV file to write, instead of standard output')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Run an ensemble from the command line arguments and write the mean, standard deviation and quantiles of
+    every state in every frame as CSV, and the mean of the metric with its confidence interval to standard error.
+    """
+    args = parse_arguments(argv)
+    ensemble = Ensemble({'num_family': args.families, 'family_size': args.family_size, 'speed': args.speed,
+                         'recover_period': args.recover_period, 'recovery_shape': args.recovery_shape,
+                         'initial_infected': args.initial_infected,
+                         'close_contact_distance': args.close_contact_distance, 'world_size': args.world_size,
+                         'fps': args.fps, 'infectivity': args.infectivity,
+                         'brownian': args.brownian, 'vectorized': args.vectorized, 'mobility': args.mobility},
+                        args.replicates, args.seed, args.processes, criteria_from_arguments(args), args.metric,
+                        args.tolerance, args.min_replicates)
+    statistics = ensemble.run()
+    mean, half_width = statistics.metric_interval(args.metric)
+    print(f'{statistics.count} replicates, {args.metric} {mean:.4f} +/- {half_width:.4f}', file=sys.stderr)
+    columns = [statistics.mean(), np.sqrt(statistics.variance()), statistics.quantile(LOWER_QUANTILE),
+               statistics.quantile(0.5), statistics.quantile(UPPER_QUANTILE)]
+    output = sys.stdout if args.output is None else open(args.output, 'w', newline='', encoding='utf-8')
+    try:
+        writer = csv.writer(output)
+        writer.writerow(['frame'] + [f'{name}_{statistic}' for name in STATE_NAMES
+                                     for statistic in ('mean', 'std', 'p05', 'p50', 'p95')])
+        for frame in range(len(statistics)):
+            writer.writerow([frame] + [round(float(column[frame, state]), 3) for state in range(3)
+                                       for column in columns])
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+if __name__ == '__main__':
+    main()
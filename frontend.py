@@ -2,17 +2,26 @@
 
 This file contains all the code for the front end, as well as the Runner class that runs the entire
 project by connecting the front end to the back end
+
+Importing this file does not open a window: the display is only made when a Runner is, so the classes and
+functions here can be imported without a screen.
 """
 from __future__ import annotations
 from typing import Optional
-from collections import deque
-import math
+import colorsys
+import time
+import numpy as np
 import pygame as py
 import pygame.event
-from python_ta.contracts import check_contracts
-from simulation import Simulation as sim
-from person_edge import INFECTED, SUSCEPTIBLE, RECOVERED
-from graph import Graph
+from batch import build_simulation
+from debug import check_contracts
+from ensemble import Ensemble, EnsembleStatistics, LOWER_QUANTILE, UPPER_QUANTILE
+from simulation import WORLD_SIZE
+from person_edge import INFECTED, RECOVERED
+from profiler import FrameProfiler
+from recording import Recorder, Recording
+from snapshot import Snapshot
+from worker import SimulationWorker
 
 # Colours
 BLACK = (0, 0, 0)
@@ -20,12 +29,14 @@ BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
 # Infected Colour
 RED = (255, 0, 0)
-# Node Colours (20 of them, 1 per family)
+# Node Colours (1 per family for the first 20 families, after which family_colour makes them up)
 SKY_BLUE = (95, 165, 228)
 GREEN = (0, 255, 0)
 COLORS = [(0, 255, 0), (0, 0, 255), (255, 255, 0), (0, 255, 255), (255, 0, 255), (192, 192, 192), (128, 128, 128),
           (128, 0, 0), (128, 128, 0), (0, 128, 0), (128, 0, 128), (0, 128, 128), (0, 0, 128), (205, 133, 63),
           (255, 250, 240), (230, 230, 250), (123, 104, 238), (100, 149, 237), (175, 238, 238), (95, 165, 228)]
+# Successive families after COLORS step this far around the colour wheel, which keeps neighbouring families apart
+GOLDEN_RATIO_CONJUGATE = 0.618033988749895
 
 # Parameter Constants
 SCREEN_WIDTH = 1200
@@ -34,17 +45,46 @@ STATS_H, STATS_W = 200, 575
 STACKED_GRAPH_LENGTH, STACKED_GRAPH_HEIGHT = 575, 225
 NODE_RADIUS = 10
 LINE_WIDTH = 1
+# The main graph: a square of VIEW_SIZE pixels on the screen, showing the part of the world the camera looks at
+VIEW_X, VIEW_Y, VIEW_SIZE = 25, 25, 500
+VIEW_RECT = py.Rect(VIEW_X, VIEW_Y, VIEW_SIZE, VIEW_SIZE)
+MAX_ZOOM = 8
+ZOOM_STEP = 1.25
+# Above this many people on screen, edges are not drawn when level of detail is on
+LEVEL_OF_DETAIL_POPULATION = 2000
+# Above this many people on screen, people are drawn as dots instead of circles
+MAX_CIRCLES = 5000
+# Bounds on the inputs
+MAX_FAMILIES = 9999
+MAX_FAMILY_SIZE = 999
+MAX_WORLD_SIZE = 99999
+MIN_WORLD_SIZE = 2 * NODE_RADIUS + 1
+# Above this many people, a new simulation runs on VectorSimulation
+VECTOR_POPULATION = 5000
+# The number of replicates F8 runs of the current inputs
+ENSEMBLE_REPLICATES = 200
 TITLE = 'CSC111 Project'
-
-# Pygame surface initialization
+PROFILE_PATH = 'frame_profile.json'
+RECORDING_PATH = 'recording.bin'
+COUNTER_NAMES = {'pairs_tested', 'edges_created', 'edges_removed', 'infection_trials', 'contacts_found',
+                 'steps'}
+# Fast forward settings, cycled by the speed button: (label, simulation seconds per real second). A multiplier of 0
+# runs the simulation as fast as possible, while the display is still drawn at its own rate.
+SPEEDS = [('1x', 1), ('2x', 2), ('4x', 4), ('16x', 16), ('64x', 64), ('MAX', 0)]
+
+# Pygame surface, made by Runner
 size = (SCREEN_WIDTH, SCREEN_HEIGHT)
-screen = py.display.set_mode(size)
-py.display.set_caption(TITLE)
-stats = py.Surface((STATS_W, STATS_H))
+screen: Optional[py.Surface] = None
 
 # global non constant variables
 button_changed = True
 
+# Fonts by size, and rendered text by (text, font size, colour). Text that never changes is rendered once, and text
+# that does is rendered again only when its value changes.
+fonts = {}
+rendered_text = {}
+MAX_RENDERED_TEXT = 1024
+
 
 @check_contracts
 class Button:
@@ -92,16 +132,13 @@ class Button:
     def update(self) -> None:
         """Redraw this button onto the main screen"""
         a, b = py.mouse.get_pos()
-        comic_sans = py.font.SysFont('arial', 10)
-        text_render = comic_sans.render(self.text, True, self.text_color)
+        text_render = render_text(self.text, 10, self.text_color)
         text_rect = text_render.get_rect(center=((self.w / 2) + self.x,
                                                  (self.h / 2) + self.y))
-        background = py.Surface((self.w, self.h))
         if self.hover and self.x <= a <= self.x + self.w and self.y <= b <= self.y + self.h:
-            background.fill(SKY_BLUE)
+            screen.fill(SKY_BLUE, self.rect)
         else:
-            background.fill(self.background_color)
-        screen.blit(background, (self.x, self.y))
+            screen.fill(self.background_color, self.rect)
         screen.blit(text_render, text_rect)
 
 
@@ -159,86 +196,196 @@ class InputButton(Button):
         self.bounds = new_bounds
 
 
+class Camera:
+    """
+    The part of the world shown in the main graph
+    The world is the square the people move in. The camera shows a square of it VIEW_SIZE / zoom wide in the
+    VIEW_SIZE pixels of the main graph, and can be panned and zoomed. It starts zoomed out to show the whole world.
+
+    Instance Attributes:
+    - world_size: the side of the square the people move in
+    - zoom: screen pixels per pixel of the world
+    - left: the x coordinate in the world shown at the left edge of the view
+    - top: the y coordinate in the world shown at the top edge of the view
+
+    Representation Invariants:
+    - VIEW_SIZE / self.world_size <= self.zoom <= max(MAX_ZOOM, VIEW_SIZE / self.world_size)
+    - 0 <= self.left <= self.world_size - VIEW_SIZE / self.zoom
+    - 0 <= self.top <= self.world_size - VIEW_SIZE / self.zoom
+    """
+    world_size: int
+    zoom: float
+    left: float
+    top: float
+
+    def __init__(self, world_size: int) -> None:
+        """Initializes the camera to show the whole world"""
+        self.fit(world_size)
+
+    def fit(self, world_size: int) -> None:
+        """Shows the whole of a world of the given size"""
+        self.world_size = world_size
+        self.zoom = VIEW_SIZE / world_size
+        self.left, self.top = 0.0, 0.0
+
+    def to_screen(self, positions: np.ndarray) -> np.ndarray:
+        """Returns where on the screen each row of positions, an (n, 2) array of world coordinates, is drawn"""
+        return (positions - (self.left, self.top)) * self.zoom + (VIEW_X, VIEW_Y)
+
+    def visible(self, positions: np.ndarray, margin: float) -> np.ndarray:
+        """Returns a mask of the rows of positions within margin of the part of the world in view, so that
+        everything off screen can be skipped when drawing
+        """
+        span = VIEW_SIZE / self.zoom
+        x, y = positions[:, 0], positions[:, 1]
+        return ((x >= self.left - margin) & (x <= self.left + span + margin)
+                & (y >= self.top - margin) & (y <= self.top + span + margin))
+
+    def pan(self, dx: int, dy: int) -> None:
+        """Moves the world dx and dy screen pixels across the view, as when it is dragged with the mouse"""
+        self.left -= dx / self.zoom
+        self.top -= dy / self.zoom
+        self.clamp()
+
+    def zoom_at(self, x: int, y: int, factor: float) -> None:
+        """Zooms in by factor, or out if factor < 1, keeping the point of the world under the screen position
+        (x, y) where it is
+
+        Preconditions:
+        - factor > 0
+        """
+        world_x = self.left + (x - VIEW_X) / self.zoom
+        world_y = self.top + (y - VIEW_Y) / self.zoom
+        fit_zoom = VIEW_SIZE / self.world_size
+        self.zoom = min(max(self.zoom * factor, fit_zoom), max(MAX_ZOOM, fit_zoom))
+        self.left = world_x - (x - VIEW_X) / self.zoom
+        self.top = world_y - (y - VIEW_Y) / self.zoom
+        self.clamp()
+
+    def clamp(self) -> None:
+        """Keeps the view inside the world"""
+        furthest = max(0.0, self.world_size - VIEW_SIZE / self.zoom)
+        self.left = min(max(self.left, 0.0), furthest)
+        self.top = min(max(self.top, 0.0), furthest)
+
+
 class StackedAreaGraph:
     """
     A class that contains the stacked area graph
+    The graph is kept on its own surface. Each frame the surface scrolls one pixel to the left and only the column
+    of the new frame is drawn, so drawing the graph costs the same however long the history is.
+    When an ensemble of the same parameters is running, its mean is drawn over the graph as two lines, at the top
+    of the infected and of the recovered areas, each in a shaded band between the LOWER_QUANTILE and UPPER_QUANTILE
+    of the replicates finished so far. Column x of the graph shows the same frame for the ensemble as for the
+    simulation.
 
     Private Instance Attributes:
     - _total_population: The total population in the current simulation
-    - _data: The data for the frames up to the current time:
-                     stores a tuple of (# uninfected, # infected, # recovered)
-    - _graph: The graph in the simulation
+    - _data: The data for the frames up to the current time, as a ring buffer with one row per column of the graph:
+                     each row is (# uninfected, # infected, # recovered)
+    - _newest: the index of the row of _data holding the most recent frame
+    - _surface: the graph as it is displayed, with the most recent frame in its rightmost column
+    - _ensemble_surface: the ensemble mean and bands with one column per frame of the ensemble, or None when no
+    ensemble is drawn
 
     Representation Invariants:
     - all(sum(data) == total_population for data in self._data)
+    - 0 <= self._newest < STACKED_GRAPH_LENGTH
     """
     _total_population: int
-    _data: deque[tuple[int, int, int]]
-    _graph: Graph
+    _data: np.ndarray
+    _newest: int
+    _surface: py.Surface
+    _ensemble_surface: Optional[py.Surface]
 
     _infected_colour: tuple[int, int, int] = (255, 0, 0)
     _cured_colour: tuple[int, int, int] = (0, 0, 255)
     _uninfected_colour: tuple[int, int, int] = (220, 220, 220)
+    _ensemble_colour: tuple[int, int, int] = (255, 255, 0)
+    _band_alpha: int = 110
     _stacked_graph_x: int = 600
     _stacked_graph_y: int = 300
 
-    def __init__(self, total_population: int, g: Graph) -> None:
+    def __init__(self, total_population: int) -> None:
         self._total_population = total_population
         # Initialize data to all uninfected
-        self._data = deque([(total_population, 0, 0)] * STACKED_GRAPH_LENGTH)
-        self._graph = g
-
-    def update(self, is_running: bool) -> None:
-        """Updates the graph for the current frame, then draw it
+        self._data = np.zeros((STACKED_GRAPH_LENGTH, 3), dtype=np.int64)
+        self._data[:, 0] = total_population
+        self._newest = STACKED_GRAPH_LENGTH - 1
+        self._surface = py.Surface((STACKED_GRAPH_LENGTH, STACKED_GRAPH_HEIGHT)).convert()
+        self._surface.fill(self._uninfected_colour)
+        self._ensemble_surface = None
+
+    def update(self, is_running: bool, counts: tuple[int, int, int], frame_num: int) -> None:
+        """Updates the graph with the (# uninfected, # infected, # recovered) of the current frame, then draw it,
+        along with the ensemble up to frame_num, the frame of counts
         """
 
         # Only update if the simulation is currently running
         if is_running:
-            self._data.popleft()
-
-            # Calculate the data for the current frame, then add it
-            uninfected = len(self._graph.susceptible)
-            infected = len(self._graph.infected)
-            recovered = len(self._graph.recovered)
+            # Calculate the data for the current frame, then add it in place of the oldest frame
+            self._newest = (self._newest + 1) % STACKED_GRAPH_LENGTH
+            self._data[self._newest] = counts
 
-            new_frame = (uninfected, infected, recovered)
-            self._data.append(new_frame)
+            self._surface.scroll(-1, 0)
+            self.draw_column(STACKED_GRAPH_LENGTH - 1, self._data[self._newest])
 
         # Draw the graph onto the screen
-        for i in range(len(self._data)):
-            current_frame_data = self._data[i]
-            percent_uninfected = current_frame_data[0] / self._total_population
-            percent_infected = current_frame_data[1] / self._total_population
-            percent_recovered = current_frame_data[2] / self._total_population
-
-            height_uninfected = math.floor(percent_uninfected * STACKED_GRAPH_HEIGHT)
-            height_infected = math.floor(percent_infected * STACKED_GRAPH_HEIGHT)
-            height_recovered = math.floor(percent_recovered * STACKED_GRAPH_HEIGHT)
-
-            while height_uninfected + height_infected + height_recovered < STACKED_GRAPH_HEIGHT:
-                height_uninfected += 1
-
-            self.draw_line_in_graph(
-                (self._stacked_graph_x + i, self._stacked_graph_y),
-                height_uninfected, self._uninfected_colour)
-            self.draw_line_in_graph(
-                (self._stacked_graph_x + i,
-                 self._stacked_graph_y + height_uninfected), height_infected,
-                self._infected_colour)
-            self.draw_line_in_graph(
-                (self._stacked_graph_x + i,
-                 self._stacked_graph_y + height_uninfected + height_infected),
-                height_recovered, self._cured_colour)
-
-    def draw_line_in_graph(self, position: tuple[int, int], height: int,
-                           color: tuple[int, int, int]) -> None:
-        """Draws a line of width 1 at position, going down height pixels
+        screen.blit(self._surface, (self._stacked_graph_x, self._stacked_graph_y))
+        if self._ensemble_surface is not None:
+            # Frame frame_num of the ensemble lines up with the rightmost column
+            screen.set_clip(py.Rect(self._stacked_graph_x, self._stacked_graph_y, STACKED_GRAPH_LENGTH,
+                                    STACKED_GRAPH_HEIGHT))
+            screen.blit(self._ensemble_surface,
+                        (self._stacked_graph_x + STACKED_GRAPH_LENGTH - 1 - frame_num, self._stacked_graph_y))
+            screen.set_clip(None)
+
+    def set_ensemble(self, statistics: Optional[EnsembleStatistics]) -> None:
+        """Draws the mean and bands of statistics, the ensemble of the current simulation, over the graph from now
+        on, or stops drawing an ensemble if statistics is None
+
+        Preconditions:
+        - statistics is None or statistics.population == self._total_population
+        """
+        if statistics is None or statistics.count == 0:
+            self._ensemble_surface = None
+            return
+        # The top of the infected area is at the share of uninfected people, and the top of the recovered area at
+        # the share of people not recovered
+        scale = STACKED_GRAPH_HEIGHT / self._total_population
+        mean = statistics.mean()
+        lower = statistics.quantile(LOWER_QUANTILE)
+        upper = statistics.quantile(UPPER_QUANTILE)
+        rows = np.arange(STACKED_GRAPH_HEIGHT)
+        alpha = np.zeros((len(statistics), STACKED_GRAPH_HEIGHT), dtype=np.uint8)
+        for top, bottom, line in ((lower[:, 0] * scale, upper[:, 0] * scale, mean[:, 0] * scale),
+                                  (STACKED_GRAPH_HEIGHT - upper[:, 2] * scale,
+                                   STACKED_GRAPH_HEIGHT - lower[:, 2] * scale,
+                                   STACKED_GRAPH_HEIGHT - mean[:, 2] * scale)):
+            band = (rows >= np.floor(top)[:, np.newaxis]) & (rows <= np.ceil(bottom)[:, np.newaxis])
+            alpha[band] = self._band_alpha
+            line_rows = np.clip(np.rint(line).astype(np.int64), 0, STACKED_GRAPH_HEIGHT - 1)
+            alpha[np.arange(len(statistics)), line_rows] = 255
+
+        surface = py.Surface((len(statistics), STACKED_GRAPH_HEIGHT), py.SRCALPHA)
+        surface.fill(self._ensemble_colour)
+        py.surfarray.pixels_alpha(surface)[:] = alpha
+        self._ensemble_surface = surface
+
+    def draw_column(self, x: int, frame_data: np.ndarray) -> None:
+        """Draws the column of one frame at x on the graph surface, from its (# uninfected, # infected, # recovered)
 
         Preconditons:
-        - height >= 0
+        - 0 <= x < STACKED_GRAPH_LENGTH
         """
-        py.draw.line(screen, color, position,
-                     (position[0], position[1] + height), 1)
+        height_infected = frame_data[1] * STACKED_GRAPH_HEIGHT // self._total_population
+        height_recovered = frame_data[2] * STACKED_GRAPH_HEIGHT // self._total_population
+        # Rounding down leaves a few pixels at the top, which belong to the uninfected
+        height_uninfected = STACKED_GRAPH_HEIGHT - height_infected - height_recovered
+
+        self._surface.fill(self._uninfected_colour, py.Rect(x, 0, 1, height_uninfected))
+        self._surface.fill(self._infected_colour, py.Rect(x, height_uninfected, 1, height_infected))
+        self._surface.fill(self._cured_colour, py.Rect(x, height_uninfected + height_infected, 1, height_recovered))
 
 
 class StatsTable:
@@ -248,18 +395,32 @@ class StatsTable:
 
     Instance Attributes:
     - data_table: stores the data for each family: it has num_families rows, and each row has 4 elements, indicating:
-    [family id, # uninfected, # infected, # recovered]
+    [family id, # uninfected, # infected, # recovered]. Only the rows on display are kept up to date, so a table of
+    thousands of families costs no more each frame than a table of four.
     - num_families: the number of families in the current simulation
-    - graph: the simulation graph
     - current_top_row: the index of the first row that we are displaying
 
+    Private Instance Attributes:
+    - _background: the table background, header and lines, drawn once and blitted every frame
+    - _total_background: the background of the total row, drawn once
+    - _table: the table as it is displayed, a copy of _background with the text of every visible cell on it
+    - _shown: a dictionary mapping (row, column) of a cell on _table to the text drawn in it, so that only the
+    cells whose text changed are redrawn
+    - _total: the total row as it is displayed
+    - _shown_totals: the (susceptible, infected, recovered) totals drawn on _total, or None before the first frame
+
     Representation Invariants:
     - 0 <= current_top_row <= self.num_families - 4
     """
     data_table: list[list[int, int, int, int]]
     num_families: int
-    simulation: sim
     current_top_row: int
+    _background: py.Surface
+    _total_background: py.Surface
+    _table: py.Surface
+    _shown: dict[tuple[int, int], str]
+    _total: py.Surface
+    _shown_totals: Optional[tuple[int, int, int]]
 
     pos_x: int = 600
     pos_y: int = 25
@@ -269,84 +430,103 @@ class StatsTable:
     _header_font_size: int = 25
     _text_font_size: int = 20
 
-    def __init__(self, num_families: int, simulation: sim) -> None:
+    def __init__(self, num_families: int) -> None:
         """Initializes the stats table"""
         self.num_families = num_families
         self.current_top_row = 0
-        self.simulation = simulation
 
         # Initialize the data table with num_families rows with 4 elements each row
         self.data_table = []
         for i in range(num_families):
             self.data_table.append([i, 0, 0, 0])
+        self._background = self.draw_background()
+        self._total_background = self.draw_total_background(6)
+        self._table = self._background.copy()
+        self._shown = {}
+        self._total = self._total_background.copy()
+        self._shown_totals = None
+
+    def draw_background(self) -> py.Surface:
+        """Returns a surface with the table background, the header and the lines, which never change. The surface
+        has a margin of border_line_width around the table so the outer lines fit, and is blitted that far up and
+        to the left of the table.
+        """
+        margin = self.border_line_width
+        background = py.Surface((STATS_W + 2 * margin, STATS_H + 2 * margin), py.SRCALPHA)
+        background.fill(SKY_BLUE, py.Rect(margin, margin, STATS_W, STATS_H))
+        # Drawing header
+        for col, header in enumerate(['Family ID', 'Uninfected', 'Infected', 'Recovered']):
+            text_render = render_text(header, self._header_font_size, BLACK)
+            background.blit(text_render, text_render.get_rect(center=self.cell_center(0, col, margin - self.pos_x,
+                                                                                      margin - self.pos_y)))
+        # Drawing lines
+        for i in range(0, 6):
+            py.draw.line(background, self.line_color, (margin, margin + STATS_H // 5 * i),
+                         (margin + STATS_W, margin + STATS_H // 5 * i), width=self.border_line_width)
+        # Draw the vertical lines for the border
+        for i in range(0, 4):
+            py.draw.line(background, self.line_color, (margin + STATS_W // 4 * i, margin),
+                         (margin + STATS_W // 4 * i, margin + STATS_H), width=self.border_line_width)
+        # Draw the final vertical line
+        py.draw.line(background, self.line_color, (margin + STATS_W, margin),
+                     (margin + STATS_W, margin + STATS_H), width=self.border_line_width)
+        return background.convert_alpha()
 
-    def update(self) -> None:
+    def draw_total_background(self, border_radius: int) -> py.Surface:
+        """Returns the background of the total row: a light border around a sky blue box
+
+        Preconditions:
+        - border_radius % 2 == 0
+        """
+        background = py.Surface((STATS_W, 40))
+        background.fill((220, 220, 220))
+        background.fill(SKY_BLUE, py.Rect(border_radius // 2, border_radius // 2,
+                                          STATS_W - border_radius, 40 - border_radius))
+        return background.convert()
+
+    def cell_center(self, row: int, col: int, offset_x: int = 0, offset_y: int = 0) -> tuple[float, float]:
+        """Returns the center of a cell in the table, moved by (offset_x, offset_y)"""
+        width_cell = STATS_W // 4
+        height_cell = STATS_H // 5
+        return ((width_cell / 2) + self.pos_x + col * width_cell + offset_x,
+                (height_cell / 2) + self.pos_y + row * height_cell + offset_y)
+
+    def update(self, snapshot: Snapshot) -> None:
         """Updates self by:
-        Recalculating values for each family, then redrawing the table with updated values
+        Reading the counts of each family from snapshot, then redrawing the cells whose values changed
         """
-        # Calculate the values for each family
-        for family_id in range(1, self.num_families + 1):
-            uninfected = sum(1 for person in self.simulation.id_to_family[family_id] if person.state == SUSCEPTIBLE)
-            infected = sum(1 for person in self.simulation.id_to_family[family_id] if person.state == INFECTED)
-            recovered = sum(1 for person in self.simulation.id_to_family[family_id] if person.state == RECOVERED)
-            self.data_table[family_id - 1] = [family_id, uninfected, infected, recovered]
+        # The simulation keeps the counts of each family up to date, so reading them is cheap
+        for family_id in range(self.current_top_row + 1, min(self.current_top_row + 4, self.num_families) + 1):
+            self.data_table[family_id - 1] = [family_id, *snapshot.family_count(family_id)]
 
         # Draw total table
-        self.draw_total_table(6)
-        # Drawing the table background
-        stats.fill(SKY_BLUE)
-        screen.blit(stats, (self.pos_x, self.pos_y))
-        # Drawing header
-        self.draw_center_text('Family ID', self._header_font_size, BLACK, 0, 0)
-        self.draw_center_text('Uninfected', self._header_font_size, BLACK, 0, 1)
-        self.draw_center_text('Infected', self._header_font_size, BLACK, 0, 2)
-        self.draw_center_text('Recovered', self._header_font_size, BLACK, 0, 3)
+        self.draw_total_table(6, snapshot.counts)
 
         for i in range(min(len(self.data_table), 4)):
             for j in range(len(self.data_table[i])):
-                self.draw_center_text(str(self.data_table[self.current_top_row + i][j]), self._text_font_size, BLACK,
-                                      i + 1, j)
-
-        # Drawing lines
-        for i in range(0, 6):
-            self.draw_line_in_table((self.pos_x, self.pos_y + STATS_H // 5 * i),
-                                    (self.pos_x + STATS_W, self.pos_y + STATS_H // 5 * i))
-
-        # Draw the vertical lines for the border
-        for i in range(0, 4):
-            self.draw_line_in_table((self.pos_x + STATS_W // 4 * i, self.pos_y),
-                                    (self.pos_x + STATS_W // 4 * i, self.pos_y + STATS_H))
-        # Draw the final vertical line
-        self.draw_line_in_table((self.pos_x + STATS_W, self.pos_y),
-                                (self.pos_x + STATS_W, self.pos_y + STATS_H))
+                text = str(self.data_table[self.current_top_row + i][j])
+                if self._shown.get((i + 1, j)) != text:
+                    self.draw_center_text(text, self._text_font_size, BLACK, i + 1, j)
+                    self._shown[(i + 1, j)] = text
+        screen.blit(self._table, (self.pos_x - self.border_line_width, self.pos_y - self.border_line_width))
 
     def draw_center_text(self, text: str, font_size: int, font_color: tuple[int, int, int], row: int, col: int) -> None:
-        """Draws text in the center of a cell in the table
+        """Draws text in the center of a cell of the table surface, clearing what was in the cell before
 
         Preconditons:
         - font_size >= 1
         - 0 <= row <= len(self.data_table)
         - 0 <= col <= len(self.data_table[0])
         """
+        margin = self.border_line_width
         width_cell = STATS_W // 4
         height_cell = STATS_H // 5
-        comic_sans = py.font.SysFont('arial', font_size)
-        text_render = comic_sans.render(text, True, font_color)
-        text_rect = text_render.get_rect(center=((width_cell / 2) + self.pos_x + col * width_cell,
-                                                 (height_cell / 2) + self.pos_y + row * height_cell))
-        screen.blit(text_render, text_rect)
-
-    def draw_line_in_table(self, position: tuple[int, int], position2: tuple[int, int]) -> None:
-        """Draws a line, starting from position to the end of the table
-
-        Preconditons:
-        - 0 <= position[0] <= SCREEN_WIDTH
-        - 0 <= position[1] <= SCREEN_HEIGHT
-        - 0 <= position2[0] <= SCREEN_HEIGHT
-        - 0 <= position2[1] <= SCREEN_HEIGHT
-        """
-        # end_position = (position[0] + STATS_W, position[1])
-        py.draw.line(screen, self.line_color, position, position2, width=self.border_line_width)
+        # Clear the inside of the cell, leaving the lines around it alone
+        self._table.fill(SKY_BLUE, py.Rect(margin + col * width_cell + 2, margin + row * height_cell + 2,
+                                           width_cell - 3, height_cell - 3))
+        text_render = render_text(text, font_size, font_color)
+        self._table.blit(text_render, text_render.get_rect(center=self.cell_center(row, col, margin - self.pos_x,
+                                                                                  margin - self.pos_y)))
 
     def check_scroll(self, x: int, y: int, dy: int) -> None:
         """checks if we can scroll up or down
@@ -359,28 +539,21 @@ class StatsTable:
             # clamps
             self.current_top_row = max(min(self.current_top_row + dy, self.num_families - 4), 0)
 
-    def draw_total_table(self, border_radius: int) -> None:
-        """Draws the row that displays the total stats, and the text that goes along with it
+    def draw_total_table(self, border_radius: int, totals: tuple[int, int, int]) -> None:
+        """Draws the row that displays the total (# uninfected, # infected, # recovered), and the text that goes
+        along with it
 
         Preconditions:
         - border_radius % 2 == 0
         """
-        bigger_background = py.Surface((STATS_W, 40))
-        bigger_background.fill((220, 220, 220))
-        smaller_background = py.Surface((STATS_W - border_radius, 40 - border_radius))
-        smaller_background.fill(SKY_BLUE)
-        screen.blit(bigger_background, (self.pos_x, self.pos_y + STATS_H + 20))
-        screen.blit(smaller_background,
-                    (self.pos_x + border_radius // 2, self.pos_y + STATS_H + 20 + border_radius // 2))
-
-        # Calculate the data for the current frame, then add it
-        uninfected = len(self.simulation.simu_graph.susceptible)
-        infected = len(self.simulation.simu_graph.infected)
-        recovered = len(self.simulation.simu_graph.recovered)
-
-        draw_text(self.pos_x + border_radius * 2, self.pos_y + STATS_H + 28, f"Uninfected: {uninfected}", 20, BLACK)
-        draw_text(self.pos_x + border_radius * 2 + 215, self.pos_y + STATS_H + 28, f"Infected: {infected}", 20, BLACK)
-        draw_text(self.pos_x + border_radius * 2 + 400, self.pos_y + STATS_H + 28, f"Recovered: {recovered}", 20, BLACK)
+        if totals != self._shown_totals:
+            uninfected, infected, recovered = totals
+            self._total.blit(self._total_background, (0, 0))
+            draw_text(border_radius * 2, 8, f"Uninfected: {uninfected}", 20, BLACK, self._total)
+            draw_text(border_radius * 2 + 215, 8, f"Infected: {infected}", 20, BLACK, self._total)
+            draw_text(border_radius * 2 + 400, 8, f"Recovered: {recovered}", 20, BLACK, self._total)
+            self._shown_totals = totals
+        screen.blit(self._total, (self.pos_x, self.pos_y + STATS_H + 20))
 
 
 class Runner:
@@ -390,8 +563,9 @@ class Runner:
     Instance Attributes:
     - buttons: a dictionary that maps a string name to the button
     - active_button: the active button that is selected
-    - simulation: the current simulation in Runner
-    - main_graph: the main graph on the left of the display that represents the simulation
+    - worker: the SimulationWorker that steps the current simulation in a background thread. Runner only sends it
+    commands, and never touches the simulation itself once it is handed over.
+    - snapshot: the latest Snapshot of the current simulation, which everything on the display is drawn from
     - stacked_graph: the graph on the right of the display that shows the proportion of node states over time
     - stats_table: the scrollable table that is displayed on the top right of the display
     - done: whether this Pygame window is done Running (only true if one presses exit)
@@ -402,15 +576,36 @@ class Runner:
     - error_timer: the amount of frames that the run error message stays on the screen
     - clock: a pygame.time.Clock that updates Runner at fps frames per second
     - done_frames: a variables used to count frames after the simulation ends
+    - profiler: the FrameProfiler timing each phase of run and of the simulation, shown on screen; None when
+    profiling is off. F2 turns profiling on and off, and F3 exports it to PROFILE_PATH.
+    - static_overlay: the button labels and graph borders, which never change, drawn once and blitted every frame
+    - level_of_detail: whether to skip drawing edges when there are more than LEVEL_OF_DETAIL_POPULATION people.
+    F4 turns it on and off.
+    - speed_index: the index in SPEEDS of the current fast forward setting
+    - recording: whether every frame of the current simulation is being recorded to RECORDING_PATH. F6 starts and
+    stops recording.
+    - replay: the Recording being replayed, or None when the display shows the live simulation. F7 opens and
+    closes the replay of RECORDING_PATH. While replaying, RUN and STOP play and pause, the left and right arrow keys
+    step one frame, and clicking the stacked area graph jumps to that point of the whole recording.
+    - replay_frame: the index of the frame of replay that is displayed
+    - camera: the Camera the main graph is drawn through. Dragging the main graph pans it, the mouse wheel over the
+    main graph zooms it, and HOME zooms back out to the whole world.
+    - dragging: whether the main graph is being dragged with the left mouse button
+    - family_colours: the colour of every family by id as an (n + 1, 3) array, row 0 unused
+    - family_pixels: family_colours as pixel values of the screen, for writing into its pixels directly
+    - ensemble: the Ensemble of the inputs of the current simulation running in other processes, or None. F8 starts
+    and stops it, and the stacked area graph draws the replicates finished so far.
 
     Representation Invariants:
     - 0 < self.fps <= 60
     - 0 < self.error_timer <= self.fps * 5
+    - 0 <= self.speed_index < len(SPEEDS)
+    - self.replay is None or 0 <= self.replay_frame < len(self.replay)
     """
     buttons: dict[str: Button]
     active_button: Optional[Button]
-    simulation: Optional[sim]
-    main_graph: Optional[Graph]
+    worker: SimulationWorker
+    snapshot: Optional[Snapshot]
     stacked_graph: Optional[StackedAreaGraph]
     stats_table: Optional[StatsTable]
     done: bool = False
@@ -421,20 +616,35 @@ class Runner:
     error_timer: int
     clock: py.time.Clock
     done_frames: int = 0
+    profiler: Optional[FrameProfiler] = None
+    static_overlay: py.Surface
+    level_of_detail: bool = True
+    speed_index: int = 0
+    recording: bool = False
+    replay: Optional[Recording] = None
+    replay_frame: int = 0
+    camera: Camera
+    dragging: bool = False
+    family_colours: np.ndarray
+    family_pixels: np.ndarray
+    ensemble: Optional[Ensemble] = None
 
     def __init__(self, fps: int) -> None:
-        """Initializes with the parameters
+        """Initializes with the parameters, opening the pygame window
 
         Instance Attributes:
 
         """
+        global screen
         py.init()
         py.font.init()
+        screen = py.display.set_mode(size)
+        py.display.set_caption(TITLE)
         # Buttons are preset for this project
         run_b = Button(25, 530, 70, 25, 'RUN', WHITE, RED, True)
-        fam_pop_b = InputButton(215, 580, 60, 25, '5', BLACK, WHITE, True, 'int', (1, 51))
+        fam_pop_b = InputButton(215, 580, 60, 25, '5', BLACK, WHITE, True, 'int', (1, MAX_FAMILY_SIZE + 1))
         regen_b = Button(25, 600, 70, 25, 'REGENERATE', WHITE, RED, True)
-        fam_b = InputButton(215, 530, 60, 25, '5', BLACK, WHITE, True, 'int', (1, 21))
+        fam_b = InputButton(215, 530, 60, 25, '5', BLACK, WHITE, True, 'int', (1, MAX_FAMILIES + 1))
         infect_b = InputButton(445, 580, 60, 25, '0.2', BLACK, WHITE, True, 'float', (0.0, 1.0))
         inital_infected_b = InputButton(445, 530, 60, 25, '1', BLACK, WHITE, True,
                                         'int', (1, int(fam_pop_b.text) * int(fam_b.text) + 1))
@@ -443,39 +653,74 @@ class Runner:
         speed_b = InputButton(700, 580, 60, 25, '5', BLACK, WHITE, True, 'int', (1, 21))
         recover_period = InputButton(940, 530, 60, 25, '3', BLACK, WHITE, True, 'float', (1, 10000))
         brownian = Button(940, 580, 25, 25, '', WHITE, RED, False)
+        fast_forward = Button(1065, 555, 70, 25, SPEEDS[0][0], WHITE, RED, True)
+        world_b = InputButton(1065, 605, 60, 25, str(WORLD_SIZE), BLACK, WHITE, True, 'int', (1, MAX_WORLD_SIZE + 1))
         self.buttons = {
             'run': run_b, 'fam_pop': fam_pop_b, 'fam': fam_b, 'infect': infect_b, 'regen': regen_b,
             'initial': inital_infected_b, 'stop': stop_b, 'close': close_cont_b, 'speed': speed_b,
             'recover': recover_period,
-            'brownian': brownian
+            'brownian': brownian, 'fast': fast_forward, 'world': world_b
         }
         self.active_button = None
-        self.simulation = None
-        self.main_graph = None
+        self.worker = SimulationWorker()
+        self.snapshot = None
         self.stacked_graph = None
         self.stats_table = None
         self.fps = fps
         self.error_timer = fps
         self.clock = py.time.Clock()
+        self.static_overlay = self.draw_static_overlay()
+        self.camera = Camera(WORLD_SIZE)
+        self.family_colours = family_palette(0)
+        self.family_pixels = np.zeros(1, dtype=np.uint32)
 
     def run(self) -> None:
-        """runs the Runner (the entire project)"""
+        """runs the Runner (the entire project)
+        The simulation runs in the worker thread at its own pace, so each frame only handles events, forwards them
+        to the worker and draws the latest snapshot. A slow frame of the simulation never holds up the display.
+        """
         while not self.done:
+            profiler = self.profiler
+            if profiler is not None:
+                start = time.perf_counter()
             self.event_check()
             screen.fill(BLACK)
             self.update_buttons()
             self.update_data_objects()
             self.check_error_fields()
-            if self.is_running:
-                self.simulation.frame()
+            if self.replay is not None:
+                self.snapshot = self.replay.snapshot(self.replay_frame)
+                if self.is_running:
+                    self.replay_frame = min(self.replay_frame + 1, len(self.replay) - 1)
+            else:
+                if self.is_running != self.worker.running:
+                    if self.is_running:
+                        self.worker.run()
+                    else:
+                        self.worker.stop()
+                snapshot = self.worker.latest()
+                if snapshot is not None:
+                    self.snapshot = snapshot
+            if profiler is not None:
+                handled = time.perf_counter()
             self.draw_main_graph()
-            self.stacked_graph.update(self.is_running)
+            if self.ensemble is not None and self.ensemble.poll() > 0:
+                self.stacked_graph.set_ensemble(self.ensemble.statistics)
+            self.stacked_graph.update(self.is_running, self.snapshot.counts, self.snapshot.frame_num)
             self.check_simulation_done()
             self.draw_text_and_graph_borders()
-            self.stats_table.update()
+            self.stats_table.update(self.snapshot)
             self.draw_error()
+            if profiler is not None:
+                drawn = time.perf_counter()
+                profiler.record('events', handled - start)
+                profiler.record('draw', drawn - handled)
+                profiler.record('runner_frame', drawn - start)
+                self.draw_profile_overlay()
             py.display.flip()
             self.clock.tick(self.fps)
+        self.worker.quit()
+        self.stop_ensemble()
         py.quit()
 
     def event_check(self) -> None:
@@ -489,18 +734,123 @@ class Runner:
                 self.check_mouse_wheel(event)
             if event.type == py.MOUSEBUTTONDOWN:
                 self.check_mouse_button_down(event)
-            if event.type == py.KEYDOWN and self.active_button is not None:
+            if event.type == py.MOUSEBUTTONUP and event.button == 1:
+                self.dragging = False
+            if event.type == py.MOUSEMOTION and self.dragging:
+                self.camera.pan(*event.rel)
+            if event.type == py.KEYDOWN and event.key in (py.K_F2, py.K_F3):
+                self.check_profile_keys(event)
+            elif event.type == py.KEYDOWN and event.key == py.K_F4:
+                self.level_of_detail = not self.level_of_detail
+            elif event.type == py.KEYDOWN and event.key == py.K_HOME:
+                self.camera.fit(self.camera.world_size)
+            elif event.type == py.KEYDOWN and event.key in (py.K_F6, py.K_F7):
+                self.check_record_keys(event)
+            elif event.type == py.KEYDOWN and event.key == py.K_F8:
+                self.check_ensemble_key()
+            elif event.type == py.KEYDOWN and event.key in (py.K_LEFT, py.K_RIGHT) and self.replay is not None:
+                self.seek(self.replay_frame + (1 if event.key == py.K_RIGHT else -1))
+            elif event.type == py.KEYDOWN and self.active_button is not None:
                 self.check_button_press(event)
 
+    def check_profile_keys(self, event: pygame.event.Event) -> None:
+        """Turns profiling on or off when F2 is pressed, and exports the profile when F3 is pressed
+
+        Preconditions:
+        - event.key in (py.K_F2, py.K_F3)
+        """
+        if event.key == py.K_F2 and self.profiler is None:
+            self.profiler = FrameProfiler(self.fps * 10)
+            self.worker.set_profiler(self.profiler)
+        elif event.key == py.K_F2:
+            self.profiler = None
+            self.worker.set_profiler(None)
+        elif self.profiler is not None:
+            self.profiler.export(PROFILE_PATH)
+
+    def check_record_keys(self, event: pygame.event.Event) -> None:
+        """Starts or stops recording when F6 is pressed, and opens or closes the replay when F7 is pressed
+
+        Preconditions:
+        - event.key in (py.K_F6, py.K_F7)
+        """
+        global button_changed
+        if event.key == py.K_F6 and self.replay is None and self.snapshot is not None:
+            self.recording = not self.recording
+            self.worker.set_recorder(Recorder(RECORDING_PATH, self.snapshot.num_family, self.snapshot.family_size,
+                                              self.snapshot.world_size) if self.recording else None)
+        elif event.key == py.K_F7 and self.replay is None:
+            if self.recording:
+                self.recording = False
+                self.worker.set_recorder(None)
+            try:
+                replay = Recording(RECORDING_PATH)
+            except (OSError, ValueError):
+                # There is nothing to replay yet
+                return
+            if len(replay) == 0:
+                return
+            self.replay = replay
+            self.is_running = False
+            self.worker.stop()
+            self.stop_ensemble()
+            self.stacked_graph = StackedAreaGraph(replay.num_family * replay.family_size)
+            self.stats_table = StatsTable(replay.num_family)
+            self.show_world(replay.num_family, replay.world_size)
+            self.seek(0)
+        elif event.key == py.K_F7:
+            # Leaving the replay starts a new simulation from the inputs
+            self.replay = None
+            self.is_running = False
+            button_changed = True
+
+    def check_ensemble_key(self) -> None:
+        """Starts an ensemble of ENSEMBLE_REPLICATES runs of the inputs of the current simulation when F8 is pressed,
+        or stops the one running
+        """
+        if self.ensemble is not None:
+            self.stop_ensemble()
+        elif self.replay is None and self.inputs_valid():
+            self.ensemble = Ensemble(self.simulation_parameters(), ENSEMBLE_REPLICATES)
+            self.ensemble.start()
+
+    def stop_ensemble(self) -> None:
+        """Stops the ensemble, if there is one, and stops drawing it"""
+        if self.ensemble is not None:
+            self.ensemble.close()
+            self.ensemble = None
+        if self.stacked_graph is not None:
+            self.stacked_graph.set_ensemble(None)
+
+    def seek(self, frame: int) -> None:
+        """Displays the given frame of the replay next, clamped to the frames recorded
+
+        Preconditions:
+        - self.replay is not None
+        """
+        self.replay_frame = max(0, min(frame, len(self.replay) - 1))
+        self.done_frames = 0
+
+    def show_world(self, num_families: int, world_size: int) -> None:
+        """Zooms the camera out to a new world of the given size, and makes the colours of its families"""
+        self.camera.fit(world_size)
+        if len(self.family_colours) != num_families + 1:
+            self.family_colours = family_palette(num_families)
+            self.family_pixels = np.array([screen.map_rgb(colour) for colour in self.family_colours.tolist()],
+                                          dtype=np.uint32)
+
     def check_mouse_wheel(self, event: pygame.event.Event) -> None:
-        """Checks for the mouse wheel event
+        """Checks for the mouse wheel event: it zooms the main graph or scrolls the stats table, whichever the
+        mouse is over
 
         Preconditions:
         - event is not None
         """
         dy = event.y
         x, y = py.mouse.get_pos()
-        if self.stats_table is not None:
+        if VIEW_RECT.collidepoint(x, y):
+            self.camera.zoom_at(x, y, ZOOM_STEP ** dy)
+        elif self.stats_table is not None:
             self.stats_table.check_scroll(x, y, dy)
 
     def check_mouse_button_down(self, event: pygame.event.Event) -> None:
@@ -521,16 +871,26 @@ class Runner:
         # if statements to check for buttons
         if self.active_button is self.buttons['brownian']:
             self.active_button.background_color = GREEN if self.active_button.background_color == RED else RED
-            self.simulation.brownian = self.active_button.background_color == GREEN
+            self.worker.set_brownian(self.active_button.background_color == GREEN)
+        if self.active_button is self.buttons['fast']:
+            self.speed_index = (self.speed_index + 1) % len(SPEEDS)
+            self.active_button.text = SPEEDS[self.speed_index][0]
+            self.worker.set_speed(SPEEDS[self.speed_index][1])
         if self.active_button is self.buttons['run'] and not self.is_running:
             self.is_running = True
-            if self.simulation.simu_graph.infected == set():
+            if self.replay is not None and self.replay_frame == len(self.replay) - 1:
+                self.seek(0)
+            elif self.replay is None and self.snapshot.counts[1] == 0:
                 button_changed = True
+        if event.button == 1 and self.active_button is None and VIEW_RECT.collidepoint(event.pos):
+            self.dragging = True
+        if self.replay is not None and 600 <= event.pos[0] < 600 + STACKED_GRAPH_LENGTH and \
+                300 <= event.pos[1] < 300 + STACKED_GRAPH_HEIGHT:
+            self.seek(round((event.pos[0] - 600) / (STACKED_GRAPH_LENGTH - 1) * (len(self.replay) - 1)))
         if self.active_button is self.buttons['regen']:
             self.is_running = False
             button_changed = True
-            if not all(button.text != '' for button in self.buttons.values() if
-                       isinstance(button, InputButton) and button is not self.buttons['brownian']):
+            if not self.inputs_valid():
                 self.draw_run_error = True
                 self.can_initialize_run = True
                 self.is_running = False
@@ -588,69 +948,129 @@ class Runner:
         """updates the GUI objects depending on if an input was changed on the front end"""
         global button_changed
         if button_changed:
-            if all(button.text != '' for button in self.buttons.values() if
-                   isinstance(button, InputButton) and button is not self.buttons['brownian']):
-                num_families = int(self.buttons['fam'].text)
-                family_size = int(self.buttons['fam_pop'].text)
-                population = num_families * family_size
-                speed = int(self.buttons['speed'].text)
-                recovery = float(self.buttons['recover'].text)
-                infectivity = float(self.buttons['infect'].text)
-                inital_infected = int(self.buttons['initial'].text)
-                close_contact_distance = int(self.buttons['close'].text)
-                self.simulation = sim(num_families, family_size, speed + 1, int(self.fps * recovery), inital_infected,
-                                      close_contact_distance, self.fps, infectivity,
-                                      self.buttons['brownian'].background_color == GREEN)
-                self.main_graph = self.simulation.simu_graph
-                self.stacked_graph = StackedAreaGraph(population, self.main_graph)
-                self.stats_table = StatsTable(num_families, self.simulation)
+            if self.inputs_valid():
+                parameters = self.simulation_parameters()
+                num_families = parameters['num_family']
+                world_size = parameters['world_size']
+                simulation = build_simulation(**parameters)
+                if self.profiler is not None:
+                    simulation.enable_profiling(self.profiler)
+                self.replay = None
+                self.recording = False
+                # Draw the first frame before handing the simulation over, since the worker has not published it yet
+                self.snapshot = simulation.snapshot()
+                self.worker.replace(simulation)
+                # An ensemble of the old inputs says nothing about the new simulation
+                self.stop_ensemble()
+                self.stacked_graph = StackedAreaGraph(num_families * parameters['family_size'])
+                self.stats_table = StatsTable(num_families)
+                self.show_world(num_families, world_size)
                 self.done_frames = 0
             button_changed = False
 
+    def inputs_valid(self) -> bool:
+        """returns whether every input field has a value"""
+        return all(button.text != '' for button in self.buttons.values() if
+                   isinstance(button, InputButton) and button is not self.buttons['brownian'])
+
+    def simulation_parameters(self) -> dict[str, int | float | bool]:
+        """returns the parameters of build_simulation for a simulation of the inputs
+
+        Preconditions:
+        - self.inputs_valid()
+        """
+        num_families = int(self.buttons['fam'].text)
+        family_size = int(self.buttons['fam_pop'].text)
+        return {
+            'num_family': num_families, 'family_size': family_size, 'speed': int(self.buttons['speed'].text) + 1,
+            'recover_period': int(self.fps * float(self.buttons['recover'].text)),
+            'initial_infected': int(self.buttons['initial'].text),
+            'close_contact_distance': int(self.buttons['close'].text), 'fps': self.fps,
+            'infectivity': float(self.buttons['infect'].text),
+            'brownian': self.buttons['brownian'].background_color == GREEN,
+            # Large populations run on the array based engine, which steps hundreds of thousands of people
+            'vectorized': num_families * family_size > VECTOR_POPULATION,
+            'world_size': max(int(self.buttons['world'].text), MIN_WORLD_SIZE)
+        }
+
     def check_error_fields(self) -> None:
         """checks if all input fields are valid before running the simulation"""
         if self.is_running and self.can_initialize_run:
             self.can_initialize_run = False
-            if not all(button.text != '' for button in self.buttons.values() if
-                       isinstance(button, InputButton) and button is not self.buttons['brownian']):
+            if not self.inputs_valid():
                 self.draw_run_error = True
                 self.can_initialize_run = True
                 self.is_running = False
 
     def draw_main_graph(self) -> None:
-        """draws the main graph on the display"""
-        # Updates the main graph edges
-        for k in self.main_graph.id_to_person.values():
-            for n in self.main_graph.id_to_person.values():
-                if k.family_id == n.family_id:
-                    x = n.location[0]
-                    y = n.location[1]
-                    draw_edge((k.location[0] + 25, k.location[1] + 25), (x + 25, y + 25), WHITE)
-        for j in self.main_graph.infected:
-            for m in j.close_contact:
-                x = self.main_graph.id_to_person[m].location[0]
-                y = self.main_graph.id_to_person[m].location[1]
-                draw_edge((j.location[0] + 25, j.location[1] + 25), (x + 25, y + 25), RED)
+        """draws the part of the main graph in view of the camera from the latest snapshot. People off screen are
+        skipped, and when there are more than MAX_CIRCLES people on screen, or they would be too small to see as
+        circles, they are drawn as dots without edges.
+        """
+        snapshot = self.snapshot
+        on_screen = self.camera.visible(snapshot.positions, NODE_RADIUS)
+        shown = np.flatnonzero(on_screen)
+        radius = round(NODE_RADIUS * self.camera.zoom)
+        screen.set_clip(VIEW_RECT)
+        if len(shown) > MAX_CIRCLES or radius <= 1:
+            self.draw_dots(shown, max(1, min(radius, 2)))
+        else:
+            self.draw_circles(on_screen, shown, radius)
+        screen.set_clip(None)
+
+    def draw_circles(self, on_screen: np.ndarray, shown: np.ndarray, radius: int) -> None:
+        """draws the people in shown as circles of the given radius, along with their family and close contact
+        edges. on_screen is a mask of the people in shown.
+        """
+        snapshot = self.snapshot
+        points = self.camera.to_screen(snapshot.positions)
+        # Updates the main graph edges, unless there are too many people to see them
+        if not (self.level_of_detail and len(shown) > LEVEL_OF_DETAIL_POPULATION):
+            # A line through the members of each family, who are numbered one family after another. Only the
+            # segments with an end on screen are drawn, so drawing the families is linear in the people on screen.
+            segments = np.flatnonzero((on_screen[:-1] | on_screen[1:])
+                                      & (snapshot.family_ids[:-1] == snapshot.family_ids[1:]))
+            for start, end in zip(points[segments].tolist(), points[segments + 1].tolist()):
+                draw_edge(start, end, WHITE)
+            contacts = on_screen[snapshot.contact_sources] | on_screen[snapshot.contact_targets]
+            for source, target in zip(points[snapshot.contact_sources[contacts]].tolist(),
+                                      points[snapshot.contact_targets[contacts]].tolist()):
+                draw_edge(source, target, RED)
         # Update the main graph nodes
-        for j in self.main_graph.infected:
-            x = j.location[0]
-            y = j.location[1]
-            draw_node((x + 25, y + 25), (255, 0, 0))
-        for k in self.main_graph.recovered:
-            x = k.location[0]
-            y = k.location[1]
-            draw_node((x + 25, y + 25), (0, 0, 255))
-        for family_id in range(1, self.simulation.num_family + 1):
-            for person in self.simulation.id_to_family[family_id]:
-                if person.state != INFECTED:
-                    draw_node((person.location[0] + 25, person.location[1] + 25), COLORS[family_id - 1])
+        states = snapshot.states[shown]
+        infected = states == INFECTED
+        for point in points[shown[infected]].tolist():
+            draw_node(point, (255, 0, 0), radius)
+        for point in points[shown[states == RECOVERED]].tolist():
+            draw_node(point, (0, 0, 255), radius)
+        others = shown[~infected]
+        for point, colour in zip(points[others].tolist(), self.family_colours[snapshot.family_ids[others]].tolist()):
+            draw_node(point, colour, radius)
+
+    def draw_dots(self, shown: np.ndarray, dot_size: int) -> None:
+        """draws the people in shown as squares dot_size pixels wide, written straight into the pixels of the
+        screen, with infected people on top
+        """
+        snapshot = self.snapshot
+        corners = np.floor(self.camera.to_screen(snapshot.positions[shown])).astype(np.int64)
+        infected = snapshot.states[shown] == INFECTED
+        colours = self.family_pixels[snapshot.family_ids[shown]]
+        pixels = py.surfarray.pixels2d(screen)
+        for dx in range(dot_size):
+            for dy in range(dot_size):
+                x = np.clip(corners[:, 0] + dx, VIEW_X, VIEW_X + VIEW_SIZE - 1)
+                y = np.clip(corners[:, 1] + dy, VIEW_Y, VIEW_Y + VIEW_SIZE - 1)
+                pixels[x, y] = colours
+                pixels[x[infected], y[infected]] = screen.map_rgb(RED)
+        # The screen stays locked until the pixel array is gone
+        del pixels
 
     def check_simulation_done(self) -> None:
         """checks if the simulation is done"""
         if self.active_button is self.buttons['stop']:
             self.is_running = False
             self.can_initialize_run = True
-        if self.simulation.simu_graph.infected == set():
+        if self.snapshot.counts[1] == 0:
             if self.done_frames == self.fps:
                 draw_text(25, 5, 'SIMULATION FINISHED', 15, GREEN)
                 self.is_running = False
@@ -661,34 +1081,68 @@ class Runner:
 
     def draw_text_and_graph_borders(self) -> None:
         """draws the button label texts and the graph outlines"""
+        screen.blit(self.static_overlay, (0, 0))
+        # The bound on the initial infected depends on the inputs, so it is the only label drawn every frame
+        draw_text(350, 550, f'(max {len(self.snapshot.states)})', 15, WHITE)
+        if self.replay is not None:
+            draw_text(200, 5, f'REPLAY {self.replay_frame} / {len(self.replay) - 1}', 15, GREEN)
+        elif self.recording:
+            draw_text(200, 5, 'RECORDING', 15, RED)
+        if self.ensemble is not None:
+            draw_text(400, 5, f'ENSEMBLE {self.ensemble.statistics.count} / {self.ensemble.replicates}', 15,
+                      (255, 255, 0))
+
+    def draw_static_overlay(self) -> py.Surface:
+        """returns a transparent surface with the button label texts and graph outlines that never change"""
+        overlay = py.Surface(size, py.SRCALPHA)
         main_block = py.Rect(25, 25, 500, 500)
-        py.draw.rect(screen, SKY_BLUE, main_block, 1)
+        py.draw.rect(overlay, SKY_BLUE, main_block, 1)
         second_block = py.Rect(600, 300, STACKED_GRAPH_LENGTH,
                                STACKED_GRAPH_HEIGHT)
-        py.draw.rect(screen, SKY_BLUE, second_block, 1)
+        py.draw.rect(overlay, SKY_BLUE, second_block, 1)
         # Drawing the text along with its bounds
-        draw_text(120, 580, 'FAMILY SIZE', 15, WHITE)
-        draw_text(150, 600, '(max 50)', 15, WHITE)
+        draw_text(120, 580, 'FAMILY SIZE', 15, WHITE, overlay)
+        draw_text(150, 600, f'(max {MAX_FAMILY_SIZE})', 15, WHITE, overlay)
+
+        draw_text(140, 530, 'FAMILIES', 15, WHITE, overlay)
+        draw_text(145, 550, f'(max {MAX_FAMILIES})', 15, WHITE, overlay)
 
-        draw_text(140, 530, 'FAMILIES', 15, WHITE)
-        draw_text(150, 550, '(max 20)', 15, WHITE)
+        draw_text(345, 580, 'INFECTIVITY', 15, WHITE, overlay)
+        draw_text(345, 600, '(max 1.0)', 15, WHITE, overlay)
 
-        draw_text(345, 580, 'INFECTIVITY', 15, WHITE)
-        draw_text(345, 600, '(max 1.0)', 15, WHITE)
+        draw_text(310, 530, 'INITIAL INFECTED', 15, WHITE, overlay)
 
-        draw_text(310, 530, 'INITIAL INFECTED', 15, WHITE)
-        draw_text(350, 550, f'(max {self.simulation.num_family * self.simulation.family_size})', 15, WHITE)
+        draw_text(540, 530, 'CONTACT DISTANCE', 15, WHITE, overlay)
+        draw_text(625, 550, '(max 999)', 15, WHITE, overlay)
 
-        draw_text(540, 530, 'CONTACT DISTANCE', 15, WHITE)
-        draw_text(625, 550, '(max 999)', 15, WHITE)
+        draw_text(640, 580, 'SPEED', 15, WHITE, overlay)
+        draw_text(635, 600, '(max 20)', 15, WHITE, overlay)
 
-        draw_text(640, 580, 'SPEED', 15, WHITE)
-        draw_text(635, 600, '(max 20)', 15, WHITE)
+        draw_text(790, 530, 'RECOVERY PERIOD', 15, WHITE, overlay)
+        draw_text(860, 550, '(max 9999)', 15, WHITE, overlay)
 
-        draw_text(790, 530, 'RECOVERY PERIOD', 15, WHITE)
-        draw_text(860, 550, '(max 9999)', 15, WHITE)
+        draw_text(850, 580, 'BROWNIAN', 15, WHITE, overlay)
 
-        draw_text(850, 580, 'BROWNIAN', 15, WHITE)
+        draw_text(1045, 530, 'FAST FORWARD', 15, WHITE, overlay)
+
+        draw_text(1055, 585, 'WORLD SIZE', 15, WHITE, overlay)
+        return overlay.convert_alpha()
+
+    def draw_profile_overlay(self) -> None:
+        """draws the p50, p95 and max of every profiled phase and counter over the top left of the main graph"""
+        stats = self.profiler.stats()
+        background = py.Surface((250, 14 * (len(stats) + 1) + 6))
+        background.set_alpha(200)
+        background.fill(BLACK)
+        screen.blit(background, (26, 26))
+        for j, key in enumerate(('p50', 'p95', 'max')):
+            draw_text(140 + 45 * j, 28, key, 12, GREEN)
+        for i, (name, values) in enumerate(stats.items()):
+            draw_text(30, 28 + 14 * (i + 1), name, 12, WHITE)
+            # Timings are shown in milliseconds, counters as they are
+            scale = 1 if name in COUNTER_NAMES else 1000
+            for j, key in enumerate(('p50', 'p95', 'max')):
+                draw_text(140 + 45 * j, 28 + 14 * (i + 1), f'{values[key] * scale:.1f}', 12, WHITE)
 
     def draw_error(self) -> None:
         """draws error if draw_run_error is true"""
@@ -700,13 +1154,13 @@ class Runner:
             draw_text(SCREEN_WIDTH // 4, SCREEN_HEIGHT // 4, 'ALL INPUTS MUST BE VALID', 50, RED)
 
 
-def draw_node(position: tuple[int, int], colour: tuple[int, int, int]) -> None:
-    """Draws a node at the given position
+def draw_node(position: tuple[int, int], colour: tuple[int, int, int], radius: int = NODE_RADIUS) -> None:
+    """Draws a node of the given radius at the given position
 
     Preconditions:
-    - SCREEN_WIDTH >= position1[0] >= 0 and SCREEN_HEIGHT >= position1[1] >= 0
+    - radius >= 1
     """
-    py.draw.circle(screen, colour, position, NODE_RADIUS)
+    py.draw.circle(screen, colour, position, radius)
 
 
 def draw_edge(position1: tuple[int, int], position2: tuple[int, int], colour: tuple[int, int, int]) -> None:
@@ -720,9 +1174,31 @@ def draw_edge(position1: tuple[int, int], position2: tuple[int, int], colour: tu
     py.draw.line(screen, colour, position1, position2, width=LINE_WIDTH)
 
 
+def family_colour(family_id: int) -> tuple[int, int, int]:
+    """Returns the colour of the family with id family_id: its colour in COLORS for the first families, and after
+    that a colour made up from the id, stepping around the colour wheel by the golden ratio
+
+    Preconditions:
+    - family_id >= 1
+    """
+    if family_id <= len(COLORS):
+        return COLORS[family_id - 1]
+    red, green, blue = colorsys.hsv_to_rgb(family_id * GOLDEN_RATIO_CONJUGATE % 1, 0.6, 0.95)
+    return round(red * 255), round(green * 255), round(blue * 255)
+
+
+def family_palette(num_families: int) -> np.ndarray:
+    """Returns the colour of every family by id as a (num_families + 1, 3) array, whose row 0 is unused
+
+    Preconditions:
+    - num_families >= 0
+    """
+    return np.array([BLACK] + [family_colour(family_id) for family_id in range(1, num_families + 1)], dtype=np.uint8)
+
+
 def draw_text(x: int, y: int, text: str, font_size: int,
-              font_color: tuple[int, int, int]) -> None:
-    """ Draws text on the screen
+              font_color: tuple[int, int, int], surface: Optional[py.Surface] = None) -> None:
+    """ Draws text on surface, or on the screen if surface is None
 
     Preconditions:
     - SCREEN_HEIGHT >= x >= 0 and SCREEN_WIDTH >= y >= 0
@@ -730,16 +1206,40 @@ def draw_text(x: int, y: int, text: str, font_size: int,
     - font_size > 0
     - len(font_color) == 3 and all(255 >= x >= 0 for x in font_color)
     """
-    comic_sans = py.font.SysFont('arial', font_size)
-    text_render = comic_sans.render(text, True, font_color)
-    screen.blit(text_render, (x, y))
+    (screen if surface is None else surface).blit(render_text(text, font_size, font_color), (x, y))
+
+
+def get_font(font_size: int) -> py.font.Font:
+    """ Returns the arial font of the given size, loading it only the first time it is asked for
+
+    Preconditions:
+    - font_size > 0
+    """
+    if font_size not in fonts:
+        fonts[font_size] = py.font.SysFont('arial', font_size)
+    return fonts[font_size]
+
+
+def render_text(text: str, font_size: int, font_color: tuple[int, int, int]) -> py.Surface:
+    """ Returns text rendered in the given font size and colour, rendering it only if it has not been rendered
+    recently
+
+    Preconditions:
+    - font_size > 0
+    """
+    key = (text, font_size, font_color)
+    if key not in rendered_text:
+        if len(rendered_text) >= MAX_RENDERED_TEXT:
+            rendered_text.clear()
+        rendered_text[key] = get_font(font_size).render(text, True, font_color)
+    return rendered_text[key]
 
 
 if __name__ == "__main__":
     import python_ta
 
     python_ta.check_all(config={
-        'extra-imports': [],  # the names (strs) of imported modules
+        'extra-imports': ['colorsys', 'numpy'],  # the names (strs) of imported modules
         'allowed-io': ['runner'],  # the names (strs) of functions that call print/open/input
         'disable': ['E9992', 'E9997', 'E1101', 'E9999', 'C0103', 'R0902', 'R0912', 'R0913', 'R0914', 'R1702', 'R0915'],
         'max-line-length': 120
@@ -6,7 +6,15 @@ as a mapping from the person id to the person.
 
 from __future__ import annotations
 # from python_ta.contracts import check_contracts
-from person_edge import Person, RECOVERED, Edge
+from typing import Optional
+import numpy as np
+from infection_log import InfectionLog
+from person_edge import Person, SUSCEPTIBLE, INFECTED, RECOVERED, CONTACT, FAMILY, Edge, contact_infection_chance, \
+    family_infections
+from profiler import FrameProfiler
+from random_stream import RandomStream
+from recovery import RecoverySchedule
+from spatial_grid import SpatialGrid
 
 
 # @check_contracts
@@ -20,85 +28,257 @@ class Graph:
     - recovered: a set containing all the Person who have recovered and can not be infeced again.
     - id_to_person: a dictionary contanning all the Person with the id of Person as key and Person object as
     associated values.
+    - id_to_family: a dictionary with the id of a family as key and the list of every Person in that family as
+    associated value. Family members are connected through this list instead of an Edge between every pair.
+    - family_counts: a dictionary with the id of a family as key and [# susceptible, # infected, # recovered] in
+    that family as associated value. It is updated whenever a Person changes state, so it never needs a recount.
     - infectivity: The rate of infection in the simulation
+    - rng: the random stream infection trials draw from
+    - grid: a SpatialGrid of the susceptible Persons, used to find close contacts. This is None before the first
+    call to update_edge.
+    - profiler: the FrameProfiler that counts pairs tested, edges created and removed, and infection trials, or
+    None to count nothing
+    - infection_log: the InfectionLog that make_infection logs every infection to, with who infected whom, or None
+    to log nothing
+    - recovery_schedule: a RecoverySchedule of every infected Person by the frame they recover in, so update_edge
+    only visits the people who recover in the current frame
+
+    Private Instance Attributes:
+    - _spare_edges: close contact edges that have been removed, kept to be reused by the next close contacts
+    - _num_close_contacts: the number of close contact edges currently between two people
 
     Representation Invarients:
     - all(person in self.id_to_person.values() for person in self.infected)
     - all(person in self.id_to_person.values() for person in self.susceptible)
     - all(person in self.id_to_person.values() for person in self.recovered)
     - all(self.id_to_person[identification].id == identification for identification in self.id_to_person)
+    - all(all(person.family_id == family for person in self.id_to_family[family]) for family in self.id_to_family)
+    - all(sum(self.family_counts[family]) == len(self.id_to_family[family]) for family in self.id_to_family)
     """
     infected: set[Person]
     susceptible: set[Person]
     recovered: set[Person]
     id_to_person: dict[int, Person]
+    id_to_family: dict[int, list[Person]]
+    family_counts: dict[int, list[int]]
     infectivity: float
+    rng: RandomStream
+    grid: Optional[SpatialGrid]
+    profiler: Optional[FrameProfiler]
+    infection_log: Optional[InfectionLog]
+    recovery_schedule: RecoverySchedule
+    _spare_edges: list[Edge]
+    _num_close_contacts: int
 
-    def __init__(self, infectivity: float) -> None:
-        """This function inicilize the Graph class by making it to an empty graph."""
+    def __init__(self, infectivity: float, rng: Optional[RandomStream] = None) -> None:
+        """This function inicilize the Graph class by making it to an empty graph. If rng is None, the graph gets
+        an unseeded random stream of its own.
+        """
         self.infected = set()
         self.susceptible = set()
         self.recovered = set()
         self.id_to_person = {}
+        self.id_to_family = {}
+        self.family_counts = {}
         self.infectivity = infectivity
+        self.rng = RandomStream() if rng is None else rng
+        self.grid = None
+        self.profiler = None
+        self.infection_log = None
+        self.recovery_schedule = RecoverySchedule()
+        self._spare_edges = []
+        self._num_close_contacts = 0
 
-    def build_family_edge(self, person1: Person, person2: Person) -> None:
-        """This fucntion build an family edge between person1 and person2.
+    def add_person(self, person: Person) -> None:
+        """This fucntion adds a person to the graph, to the set of their state and to the list of their family.
 
         - Preconditions:
-            - person1.family_id == person2.family_id
+            - person.id not in self.id_to_person
+            - person.state != INFECTED or person.recovery_frame is not None
         """
-        edge = Edge(person1, person2)
-        person1.family[person2.id] = edge
-        person2.family[person1.id] = edge
+        self.id_to_person[person.id] = person
+        {SUSCEPTIBLE: self.susceptible, INFECTED: self.infected, RECOVERED: self.recovered}[person.state].add(person)
+        if person.state == INFECTED:
+            self.recovery_schedule.add(person.recovery_frame, person)
+        if person.family_id not in self.id_to_family:
+            self.id_to_family[person.family_id] = []
+            self.family_counts[person.family_id] = [0, 0, 0]
+        self.id_to_family[person.family_id].append(person)
+        self.family_counts[person.family_id][person.state - SUSCEPTIBLE] += 1
+
+    def add_close_contact(self, infected: Person, susceptible: Person) -> None:
+        """This fucntion adds a close contact edge from infected to susceptible, the way update_edge would.
+
+        - Preconditions:
+            - susceptible.id not in infected.close_contact
+        """
+        infected.create_close_contact_edge(susceptible)
+        self._num_close_contacts += 1
+
+    def infect(self, person: Person, current_frame: int, recover_period: int) -> None:
+        """This fucntion makes a susceptible person infected as of current_frame, and schedules them to recover once
+        they have been infected for more than recover_period frames.
 
-    def update_edge(self, current_frame: int, recover_period: int, close_contact_distance: int) -> None:
+        - Preconditions:
+            - person in self.susceptible
+            - recover_period >= 0
+        """
+        person.state = INFECTED
+        person.infection_frame = current_frame
+        person.recovery_frame = current_frame + recover_period + 1
+        self.recovery_schedule.add(person.recovery_frame, person)
+        self.susceptible.remove(person)
+        self.infected.add(person)
+        counts = self.family_counts[person.family_id]
+        counts[0] -= 1
+        counts[1] += 1
+
+    def update_edge(self, current_frame: int, close_contact_distance: int) -> None:
         """This function updates the all the close contact edge in the simulation. This includes break the existing
         edges if the distance between two Person is larger than close_contact_distance and adding an edge between
-        two Person if the distance between them is less than close_contact_distance.
+        two Person if the distance between them is less than close_contact_distance. The people scheduled to recover
+        in current_frame recover first and lose all their edges. Family members only get an edge when they are in
+        range like anyone else, since make_infection works out infections within families from the family counts.
+
+        Close contact edges are kept from one frame to the next, so only the pairs that come into range get a new
+        edge and only the pairs that leave range, or are no longer an infected and a susceptible person, lose theirs.
         """
-        to_remove = set()
-        for patient in self.infected:
-            patient.close_contact = {}
-            if current_frame - patient.infection_frame > recover_period:
-                patient.state = RECOVERED
-                to_remove.add(patient)
-            else:
-                for person in self.susceptible:
-                    if ((person.location[0] - patient.location[0]) ** 2 + (
-                            person.location[1] - patient.location[1]) ** 2) ** 0.5 < close_contact_distance or \
-                            person.family_id == patient.family_id:
-                        patient.create_close_contact_edge(person)
-
-        for patient in to_remove:
+        pairs_tested, edges_created, edges_removed = 0, 0, 0
+        for patient in self.recovery_schedule.pop(current_frame):
+            patient.state = RECOVERED
+            counts = self.family_counts[patient.family_id]
+            counts[1] -= 1
+            counts[2] += 1
+            for other_id in list(patient.close_contact):
+                self._spare_edges.append(patient.remove_close_contact_edge(self.id_to_person[other_id]))
+                edges_removed += 1
             self.infected.remove(patient)
             self.recovered.add(patient)
 
-    def make_infection(self, close_contact_distance: int) -> set[Person]:
+        # Nobody is in range of a close_contact_distance of 0, so there are no close contacts to look for
+        if close_contact_distance > 0:
+            # Bucket the susceptible people by location so each patient only checks the cells around them. The
+            # cells are close_contact_distance wide, so everyone in range is in one of the nine cells around them.
+            if self.grid is None or self.grid.cell_size != close_contact_distance:
+                self.grid = SpatialGrid(close_contact_distance)
+            self.grid.rebuild(self.susceptible)
+            max_distance_squared = close_contact_distance ** 2
+
+            for patient in self.infected:
+                x, y = patient.location
+                candidates = self.grid.near(patient.location)
+                pairs_tested += len(candidates)
+                in_range = {person.id: person for person in candidates
+                            if (person.location[0] - x) ** 2 + (person.location[1] - y) ** 2 < max_distance_squared}
+
+                for other_id in [other_id for other_id in patient.close_contact if other_id not in in_range]:
+                    self._spare_edges.append(patient.remove_close_contact_edge(self.id_to_person[other_id]))
+                    edges_removed += 1
+                for other_id, person in in_range.items():
+                    if other_id not in patient.close_contact:
+                        spare = self._spare_edges.pop() if self._spare_edges else None
+                        patient.create_close_contact_edge(person, spare)
+                        edges_created += 1
+        self._num_close_contacts += edges_created - edges_removed
+
+        # Keep no more spare edges than edges in use, so memory follows the number of pairs in contact
+        del self._spare_edges[self._num_close_contacts:]
+
+        if self.profiler is not None:
+            self.profiler.record('pairs_tested', pairs_tested)
+            self.profiler.record('edges_created', edges_created)
+            self.profiler.record('edges_removed', edges_removed)
+
+    def make_infection(self, close_contact_distance: int, current_frame: int = 0) -> set[Person]:
         """return all the newly infected people under the current connection of graph. This fuction make all the
-        infected person spread virus by calling Edge.infect.
+        infected person spread virus to their close contacts in other families, with the same chances as
+        Edge.infect, and to their susceptible family members.
+
+        Close contacts are tried pair by pair. Every (infected, susceptible) pair is collected first, and then the
+        distances, the chances and the draws of all the pairs are worked out at once with NumPy.
+
+        Families are not tried pair by pair. Each susceptible member of a family with k infected members takes one
+        draw, which family_infections turns into whether any of the k infected them and, if so, which was first.
+
+        The newly infected people are infected at the start of the next frame, so if infection_log is not None,
+        their infections are logged at current_frame + 1. Someone infected by more than one person is logged as
+        infected by their first close contact, or by their family if no close contact infected them.
+
+        Patients, their close contacts and families are visited in order of id, so the random numbers are drawn in
+        the same order however the sets and dictionaries were built, such as after restoring a checkpoint.
 
          - Preconditions:
             close_contact_distance >= 0
         """
+        infectors, infectees = [], []
+        sick_by_family = {}
+        for patient in sorted(self.infected, key=person_id):
+            sick_by_family.setdefault(patient.family_id, []).append(patient)
+            for other_id in sorted(patient.close_contact):
+                other = patient.close_contact[other_id].person2
+                if other.family_id != patient.family_id and other.state == SUSCEPTIBLE:
+                    infectors.append(patient)
+                    infectees.append(other)
+        exposed, exposed_families = [], []
+        for family in sorted(sick_by_family):
+            # Families with nobody left to infect are skipped without looking at their members
+            if self.family_counts[family][0] > 0:
+                for member in self.id_to_family[family]:
+                    if member.state == SUSCEPTIBLE:
+                        exposed.append(member)
+                        exposed_families.append(family)
+        if self.profiler is not None:
+            self.profiler.record('infection_trials', len(infectees) + len(exposed))
+
+        contact_draws = self.rng.uniforms(len(infectees))
+        family_draws = self.rng.uniforms(len(exposed))
         newly_infected = set()
-        for patient in self.infected:
-            for family_edge in patient.family.values():
-                potencial_infect = family_edge.infect(close_contact_distance, self.infectivity)
-                if potencial_infect is not None:
-                    newly_infected.add(potencial_infect)
-            for edge in patient.close_contact.values():
-                value = edge.infect(close_contact_distance, self.infectivity)
-                if value is not None and value.family_id != patient.family_id:
-                    newly_infected.add(value)
+        logged_infectors, logged_infectees, kinds, distances = [], [], [], []
+
+        if infectees:
+            delta = (np.array([person.location for person in infectors], dtype=np.float64)
+                     - np.array([person.location for person in infectees], dtype=np.float64))
+            contact_distances = np.sqrt(delta[:, 0] ** 2 + delta[:, 1] ** 2)
+            hits = np.flatnonzero(contact_draws < contact_infection_chance(contact_distances, close_contact_distance,
+                                                                           self.infectivity))
+            # Keep the first pair that infected each person, in the order the pairs were tried
+            for i in hits.tolist():
+                if infectees[i] not in newly_infected:
+                    newly_infected.add(infectees[i])
+                    logged_infectors.append(infectors[i].id)
+                    logged_infectees.append(infectees[i].id)
+                    kinds.append(CONTACT)
+                    distances.append(float(contact_distances[i]))
+
+        if exposed:
+            exposure = np.array([len(sick_by_family[family]) for family in exposed_families], dtype=np.int64)
+            hits, picks = family_infections(family_draws, exposure, self.infectivity)
+            for i, pick in zip(hits.tolist(), picks.tolist()):
+                member = exposed[i]
+                if member not in newly_infected:
+                    newly_infected.add(member)
+                    infector = sick_by_family[exposed_families[i]][pick]
+                    logged_infectors.append(infector.id)
+                    logged_infectees.append(member.id)
+                    kinds.append(FAMILY)
+                    distances.append(((infector.location[0] - member.location[0]) ** 2
+                                      + (infector.location[1] - member.location[1]) ** 2) ** 0.5)
+
+        if self.infection_log is not None and logged_infectees:
+            self.infection_log.record(current_frame + 1, logged_infectors, logged_infectees, kinds, distances)
         return newly_infected
 
 
+def person_id(person: Person) -> int:
+    """Return the id of person, for sorting people by id."""
+    return person.id
+
+
 if __name__ == '__main__':
     import python_ta
 
     python_ta.check_all(config={
-        'extra-imports': [],  # the names (strs) of imported modules
+        'extra-imports': ['numpy'],  # the names (strs) of imported modules
         'allowed-io': [],  # the names (strs) of functions that call print/open/input
         'disable': ['E9999', 'R1702'],
         'max-line-length': 120
@@ -0,0 +1,231 @@
+"""
+The infection log class
+An InfectionLog keeps one event for every infection in a simulation: the frame it happened, who infected whom,
+whether it was through their family or a close contact, and how far apart the two people were. Events are appended
+to arrays that grow by doubling, so logging one frame costs a few array copies and the log can stay on for large
+simulations. From the log, the questions usually asked about an outbreak are answered with a few array operations.
+"""
+from __future__ import annotations
+from typing import Any, Optional
+import numpy as np
+# from python_ta.contracts import check_contracts
+
+# The kind of the event of a person who was infected at the start of the simulation, who has no infector
+INITIAL = 0
+NO_INFECTOR = -1
+
+
+# @check_contracts
+class InfectionLog:
+    """An append only log of infection events, stored as one array per field. Events are in the order they were
+    logged, so their frames never decrease, and everyone is infected at most once, so each person is the infectee of
+    at most one event.
+
+    Instance Attributes:
+    - population: the number of people in the simulation, whose ids are 0 up to population - 1
+    - infected_at: the frame every person was infected, or -1 if they have not been
+    - infector_of: the id of the person who infected every person, or NO_INFECTOR if they were infected at the start
+    or have not been infected
+
+    Private Instance Attributes:
+    - _size: the number of events logged
+    - _frames, _infectors, _infectees, _kinds, _distances: the fields of every event, of which the first _size
+    entries are used
+    - _children: the infectees of every person, as (order, starts) where the infectees of person i are
+    order[starts[i]:starts[i + 1]], or None if it needs to be built again
+
+    Representation Invariants:
+    - 0 <= self._size <= len(self._frames)
+    - all(kind in {INITIAL, person_edge.FAMILY, person_edge.CONTACT} for kind in self.kinds)
+    """
+    population: int
+    infected_at: np.ndarray
+    infector_of: np.ndarray
+    _size: int
+    _frames: np.ndarray
+    _infectors: np.ndarray
+    _infectees: np.ndarray
+    _kinds: np.ndarray
+    _distances: np.ndarray
+    _children: Optional[tuple[np.ndarray, np.ndarray]]
+
+    def __init__(self, population: int, capacity: int = 1024) -> None:
+        """Initialize an empty log for population people, with room for capacity events before it has to grow.
+
+        Preconditions:
+        - population >= 0
+        - capacity >= 1
+        """
+        self.population = population
+        self.infected_at = np.full(population, -1, dtype=np.int64)
+        self.infector_of = np.full(population, NO_INFECTOR, dtype=np.int64)
+        self._size = 0
+        self._frames = np.empty(capacity, dtype=np.int64)
+        self._infectors = np.empty(capacity, dtype=np.int64)
+        self._infectees = np.empty(capacity, dtype=np.int64)
+        self._kinds = np.empty(capacity, dtype=np.int8)
+        self._distances = np.empty(capacity, dtype=np.float32)
+        self._children = None
+
+    def __len__(self) -> int:
+        """Return the number of events logged."""
+        return self._size
+
+    @property
+    def frames(self) -> np.ndarray:
+        """The frame of every event."""
+        return self._frames[:self._size]
+
+    @property
+    def infectors(self) -> np.ndarray:
+        """The id of the infector of every event, or NO_INFECTOR for people infected at the start."""
+        return self._infectors[:self._size]
+
+    @property
+    def infectees(self) -> np.ndarray:
+        """The id of the person infected in every event."""
+        return self._infectees[:self._size]
+
+    @property
+    def kinds(self) -> np.ndarray:
+        """The kind of every event: FAMILY or CONTACT from person_edge, or INITIAL."""
+        return self._kinds[:self._size]
+
+    @property
+    def distances(self) -> np.ndarray:
+        """The distance in pixels between the infector and the infectee of every event."""
+        return self._distances[:self._size]
+
+    def record(self, frame: int, infectors: np.ndarray | list[int], infectees: np.ndarray | list[int],
+               kinds: np.ndarray | list[int], distances: np.ndarray | list[float]) -> None:
+        """Append one event for each infectee, all of which happened at frame.
+
+        Preconditions:
+        - len(infectors) == len(infectees) == len(kinds) == len(distances)
+        - no infectee has been logged before, and frame is no earlier than any frame logged before
+        """
+        count = len(infectees)
+        if count == 0:
+            return
+        if self._size + count > len(self._frames):
+            self._grow(self._size + count)
+        end = self._size + count
+        self._frames[self._size:end] = frame
+        self._infectors[self._size:end] = infectors
+        self._infectees[self._size:end] = infectees
+        self._kinds[self._size:end] = kinds
+        self._distances[self._size:end] = distances
+        self.infected_at[self._infectees[self._size:end]] = frame
+        self.infector_of[self._infectees[self._size:end]] = self._infectors[self._size:end]
+        self._size = end
+        self._children = None
+
+    def record_initial(self, frame: int, infectees: np.ndarray | list[int]) -> None:
+        """Append an event with no infector for each person infected at the start of the simulation."""
+        count = len(infectees)
+        self.record(frame, [NO_INFECTOR] * count, infectees, [INITIAL] * count, [0.0] * count)
+
+    def _grow(self, needed: int) -> None:
+        """Make room for at least needed events, doubling the capacity so appending stays cheap."""
+        capacity = max(needed, 2 * len(self._frames))
+        for name in ('_frames', '_infectors', '_infectees', '_kinds', '_distances'):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def get_state(self) -> dict[str, Any]:
+        """Return the population and a copy of the fields of every event, from which from_state rebuilds the log."""
+        return {'population': self.population, 'frames': self.frames.copy(), 'infectors': self.infectors.copy(),
+                'infectees': self.infectees.copy(), 'kinds': self.kinds.copy(), 'distances': self.distances.copy()}
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any]) -> InfectionLog:
+        """Return a log with the events of a state returned by get_state."""
+        size = len(state['frames'])
+        log = cls(int(state['population']), max(1, size))
+        log._frames[:size] = state['frames']
+        log._infectors[:size] = state['infectors']
+        log._infectees[:size] = state['infectees']
+        log._kinds[:size] = state['kinds']
+        log._distances[:size] = state['distances']
+        log._size = size
+        log.infected_at[log.infectees] = log.frames
+        log.infector_of[log.infectees] = log.infectors
+        return log
+
+    def secondary_cases(self) -> np.ndarray:
+        """Return the number of people every person has infected, indexed by id."""
+        infectors = self.infectors
+        return np.bincount(infectors[infectors != NO_INFECTOR], minlength=self.population)
+
+    def secondary_case_distribution(self) -> np.ndarray:
+        """Return an array whose k-th entry is the number of infected people who infected exactly k others."""
+        return np.bincount(self.secondary_cases()[self.infectees])
+
+    def reproduction_numbers(self, last_frame: Optional[int] = None) -> np.ndarray:
+        """Return R_t for every frame t up to last_frame: the mean number of people infected by the people who were
+        infected at frame t, or NaN if nobody was infected at frame t. If last_frame is None, go up to the last frame
+        logged.
+
+        People infected recently may still go on to infect others, so R_t of the last frames only counts the
+        infections so far.
+        """
+        if last_frame is None:
+            last_frame = int(self.frames[-1]) if self._size > 0 else 0
+        infected = self.infectees
+        frames = self.infected_at[infected]
+        totals = np.bincount(frames, weights=self.secondary_cases()[infected], minlength=last_frame + 1)
+        counts = np.bincount(frames, minlength=last_frame + 1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return (totals / counts)[:last_frame + 1]
+
+    def generation_intervals(self) -> np.ndarray:
+        """Return the number of frames between the infection of the infector and the infectee of every event that
+        has an infector.
+        """
+        has_infector = self.infectors != NO_INFECTOR
+        return self.frames[has_infector] - self.infected_at[self.infectors[has_infector]]
+
+    def subtree_size(self, person: int) -> int:
+        """Return the number of people in the chain of infections that started from person, including person. This
+        is 1 for someone who infected nobody, and 0 for someone who was never infected.
+
+        Preconditions:
+        - 0 <= person < self.population
+        """
+        if self.infected_at[person] < 0:
+            return 0
+        order, starts = self._child_index()
+        size = 0
+        frontier = np.array([person])
+        while len(frontier) > 0:
+            size += len(frontier)
+            # The infectees of every person in the frontier, found with one slice per person
+            frontier = np.concatenate([order[starts[i]:starts[i + 1]] for i in frontier.tolist()])
+        return size
+
+    def _child_index(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return the infectees of every person as (order, starts), building it again only if events were logged
+        since it was last built.
+        """
+        if self._children is None:
+            infectors = self.infectors
+            has_infector = infectors != NO_INFECTOR
+            parents = infectors[has_infector]
+            order = self.infectees[has_infector][np.argsort(parents, kind='stable')]
+            starts = np.zeros(self.population + 1, dtype=np.int64)
+            np.cumsum(np.bincount(parents, minlength=self.population), out=starts[1:])
+            self._children = (order, starts)
+        return self._children
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['numpy'],  # the names (strs) of imported modules
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'disable': ['E9999', 'R0902', 'R0913'],
+        'max-line-length': 120
+    })
@@ -3,9 +3,19 @@
 GROUP MEMBERS: Richard Chen, Bill Lin, Runtong Liang, Yiyue Deng
 
 This is the main runner file for our CSC111 project
+The frontend, and with it pygame, is only imported when the project is run, so importing this file costs next to
+nothing.
+Set the SIMULATION_DEBUG environment variable to 1 to check contracts while running.
 """
-from frontend import Runner
 
-if __name__ == '__main__':
+
+def main() -> None:
+    """Open the pygame window and run the project until the window is closed."""
+    from frontend import Runner
+
     runner = Runner(24)
     runner.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,310 @@
+"""
+This file contains the mobility models.
+A mobility model moves every person of a simulation at once: it takes the (n, 2) array of everyone's location and
+returns where they are in the next frame, with one set of array operations per frame however many people there are.
+Models that remember something about each person, such as the direction they are heading in or where their family
+lives, keep it in arrays of their own, with row i belonging to the person with id i.
+
+The models are:
+- straight: everyone moves diagonally at a constant speed and bounces off the walls
+- brownian: everyone moves their speed in a new random direction every frame
+- waypoint: everyone walks to a random point, pauses there, then picks another one
+- home: everyone wanders like brownian, but is pulled back towards the home of their family
+- levy: everyone jumps in a random direction every frame, usually a short way but now and then very far
+"""
+from __future__ import annotations
+from typing import Any, Optional
+import numpy as np
+# from python_ta.contracts import check_contracts
+
+
+class MobilityModel:
+    """Moves everyone in a simulation in one batched call. This is an abstract class: use one of its subclasses.
+
+    The walls are at lower and upper on both axes, and positions always stay between them.
+
+    Instance Attributes:
+    - name: the name of the model in MOBILITY_MODELS
+    """
+    name: str
+
+    def start(self, positions: np.ndarray, speeds: np.ndarray, family_ids: np.ndarray, rng: np.random.Generator,
+              lower: float, upper: float) -> None:
+        """Set up whatever the model remembers about each person, for people at positions who move speeds pixels
+        per frame and belong to the families family_ids. Models that remember nothing draw nothing.
+
+        Preconditions:
+        - len(positions) == len(speeds) == len(family_ids)
+        - lower < upper
+        """
+
+    def move(self, positions: np.ndarray, speeds: np.ndarray, rng: np.random.Generator, lower: float,
+             upper: float) -> np.ndarray:
+        """Return the positions of everyone in the next frame, from their positions in this frame.
+
+        Preconditions:
+        - start has been called for the same people, or set_state with a state of theirs
+        - lower < upper
+        """
+        raise NotImplementedError
+
+    def get_state(self) -> dict[str, Any]:
+        """Return the parameters of the model and what it remembers about each person, as numbers and arrays."""
+        return {}
+
+    def set_state(self, state: dict[str, Any]) -> None:
+        """Carry on from a state returned by get_state."""
+
+
+# @check_contracts
+class StraightLine(MobilityModel):
+    """Everyone moves along their own velocity, which flips on an axis when they hit a wall on it.
+
+    Instance Attributes:
+    - velocities: an (n, 2) array of how far each person moves along each axis every frame, or None before start
+    """
+    velocities: Optional[np.ndarray]
+
+    def __init__(self) -> None:
+        self.name = 'straight'
+        self.velocities = None
+
+    def start(self, positions: np.ndarray, speeds: np.ndarray, family_ids: np.ndarray, rng: np.random.Generator,
+              lower: float, upper: float) -> None:
+        """Send everyone diagonally in a random direction, int(speed / sqrt 2) pixels along each axis, as in
+        Person.
+        """
+        self.velocities = rng.choice([-1.0, 1.0], size=positions.shape) * np.trunc(speeds / 2 ** 0.5)[:, np.newaxis]
+
+    def move(self, positions: np.ndarray, speeds: np.ndarray, rng: np.random.Generator, lower: float,
+             upper: float) -> np.ndarray:
+        """Move everyone along their velocity, flipping the velocity of anyone who hits a wall."""
+        nxt = positions + self.velocities
+        over = nxt > upper
+        nxt[over] = 2 * upper - nxt[over]
+        under = nxt < lower
+        nxt[under] = 2 * lower - nxt[under]
+        self.velocities[over | under] *= -1
+        return nxt
+
+    def get_state(self) -> dict[str, Any]:
+        """Return the velocity of everyone."""
+        return {'velocities': self.velocities.copy()}
+
+    def set_state(self, state: dict[str, Any]) -> None:
+        """Carry on from a state returned by get_state."""
+        self.velocities = np.array(state['velocities'], dtype=np.float64)
+
+
+# @check_contracts
+class Brownian(MobilityModel):
+    """Everyone moves their speed in a random direction every frame, bouncing off the walls."""
+
+    def __init__(self) -> None:
+        self.name = 'brownian'
+
+    def move(self, positions: np.ndarray, speeds: np.ndarray, rng: np.random.Generator, lower: float,
+             upper: float) -> np.ndarray:
+        """Move everyone speed pixels in a random direction, bouncing off the walls."""
+        step = rng.uniform(-1, 1, size=positions.shape)
+        magnitude = np.sqrt(np.einsum('ij,ij->i', step, step))
+        magnitude[magnitude == 0] = 1
+        step *= (speeds / magnitude)[:, np.newaxis]
+        nxt = positions + step
+        nxt = np.where(nxt < lower, 2 * lower - nxt, nxt)
+        return np.where(nxt > upper, 2 * upper - nxt, nxt)
+
+
+# @check_contracts
+class RandomWaypoint(MobilityModel):
+    """Everyone walks at their speed in a straight line to a waypoint chosen uniformly at random, waits there for
+    pause_frames frames, and then chooses their next waypoint.
+
+    Instance Attributes:
+    - pause_frames: how many frames people wait at each waypoint
+    - waypoints: an (n, 2) array of where each person is walking to, or None before start
+    - pauses: how many more frames each person waits before walking on, or None before start
+
+    Representation Invariants:
+    - self.pause_frames >= 0
+    """
+    pause_frames: int
+    waypoints: Optional[np.ndarray]
+    pauses: Optional[np.ndarray]
+
+    def __init__(self, pause_frames: int = 0) -> None:
+        self.name = 'waypoint'
+        self.pause_frames = pause_frames
+        self.waypoints = None
+        self.pauses = None
+
+    def start(self, positions: np.ndarray, speeds: np.ndarray, family_ids: np.ndarray, rng: np.random.Generator,
+              lower: float, upper: float) -> None:
+        """Give everyone their first waypoint, to walk to straight away."""
+        self.waypoints = rng.uniform(lower, upper, size=positions.shape)
+        self.pauses = np.zeros(len(positions), dtype=np.int64)
+
+    def move(self, positions: np.ndarray, speeds: np.ndarray, rng: np.random.Generator, lower: float,
+             upper: float) -> np.ndarray:
+        """Move everyone who is not pausing towards their waypoint, and give the people who reach it a new one."""
+        delta = self.waypoints - positions
+        distance = np.sqrt(np.einsum('ij,ij->i', delta, delta))
+        walking = self.pauses == 0
+        arrived = walking & (distance <= speeds)
+        # People who would walk past their waypoint stop on it
+        fraction = np.where(walking & ~arrived, speeds / np.maximum(distance, 1e-12), walking)
+        nxt = positions + delta * fraction[:, np.newaxis]
+
+        self.pauses[~walking] -= 1
+        self.pauses[arrived] = self.pause_frames
+        self.waypoints[arrived] = rng.uniform(lower, upper, size=(int(arrived.sum()), 2))
+        return nxt
+
+    def get_state(self) -> dict[str, Any]:
+        """Return the pause, and the waypoint and the frames left to wait of everyone."""
+        return {'pause_frames': self.pause_frames, 'waypoints': self.waypoints.copy(), 'pauses': self.pauses.copy()}
+
+    def set_state(self, state: dict[str, Any]) -> None:
+        """Carry on from a state returned by get_state."""
+        self.pause_frames = int(state['pause_frames'])
+        self.waypoints = np.array(state['waypoints'], dtype=np.float64)
+        self.pauses = np.array(state['pauses'], dtype=np.int64)
+
+
+# @check_contracts
+class HomeAnchored(MobilityModel):
+    """Every family has a home at a random location. Everyone takes a random step of their speed every frame, as in
+    Brownian, and is also pulled attraction of the way back to their home, so families spread out around their
+    homes by about speed / sqrt(2 * attraction) pixels instead of over the whole world.
+
+    Instance Attributes:
+    - attraction: the fraction of the way home people are pulled every frame
+    - homes: an (n, 2) array of the home of each person's family, or None before start
+
+    Representation Invariants:
+    - 0 <= self.attraction <= 1
+    """
+    attraction: float
+    homes: Optional[np.ndarray]
+
+    def __init__(self, attraction: float = 0.05) -> None:
+        self.name = 'home'
+        self.attraction = attraction
+        self.homes = None
+
+    def start(self, positions: np.ndarray, speeds: np.ndarray, family_ids: np.ndarray, rng: np.random.Generator,
+              lower: float, upper: float) -> None:
+        """Give every family a home, chosen uniformly at random."""
+        family_homes = rng.uniform(lower, upper, size=(int(family_ids.max(initial=0)) + 1, 2))
+        self.homes = family_homes[family_ids]
+
+    def move(self, positions: np.ndarray, speeds: np.ndarray, rng: np.random.Generator, lower: float,
+             upper: float) -> np.ndarray:
+        """Move everyone a random step and part of the way home, bouncing off the walls."""
+        step = random_directions(rng, len(positions)) * speeds[:, np.newaxis]
+        return reflect(positions + step + self.attraction * (self.homes - positions), lower, upper)
+
+    def get_state(self) -> dict[str, Any]:
+        """Return the attraction and the home of everyone."""
+        return {'attraction': self.attraction, 'homes': self.homes.copy()}
+
+    def set_state(self, state: dict[str, Any]) -> None:
+        """Carry on from a state returned by get_state."""
+        self.attraction = float(state['attraction'])
+        self.homes = np.array(state['homes'], dtype=np.float64)
+
+
+# @check_contracts
+class LevyFlight(MobilityModel):
+    """Everyone jumps in a random direction every frame. Jump lengths follow a Pareto distribution with the given
+    exponent, starting at each person's speed, so most jumps are short but a few cross much of the world, the way
+    people mostly stay near where they are but sometimes travel far.
+
+    Instance Attributes:
+    - exponent: the exponent of the tail of the jump lengths; the smaller it is, the more often people jump far
+    - max_jump: the longest jump, as a fraction of the side of the world
+
+    Representation Invariants:
+    - self.exponent > 0
+    - 0 < self.max_jump <= 1
+    """
+    exponent: float
+    max_jump: float
+
+    def __init__(self, exponent: float = 1.5, max_jump: float = 0.5) -> None:
+        self.name = 'levy'
+        self.exponent = exponent
+        self.max_jump = max_jump
+
+    def move(self, positions: np.ndarray, speeds: np.ndarray, rng: np.random.Generator, lower: float,
+             upper: float) -> np.ndarray:
+        """Move everyone one jump, bouncing off the walls."""
+        # 1 - random is in (0, 1], so the lengths are at least speeds and never infinite
+        lengths = np.minimum(speeds * (1 - rng.random(len(positions))) ** (-1 / self.exponent),
+                             self.max_jump * (upper - lower))
+        return reflect(positions + random_directions(rng, len(positions)) * lengths[:, np.newaxis], lower, upper)
+
+    def get_state(self) -> dict[str, Any]:
+        """Return the exponent and the longest jump."""
+        return {'exponent': self.exponent, 'max_jump': self.max_jump}
+
+    def set_state(self, state: dict[str, Any]) -> None:
+        """Carry on from a state returned by get_state."""
+        self.exponent = float(state['exponent'])
+        self.max_jump = float(state['max_jump'])
+
+
+MOBILITY_MODELS = {'straight': StraightLine, 'brownian': Brownian, 'waypoint': RandomWaypoint,
+                   'home': HomeAnchored, 'levy': LevyFlight}
+
+
+def random_directions(rng: np.random.Generator, n: int) -> np.ndarray:
+    """Return an (n, 2) array of random unit vectors, made the same way as the steps of Brownian."""
+    step = rng.uniform(-1, 1, size=(n, 2))
+    magnitude = np.sqrt(np.einsum('ij,ij->i', step, step))
+    magnitude[magnitude == 0] = 1
+    return step / magnitude[:, np.newaxis]
+
+
+def reflect(positions: np.ndarray, lower: float, upper: float) -> np.ndarray:
+    """Return positions bounced off the walls at lower and upper as many times as it takes to land between them.
+
+    Preconditions:
+    - lower < upper
+    """
+    nxt = np.where(positions < lower, 2 * lower - positions, positions)
+    nxt = np.where(nxt > upper, 2 * upper - nxt, nxt)
+    # Only a step longer than the world bounces more than once
+    out = (nxt < lower) | (nxt > upper)
+    if out.any():
+        width = upper - lower
+        folded = np.mod(positions[out] - lower, 2 * width)
+        nxt[out] = lower + np.where(folded > width, 2 * width - folded, folded)
+    return nxt
+
+
+def make_mobility(name: str) -> MobilityModel:
+    """Return a new mobility model called name, with its default parameters.
+
+    Preconditions:
+    - name in MOBILITY_MODELS
+    """
+    return MOBILITY_MODELS[name]()
+
+
+def mobility_from_state(name: str, state: dict[str, Any]) -> MobilityModel:
+    """Return the mobility model called name carrying on from state, a state returned by its get_state."""
+    model = make_mobility(name)
+    model.set_state(state)
+    return model
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['numpy'],  # the names (strs) of imported modules
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'disable': ['E9999', 'R0913'],
+        'max-line-length': 120
+    })
@@ -3,9 +3,10 @@ This file contains both the person and the edge class
 """
 
 from __future__ import annotations
-import random
 from typing import Optional
+import numpy as np
 # from python_ta.contracts import check_contracts
+from random_stream import RandomStream
 
 SUSCEPTIBLE = 1
 INFECTED = 2
@@ -14,6 +15,45 @@ CONTACT = 9
 FAMILY = 8
 
 
+def family_infection_chance(infectivity: float) -> float:
+    """Return the chance that an infected person infects a susceptible member of their family in one frame."""
+    return infectivity / 100
+
+
+def family_infections(draws: np.ndarray, exposure: np.ndarray, infectivity: float) -> tuple[np.ndarray, np.ndarray]:
+    """Return (hits, picks) for susceptible people with exposure[i] infected family members and one uniform draw
+    draws[i] each: hits are the indices of the people who get infected, and member picks[j] of the infected members
+    of the family of person hits[j], in order of id, is the one who infected them.
+
+    Each infected member infects with chance p = family_infection_chance(infectivity), as in Edge.infect, so
+    someone with k infected members is infected with chance 1 - (1 - p) ** k, and the first of the k members to
+    infect them is the j-th with chance (1 - p) ** j * p. Given that the draw u hit, that is the j with
+    (1 - p) ** j >= 1 - u > (1 - p) ** (j + 1), so the infector is picked from the same draw, with the chances the
+    pair by pair trials would have given.
+
+    Preconditions:
+    - draws.shape == exposure.shape
+    - all(k >= 0 for k in exposure)
+    """
+    chance = family_infection_chance(infectivity)
+    hits = np.flatnonzero(draws < 1 - (1 - chance) ** exposure)
+    if 0 < chance < 1:
+        picks = np.floor(np.log1p(-draws[hits]) / np.log1p(-chance)).astype(np.int64)
+    else:
+        picks = np.zeros(len(hits), dtype=np.int64)
+    return hits, np.minimum(picks, exposure[hits] - 1)
+
+
+def contact_infection_chance(distance: float, close_contact_distance: int, infectivity: float) -> float:
+    """Return the chance that an infected person infects a susceptible close contact from another family in one
+    frame, when the two of them are distance apart. This works on NumPy arrays of distances as well.
+
+    Preconditions:
+    - close_contact_distance > 0
+    """
+    return infectivity - ((close_contact_distance - distance) / close_contact_distance) ** 2
+
+
 # @check_contracts
 class Person:
     """This class is a representation of a person in the square or a node in the graph.
@@ -26,15 +66,22 @@ class Person:
     - move: How much interms of x and y a person will move in the next frame
     - close_contact: A dictionary contaning all the close contact perople with self. Key is the id of it's neighbors
     assciated
-    - family: A dictionary contaning all the Person with the same family as self.
     - infection_frame: The frame that self is infected, this is None when self is not infected
+    - recovery_frame: The frame that self recovers in, decided when self is infected, this is None when self is not
+    infected
     - frames_per_second: The frames/sec for the simulation
     - last_move: The last move made by the person, used for Brownian motion
+    - rng: The random stream of the simulation this person is in
+
+    The members of a family are listed in Graph.id_to_family rather than stored on every Person, and Person
+    uses __slots__, so a person takes no more memory than their attributes.
 
     Representation Invariants:
     - not (self.state is INFECTED) or self.infection_frame is not None
-    - 0 <= self.location[0] <= 500 and 0 <= self.location[1] <= 500
+    - 0 <= self.location[0] and 0 <= self.location[1]
     """
+    __slots__ = ('id', 'family_id', 'state', 'location', 'move', 'speed', 'close_contact', 'infection_frame',
+                 'recovery_frame', 'frames_per_second', 'last_move', 'rng')
     id: int
     family_id: int
     state: SUSCEPTIBLE | INFECTED | RECOVERED
@@ -42,35 +89,52 @@ class Person:
     move: [int, int]
     speed: float
     close_contact: dict[int: Edge]
-    family: dict[int: Edge]
     infection_frame: Optional[int]
+    recovery_frame: Optional[int]
     frames_per_second: int
-    last_move: list[float, float]
+    last_move: tuple[float, float]
+    rng: RandomStream
 
-    def __init__(self, x: int, y: int, speed: int, family_id: int, identification: int, fps: int) -> None:
-        """Initialize a person. Status: 0 for susceptable, 1 for infected and 2 for recovered.
+    def __init__(self, x: int, y: int, speed: int, family_id: int, identification: int, fps: int,
+                 rng: RandomStream, move: Optional[list[int]] = None) -> None:
+        """Initialize a person. Status: 0 for susceptable, 1 for infected and 2 for recovered. If move is None, the
+        person moves diagonally in a random direction; otherwise they move by move each frame and nothing is drawn
+        from rng.
 
         Preconditions:
         - speed >= 1
         """
         self.state = SUSCEPTIBLE
-        self.family = {}
         self.family_id = family_id
         self.location = [x, y]
         self.speed = speed
         self.close_contact = {}
         self.infection_frame = None
+        self.recovery_frame = None
         self.id = identification
-        moving_value = speed / 2 ** 0.5
-        direction = [-1, 1]
-        self.move = [int(random.choice(direction) * moving_value), int(random.choice(direction) * moving_value)]
+        self.rng = rng
+        if move is None:
+            moving_value = speed / 2 ** 0.5
+            direction = [-1, 1]
+            move = [int(rng.choice(direction) * moving_value), int(rng.choice(direction) * moving_value)]
+        self.move = move
         self.speed = speed * fps
         self.frames_per_second = fps
+        self.last_move = (0.0, 0.0)
 
-    def make_move_brownian(self) -> None:
-        """Makes random moves for person in a Brownian motion by updating location"""
+    def __hash__(self) -> int:
+        """Hash a person by their id, so sets of people are iterated in the same order in every run."""
+        return self.id
+
+    def make_move_brownian(self, lower: int, upper: int) -> None:
+        """Makes random moves for person in a Brownian motion by updating location, bouncing off the walls at lower
+        and upper on both axes
+
+        Preconditions:
+        - lower < upper
+        """
         x, y = self.location
-        dx, dy = random.uniform(-1, 1), random.uniform(-1, 1)
+        dx, dy = self.rng.uniform(-1, 1), self.rng.uniform(-1, 1)
         magnitude = (dx ** 2 + dy ** 2) ** 0.5  # magnitude of movement vector
         if magnitude != 0:
             dx, dy = dx / magnitude, dy / magnitude  # normalize the vector to a unit vector
@@ -79,50 +143,70 @@ class Person:
         x += dx
         y += dy
         # Make the person bounce off the borders
-        if x < 10:
-            x = 10 + (10 - x)
-        elif x > 490:
-            x = 980 - x
-        if y < 10:
-            y = 10 + (10 - y)
-        elif y > 490:
-            y = 980 - y
-        self.last_move = [dx, dy]
+        if x < lower:
+            x = lower + (lower - x)
+        elif x > upper:
+            x = 2 * upper - x
+        if y < lower:
+            y = lower + (lower - y)
+        elif y > upper:
+            y = 2 * upper - y
+        self.last_move = (dx, dy)
         self.location = [x, y]
         # self.last_move_time = time.time()
 
-    def make_move_person(self) -> None:
-        """More the person to location of the next frame and bounce back when the person hits the wall.
+    def make_move_person(self, lower: int, upper: int) -> None:
+        """More the person to location of the next frame and bounce back when the person hits the wall at lower or
+        upper on either axis.
+
+        Preconditions:
+        - lower < upper
         """
         next_x = self.location[0] + self.move[0]
         next_y = self.location[1] + self.move[1]
-        if next_x > 490:
+        if next_x > upper:
             self.move[0] = -self.move[0]
-            next_x = 490 - (next_x - 490)
-        if next_x < 10:
+            next_x = upper - (next_x - upper)
+        if next_x < lower:
             self.move[0] = -self.move[0]
-            next_x = 10 + (10 - next_x)
-        if next_y > 490:
+            next_x = lower + (lower - next_x)
+        if next_y > upper:
             self.move[1] = -self.move[1]
-            next_y = 490 - (next_y - 490)
-        if next_y < 10:
+            next_y = upper - (next_y - upper)
+        if next_y < lower:
             self.move[1] = -self.move[1]
-            next_y = 10 + (10 - next_y)
+            next_y = lower + (lower - next_y)
         self.location[0], self.location[1] = next_x, next_y
 
-    def create_close_contact_edge(self, person: Person) -> None:
-        """Creat a close contact edge between two person.
+    def create_close_contact_edge(self, person: Person, edge: Optional[Edge] = None) -> None:
+        """Creat a close contact edge between two person. Both people share one edge, so it only needs to be
+        removed once. If edge is given, it is reused instead of making a new Edge.
 
         Precondation:
         - person.state == SUSCEPTIBLE or self.state == SUSCEPTIBLE
+        - person.id not in self.close_contact
+        """
+        if edge is None:
+            edge = Edge(self, person)
+        else:
+            edge.person1, edge.person2 = self, person
+        self.close_contact[person.id] = edge
+        person.close_contact[self.id] = edge
+
+    def remove_close_contact_edge(self, person: Person) -> Edge:
+        """Remove the close contact edge between self and person from both of them, and return it so that it can
+        be reused.
+
+        Precondation:
+        - person.id in self.close_contact
         """
-        self.close_contact[person.id] = Edge(self, person)
-        person.close_contact[self.id] = Edge(person, self)
+        person.close_contact.pop(self.id, None)
+        return self.close_contact.pop(person.id)
 
 
 class Edge:
-    """This class represent an edge between two people either a family edge or a close ocntact edge depend on the
-    family edge of person
+    """This class represent a close contact edge between two people. Family members are connected through
+    Graph.id_to_family instead of an Edge.
 
     Instance Attributes:
     - person1: the first person
@@ -131,6 +215,7 @@ class Edge:
     Representation Invariants:
     - self.person1 is not None and self.person2 is not None
     """
+    __slots__ = ('person1', 'person2')
     person1: Person
     person2: Person
 
@@ -144,7 +229,7 @@ class Edge:
         self.person1 = first
         self.person2 = second
 
-    def infect(self, close_contact_distance: int, infectivity: float) -> Optional[Person]:
+    def infect(self, close_contact_distance: int, infectivity: float, rng: RandomStream) -> Optional[Person]:
         """ This function have a chance of retuning a person who should be infected in self if one gets infected.
         This function will not return a person if none of the two person in self are infected. The chances of infection
         depend on if the two person are in the same family or if they are close contact.
@@ -159,15 +244,14 @@ class Edge:
                 self.person1.state == SUSCEPTIBLE and self.person2.state == INFECTED):
             # Separate check for people in the same family
             if self.person1.family_id == self.person2.family_id:
-                if random.random() <= infectivity / 100:
+                if rng.random() < family_infection_chance(infectivity):
                     return self.get_infected_person()
                 else:
                     return None
             else:
                 distance = ((self.person1.location[0] - self.person2.location[0]) ** 2 + (
                             self.person1.location[1] - self.person2.location[1]) ** 2) ** 0.5
-                chance = infectivity - ((close_contact_distance - distance) / close_contact_distance) ** 2
-                if random.random() < chance:
+                if rng.random() < contact_infection_chance(distance, close_contact_distance, infectivity):
                     return self.get_infected_person()
                 else:
                     return None
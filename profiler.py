@@ -0,0 +1,123 @@
+"""
+The frame profiler class
+A FrameProfiler collects how long each phase of a frame takes, and counters such as the number of pairs tested,
+over a rolling window of recent frames. Simulation, Graph and Runner only time their phases when they have a
+profiler, so profiling costs nothing when it is off. One profiler can be shared by the simulation worker thread and
+the frontend.
+"""
+from __future__ import annotations
+import json
+import math
+import threading
+from collections import deque
+# from python_ta.contracts import check_contracts
+
+
+# @check_contracts
+class FrameProfiler:
+    """Rolling samples of named timings and counters.
+
+    Instance Attributes:
+    - window: the number of most recent samples kept for each name
+    - samples: a dictionary mapping the name of a phase or counter to its most recent samples. Timings are in
+    seconds and counters are the amount counted in one frame.
+    - totals: a dictionary mapping every name to the sum of all of its samples, including the ones that have left
+    the window
+    - counts: a dictionary mapping every name to the number of samples ever recorded for it
+
+    Private Instance Attributes:
+    - _lock: held while samples are changed or read, so samples can be recorded from another thread
+
+    Representation Invariants:
+    - self.window >= 1
+    - all(len(self.samples[name]) <= self.window for name in self.samples)
+    """
+    window: int
+    samples: dict[str, deque[float]]
+    totals: dict[str, float]
+    counts: dict[str, int]
+    _lock: threading.RLock
+
+    def __init__(self, window: int = 600) -> None:
+        """Initialize an empty profiler that keeps the last window samples of every name.
+
+        Preconditions:
+        - window >= 1
+        """
+        self.window = window
+        self.samples = {}
+        self.totals = {}
+        self.counts = {}
+        self._lock = threading.RLock()
+
+    def record(self, name: str, value: float) -> None:
+        """Add one sample of value to name, such as the seconds one phase took or the amount of a counter in one
+        frame.
+        """
+        with self._lock:
+            if name not in self.samples:
+                self.samples[name] = deque(maxlen=self.window)
+                self.totals[name] = 0.0
+                self.counts[name] = 0
+            self.samples[name].append(value)
+            self.totals[name] += value
+            self.counts[name] += 1
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Return a dictionary mapping every name to the p50, p95, max and mean of its samples in the window, along
+        with its total over every sample ever recorded.
+        """
+        with self._lock:
+            window = {name: sorted(samples) for name, samples in self.samples.items()}
+            totals = dict(self.totals)
+        result = {}
+        for name, ordered in window.items():
+            result[name] = {
+                'p50': percentile(ordered, 50),
+                'p95': percentile(ordered, 95),
+                'max': ordered[-1],
+                'mean': sum(ordered) / len(ordered),
+                'total': totals[name]
+            }
+        return result
+
+    def reset(self) -> None:
+        """Forget every sample."""
+        with self._lock:
+            self.samples = {}
+            self.totals = {}
+            self.counts = {}
+
+    def export(self, path: str) -> None:
+        """Write the statistics and the samples in the window to a JSON file at path for offline analysis."""
+        with self._lock:
+            profile = {
+                'window': self.window,
+                'stats': self.stats(),
+                'counts': dict(self.counts),
+                'samples': {name: list(samples) for name, samples in self.samples.items()}
+            }
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(profile, file, indent=1)
+
+
+def percentile(ordered: list[float], percent: float) -> float:
+    """Return the percent-th percentile of the sorted list ordered, taking the nearest sample.
+
+    Preconditions:
+    - ordered != [] and ordered == sorted(ordered)
+    - 0 <= percent <= 100
+    """
+    index = max(0, math.ceil(percent / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['json', 'math', 'threading', 'collections'],  # the names (strs) of imported modules
+        'allowed-io': ['FrameProfiler.export'],  # the names (strs) of functions that call print/open/input
+        'disable': ['E9999'],
+        'max-line-length': 120
+    })
@@ -0,0 +1,122 @@
+"""
+The random stream class
+Each simulation owns one RandomStream, so two simulations with the same seed make exactly the same random choices
+and replicates running side by side never share random numbers.
+"""
+from __future__ import annotations
+import json
+from typing import Any, Optional, Sequence
+import numpy as np
+# from python_ta.contracts import check_contracts
+
+BLOCK_SIZE = 4096
+
+
+# @check_contracts
+class RandomStream:
+    """A seeded source of random numbers. Uniform numbers are drawn from a NumPy Generator a block at a time and
+    handed out one by one, so drawing a single number does not pay for a call into NumPy.
+
+    Instance Attributes:
+    - generator: the NumPy Generator every number comes from
+
+    Representation Invariants:
+    - 0 <= self._index <= len(self._buffer)
+    """
+    generator: np.random.Generator
+    _buffer: np.ndarray
+    _index: int
+
+    def __init__(self, seed: Optional[int] = None) -> None:
+        """Initialize the stream. Streams with the same seed produce the same numbers, and a seed of None gives
+        different numbers every time.
+        """
+        self.generator = np.random.default_rng(seed)
+        self._buffer = np.empty(0)
+        self._index = 0
+
+    def _refill(self, size: int) -> None:
+        """Replace the block of uniform numbers with size new ones."""
+        self._buffer = self.generator.random(size)
+        self._index = 0
+
+    def random(self) -> float:
+        """Return a uniform number in [0, 1)."""
+        if self._index == len(self._buffer):
+            self._refill(BLOCK_SIZE)
+        self._index += 1
+        return float(self._buffer[self._index - 1])
+
+    def uniforms(self, size: int) -> np.ndarray:
+        """Return an array of size uniform numbers in [0, 1), for drawing the numbers of many trials at once. They
+        are the same numbers size calls to random would return, so batching trials does not change a seeded run.
+
+        Preconditions:
+        - size >= 0
+        """
+        available = len(self._buffer) - self._index
+        if size <= available:
+            self._index += size
+            return self._buffer[self._index - size:self._index]
+        head = self._buffer[self._index:]
+        # Drawing whole blocks at once gives the same numbers as drawing them one block at a time
+        self._refill(-(-(size - available) // BLOCK_SIZE) * BLOCK_SIZE)
+        self._index = size - available
+        return np.concatenate((head, self._buffer[:self._index]))
+
+    def uniform(self, low: float, high: float) -> float:
+        """Return a uniform number in [low, high)."""
+        return low + (high - low) * self.random()
+
+    def randint(self, low: int, high: int) -> int:
+        """Return a random integer in [low, high], including both ends like random.randint.
+
+        Preconditions:
+        - low <= high
+        """
+        return low + int(self.random() * (high - low + 1))
+
+    def choice(self, options: Sequence[Any]) -> Any:
+        """Return a random element of options.
+
+        Preconditions:
+        - len(options) > 0
+        """
+        return options[int(self.random() * len(options))]
+
+    def sample(self, population: int, k: int) -> list[int]:
+        """Return k different integers chosen at random from range(population).
+
+        Preconditions:
+        - 0 <= k <= population
+        """
+        return [int(i) for i in self.generator.choice(population, size=k, replace=False)]
+
+    def get_state(self) -> dict[str, Any]:
+        """Return everything needed to carry on this stream from where it is: the state of the generator as JSON,
+        the block of numbers drawn and how many of them have been handed out.
+        """
+        return {'generator': json.dumps(self.generator.bit_generator.state), 'buffer': self._buffer.copy(),
+                'index': self._index}
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any]) -> RandomStream:
+        """Return a stream that carries on from a state returned by get_state, drawing the same numbers the stream
+        it was taken from would have drawn next.
+        """
+        stream = cls()
+        stream.generator.bit_generator.state = json.loads(str(state['generator']))
+        stream._buffer = np.array(state['buffer'], dtype=np.float64)
+        stream._index = int(state['index'])
+        return stream
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['json', 'numpy'],  # the names (strs) of imported modules
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'disable': ['E9999'],
+        'max-line-length': 120
+    })
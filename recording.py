@@ -0,0 +1,220 @@
+"""
+The recorder and recording classes
+A Recorder appends every frame of a run to a recording on disk, and a Recording reads one back. A recording is made
+of three files:
+- path: a header followed by one fixed size record per frame, holding the frame number, the position of every person
+  as float32 and the state of every person as int8. Since every record is the same size, frame i starts at a known
+  offset and the whole file can be memory mapped.
+- path + '.events': one (frame, person) record for every person infected, in the order they were infected
+- path + '.index': for every frame, the number of events recorded before it, so the events of any frame can be found
+  without reading the others
+
+Nothing is loaded into memory when a recording is opened, so recordings far larger than memory can be replayed.
+"""
+from __future__ import annotations
+import contextlib
+from typing import BinaryIO, Optional
+import numpy as np
+# from python_ta.contracts import check_contracts
+from person_edge import SUSCEPTIBLE, INFECTED
+from snapshot import Snapshot
+
+MAGIC = b'SIMREC\x00\x00'
+VERSION = 2
+# magic, version, num_family, family_size, world_size, padded to a fixed size
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('version', '<i4'), ('num_family', '<i4'), ('family_size', '<i4'),
+                         ('world_size', '<i4')])
+HEADER_SIZE = 64
+EVENT_DTYPE = np.dtype([('frame', '<i4'), ('person', '<i4')])
+
+
+def frame_dtype(population: int) -> np.dtype:
+    """Return the dtype of one frame record of a recording of population people."""
+    return np.dtype([('frame_num', '<i8'), ('positions', '<f4', (population, 2)), ('states', 'i1', (population,))])
+
+
+# @check_contracts
+class Recorder:
+    """Appends the frames of one simulation to a recording.
+
+    Instance Attributes:
+    - path: the path of the frame file of the recording
+    - num_family: number of families in the simulation being recorded
+    - family_size: number of people in one family
+    - world_size: the side of the square people move in, in pixels
+    - num_frames: the number of frames recorded so far
+
+    Private Instance Attributes:
+    - _frames: the open frame file
+    - _events: the open events file
+    - _index: the open index file
+    - _num_events: the number of events recorded so far
+    - _record: the record of one frame, reused for every frame
+    - _previous_states: the states of the last frame recorded, used to find who was infected in the next one
+
+    Representation Invariants:
+    - self.num_frames >= 0
+    """
+    path: str
+    num_family: int
+    family_size: int
+    world_size: int
+    num_frames: int
+    _frames: BinaryIO
+    _events: BinaryIO
+    _index: BinaryIO
+    _num_events: int
+    _record: np.ndarray
+    _previous_states: Optional[np.ndarray]
+
+    def __init__(self, path: str, num_family: int, family_size: int, world_size: int) -> None:
+        """Initialize the recorder, replacing any recording already at path."""
+        self.path = path
+        self.num_family = num_family
+        self.family_size = family_size
+        self.world_size = world_size
+        self.num_frames = 0
+        self._num_events = 0
+        self._record = np.zeros(1, dtype=frame_dtype(num_family * family_size))
+        self._previous_states = None
+
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header[0] = (MAGIC, VERSION, num_family, family_size, world_size)
+        # If a file cannot be opened or written, the files opened before it are closed again
+        with contextlib.ExitStack() as stack:
+            self._frames = stack.enter_context(open(path, 'wb'))
+            self._frames.write(header.tobytes().ljust(HEADER_SIZE, b'\x00'))
+            self._events = stack.enter_context(open(path + '.events', 'wb'))
+            self._index = stack.enter_context(open(path + '.index', 'wb'))
+            stack.pop_all()
+
+    def record(self, snapshot: Snapshot) -> None:
+        """Append the frame snapshot was taken at. The first frame recorded lists everyone already infected as
+        infected in that frame.
+
+        Preconditions:
+        - snapshot.num_family == self.num_family and snapshot.family_size == self.family_size
+        """
+        record = self._record[0]
+        record['frame_num'] = snapshot.frame_num
+        record['positions'] = snapshot.positions
+        record['states'] = snapshot.states
+        self._frames.write(self._record.tobytes())
+
+        if self._previous_states is None:
+            infected = np.flatnonzero(snapshot.states == INFECTED)
+        else:
+            infected = np.flatnonzero((snapshot.states == INFECTED) & (self._previous_states == SUSCEPTIBLE))
+        events = np.empty(len(infected), dtype=EVENT_DTYPE)
+        events['frame'] = snapshot.frame_num
+        events['person'] = infected
+        self._index.write(np.array([self._num_events], dtype='<i8').tobytes())
+        self._events.write(events.tobytes())
+        self._num_events += len(events)
+        self._previous_states = snapshot.states
+        self.num_frames += 1
+
+    def flush(self) -> None:
+        """Write every frame recorded so far to disk, so the recording can be read while it is still recording."""
+        for file in (self._frames, self._events, self._index):
+            file.flush()
+
+    def close(self) -> None:
+        """Finish the recording."""
+        for file in (self._frames, self._events, self._index):
+            file.close()
+
+
+# @check_contracts
+class Recording:
+    """A recording on disk, read through memory maps so only the frames asked for are read.
+
+    Instance Attributes:
+    - path: the path of the frame file of the recording
+    - num_family: number of families in the simulation recorded
+    - family_size: number of people in one family
+    - world_size: the side of the square people move in, in pixels
+    - frames: a memory mapped array with one record per frame, with the fields frame_num, positions and states
+    - events: a memory mapped array of (frame, person) for every person infected
+    - index: a memory mapped array of the number of events recorded before each frame
+
+    Private Instance Attributes:
+    - _family_ids: the family of every person, the same for every frame
+
+    Representation Invariants:
+    - len(self.index) >= len(self.frames)
+    """
+    path: str
+    num_family: int
+    family_size: int
+    world_size: int
+    frames: np.ndarray
+    events: np.ndarray
+    index: np.ndarray
+    _family_ids: np.ndarray
+
+    def __init__(self, path: str) -> None:
+        """Open the recording at path. A frame that was only partly written when the recording stopped is left
+        out.
+        """
+        self.path = path
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        if len(header) == 0 or header[0]['magic'] != MAGIC.rstrip(b'\x00') or header[0]['version'] != VERSION:
+            raise ValueError(f'{path} is not a recording')
+        self.num_family = int(header[0]['num_family'])
+        self.family_size = int(header[0]['family_size'])
+        self.world_size = int(header[0]['world_size'])
+        self._family_ids = np.repeat(np.arange(1, self.num_family + 1, dtype=np.int32), self.family_size)
+        self.frames = memory_map(path, frame_dtype(self.num_family * self.family_size), HEADER_SIZE)
+        self.events = memory_map(path + '.events', EVENT_DTYPE)
+        self.index = memory_map(path + '.index', np.dtype('<i8'))
+
+    def __len__(self) -> int:
+        """Return the number of frames recorded."""
+        return min(len(self.frames), len(self.index))
+
+    def snapshot(self, i: int) -> Snapshot:
+        """Return a Snapshot of the i-th frame recorded. Close contacts are not recorded, so it has none.
+
+        Preconditions:
+        - 0 <= i < len(self)
+        """
+        record = self.frames[i]
+        states = np.array(record['states'])
+        family_counts = np.bincount(self._family_ids * 3 + (states - SUSCEPTIBLE),
+                                    minlength=(self.num_family + 1) * 3).reshape(-1, 3)
+        counts = family_counts.sum(axis=0)
+        return Snapshot(int(record['frame_num']), self.num_family, self.family_size, self.world_size,
+                        np.array(record['positions'], dtype=np.float64), states, self._family_ids.copy(),
+                        np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64),
+                        (int(counts[0]), int(counts[1]), int(counts[2])), family_counts)
+
+    def infected_in(self, i: int) -> np.ndarray:
+        """Return the ids of the people who became infected in the i-th frame recorded.
+
+        Preconditions:
+        - 0 <= i < len(self)
+        """
+        end = self.index[i + 1] if i + 1 < len(self.index) else len(self.events)
+        return np.array(self.events['person'][self.index[i]:end], dtype=np.int64)
+
+
+def memory_map(path: str, dtype: np.dtype, offset: int = 0) -> np.ndarray:
+    """Return the whole records of dtype in the file at path after offset bytes, memory mapped read only."""
+    with open(path, 'rb') as file:
+        file.seek(0, 2)
+        count = (file.tell() - offset) // dtype.itemsize
+    if count <= 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,))
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['contextlib', 'numpy'],  # the names (strs) of imported modules
+        'allowed-io': ['Recorder.__init__', 'memory_map'],  # the names (strs) of functions that call print/open/input
+        'disable': ['E9999', 'R0902', 'R1732'],
+        'max-line-length': 120
+    })
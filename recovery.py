@@ -0,0 +1,102 @@
+"""
+The recovery schedule class
+A RecoverySchedule keeps every infected person in a bucket for the frame they recover in, so each frame takes out
+exactly the people who recover then instead of checking everyone who is infected. Since recovery frames are decided
+when people are infected, each person can have a recovery period of their own at no extra cost per frame.
+"""
+from __future__ import annotations
+from typing import Any, Optional
+import numpy as np
+# from python_ta.contracts import check_contracts
+
+
+# @check_contracts
+class RecoverySchedule:
+    """A timing wheel with one bucket per frame, kept in a dictionary so only the frames someone recovers in take up
+    memory. Items can be Persons or arrays of ids; the schedule does not look at them.
+
+    Private Instance Attributes:
+    - _buckets: a dictionary with a frame as key and the list of items that recover in that frame as value
+    - _size: the number of items scheduled, counting every id of an array
+
+    Representation Invariants:
+    - all(len(bucket) > 0 for bucket in self._buckets.values())
+    - self._size >= 0
+    """
+    _buckets: dict[int, list[Any]]
+    _size: int
+
+    def __init__(self) -> None:
+        """Initialize an empty schedule."""
+        self._buckets = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        """Return the number of people scheduled to recover."""
+        return self._size
+
+    def add(self, frame: int, item: Any) -> None:
+        """Schedule item to recover in frame."""
+        self._buckets.setdefault(frame, []).append(item)
+        self._size += 1
+
+    def add_many(self, frames: np.ndarray, ids: np.ndarray) -> None:
+        """Schedule ids[i] to recover in frames[i] for every i, adding one array of ids to each bucket.
+
+        Preconditions:
+        - len(frames) == len(ids)
+        """
+        if len(ids) == 0:
+            return
+        order = np.argsort(frames, kind='stable')
+        frames = frames[order]
+        ids = ids[order]
+        starts = np.flatnonzero(np.diff(frames)) + 1
+        for frame, group in zip(frames[np.concatenate(([0], starts))].tolist(), np.split(ids, starts)):
+            self._buckets.setdefault(frame, []).append(group)
+        self._size += len(ids)
+
+    def pop(self, frame: int) -> list[Any]:
+        """Remove and return everything scheduled to recover in frame, in the order it was added.
+
+        Preconditions:
+        - pop is called for every frame in order, so no earlier frame still has a bucket
+        """
+        bucket = self._buckets.pop(frame, [])
+        self._size -= sum(len(item) if isinstance(item, np.ndarray) else 1 for item in bucket)
+        return bucket
+
+    def pop_ids(self, frame: int) -> np.ndarray:
+        """Remove and return the ids scheduled to recover in frame as one array, for schedules filled by add_many.
+
+        Preconditions:
+        - pop_ids is called for every frame in order, so no earlier frame still has a bucket
+        """
+        bucket = self.pop(frame)
+        return np.concatenate(bucket) if bucket else np.empty(0, dtype=np.int64)
+
+
+def recovery_periods(generator: np.random.Generator, recover_period: int, shape: Optional[float],
+                     size: int) -> np.ndarray:
+    """Return the recovery periods in frames of size newly infected people. If shape is None, everyone gets
+    recover_period and no random number is drawn. Otherwise the periods are drawn from a gamma distribution with
+    the given shape and a mean of recover_period, rounded to whole frames.
+
+    Preconditions:
+    - recover_period >= 0
+    - shape is None or shape > 0
+    """
+    if shape is None:
+        return np.full(size, recover_period, dtype=np.int64)
+    return np.rint(generator.gamma(shape, recover_period / shape, size)).astype(np.int64)
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['numpy'],  # the names (strs) of imported modules
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'disable': ['E9999'],
+        'max-line-length': 120
+    })
@@ -2,12 +2,22 @@
 This file contains the simulation.
 """
 from __future__ import annotations
-import random
+import time
+from typing import Any, Optional
+import numpy as np
 # from python_ta.contracts import check_contracts
-from graph import Graph
-from person_edge import Person, INFECTED
+from graph import Graph, person_id
+from infection_log import InfectionLog
+from mobility import MobilityModel, mobility_from_state
+from person_edge import Person
+from profiler import FrameProfiler
+from random_stream import RandomStream
+from recovery import recovery_periods
+from snapshot import Snapshot
 
 NODE_RADIUS = 10
+# The side of the square people move in, in pixels, unless a simulation is given another
+WORLD_SIZE = 500
 
 
 # @check_contracts
@@ -22,11 +32,23 @@ class Simulation:
     - family_size: number of Person in one family
     - frame_num: this records the number of frame that have passed in this simulation
     - infected: this is a set of people that should be infected in the next frame.
-    - recover_period: after recover_period number of frames a person will recover in this simulation
+    - recover_period: after recover_period number of frames a person will recover in this simulation, or on
+    average if recovery_shape is not None
+    - recovery_shape: the shape of the gamma distribution each person's recovery period is drawn from when they are
+    infected, or None for everyone to recover after exactly recover_period frames
     - brownian: If True, people in this simulation move in brownian motions otherwise they randomly move and
     bounce back when hit a wall.
-    - id_to_family: This is a dictionary with id of a family associated with list of all the person in that family
+    - mobility: the MobilityModel that moves everyone at once each frame, or None to move each Person with
+    make_move_brownian or make_move_person as brownian says
+    - id_to_family: This is a dictionary with id of a family associated with list of all the person in that family,
+    the same dictionary as simu_graph.id_to_family
     - fps: frames per second in this simulation
+    - world_size: the side of the square people move in, in pixels. People stay NODE_RADIUS away from its edges.
+    - rng: the random stream every random choice in this simulation is drawn from, shared with simu_graph and every
+    Person
+    - profiler: the FrameProfiler that times each phase of frame, or None when profiling is off
+    - infection_log: the InfectionLog of every infection in this simulation, including the people infected at the
+    start, the same log as simu_graph.infection_log. Setting both to None turns logging off.
 
     Representation Invarients:
     - all(all(person.family_id == family for person in self.id_to_family[family]) for family in self.id_to_family)
@@ -41,81 +63,267 @@ class Simulation:
     frame_num: int
     infected: set[Person]
     recover_period: int  # in frames
+    recovery_shape: Optional[float]
     brownian: bool
+    mobility: Optional[MobilityModel]
     id_to_family: dict[int, list[Person]]
     fps: int
+    world_size: int
+    rng: RandomStream
+    profiler: Optional[FrameProfiler]
+    infection_log: Optional[InfectionLog]
 
     def __init__(self, num_family: int, family_size: int, speed: int, recover_period: int, initial_infected: int,
-                 close_contact_distance: int, fps: int, infectivity: float, brownian: bool = False) -> None:
+                 close_contact_distance: int, fps: int, infectivity: float, brownian: bool = False,
+                 seed: Optional[int] = None, recovery_shape: Optional[float] = None,
+                 world_size: int = WORLD_SIZE, mobility: Optional[MobilityModel] = None) -> None:
         """
-        Initialize the simulation class
+        Initialize the simulation class. Two simulations with the same parameters and the same seed run exactly
+        the same way. If mobility is not None, it moves everyone instead of brownian, and is started here.
         Preconditions:
             - initial_infected <= num_family * family_size
+            - recovery_shape is None or recovery_shape > 0
+            - world_size > 2 * NODE_RADIUS
         """
         self.recover_period = recover_period
-        self.simu_graph = Graph(infectivity)
+        self.recovery_shape = recovery_shape
+        self.rng = RandomStream(seed)
+        self.simu_graph = Graph(infectivity, self.rng)
         self.infected = set()
         self.frame_num = 0
         self.num_family = num_family
         self.family_size = family_size
         self.close_contact_distance = close_contact_distance
         self.brownian = brownian
+        self.mobility = mobility
         self.fps = fps
-        self.id_to_family = {}
+        self.world_size = world_size
+        self.profiler = None
 
-        person_id = 0
+        population = 0
         for i in range(1, num_family + 1):
-            added = []
-            # Create a clique between this family, and add each person in the family to the suspectible
-            # set in the graph
+            # Add each person in this family to the graph, which lists them in the family and in the suspectible set
             for _ in range(family_size):
-                x = random.randint(NODE_RADIUS, 500 - NODE_RADIUS)
-                y = random.randint(NODE_RADIUS, 500 - NODE_RADIUS)
-                person = Person(x, y, speed, i, person_id, fps)
-                person_id += 1
-                for one in added:
-                    self.simu_graph.build_family_edge(one, person)
-                added.append(person)
-                self.simu_graph.susceptible.add(person)
-                self.simu_graph.id_to_person[person.id] = person
-            self.id_to_family[i] = added
+                x = self.rng.randint(NODE_RADIUS, world_size - NODE_RADIUS)
+                y = self.rng.randint(NODE_RADIUS, world_size - NODE_RADIUS)
+                self.simu_graph.add_person(Person(x, y, speed, i, population, fps, self.rng))
+                population += 1
+        self.id_to_family = self.simu_graph.id_to_family
+        if mobility is not None:
+            people = list(self.simu_graph.id_to_person.values())
+            mobility.start(np.array([person.location for person in people], dtype=np.float64), self._speeds(people),
+                           np.array([person.family_id for person in people], dtype=np.int64), self.rng.generator,
+                           NODE_RADIUS, world_size - NODE_RADIUS)
+        self.infection_log = InfectionLog(population)
+        self.simu_graph.infection_log = self.infection_log
 
         # Randomly choose initial_infected number of people to be infected
-        for _ in range(initial_infected):
-            to_infect = self.simu_graph.susceptible.pop()
-            to_infect.infection_frame = 0
-            self.simu_graph.infected.add(to_infect)
-            to_infect.state = INFECTED
+        initial = self.rng.sample(population, initial_infected)
+        self._infect_all([self.simu_graph.id_to_person[to_infect_id] for to_infect_id in initial])
+        self.infection_log.record_initial(0, initial)
 
     def frame(self) -> None:
         """This function update the graph for the next frame. This update incudes the location of all the Person,
         the close contact edges, and the states of each Person.
         """
+        profiler = self.profiler
+        if profiler is not None:
+            start = time.perf_counter()
         self.frame_num += 1
         # move
-        for person in self.simu_graph.infected | self.simu_graph.susceptible | self.simu_graph.recovered:
-            if self.brownian:
-                person.make_move_brownian()
-            else:
-                person.make_move_person()
+        upper = self.world_size - NODE_RADIUS
+        if self.mobility is not None:
+            people = list(self.simu_graph.id_to_person.values())
+            positions = self.mobility.move(np.array([person.location for person in people], dtype=np.float64),
+                                           self._speeds(people), self.rng.generator, NODE_RADIUS, upper)
+            for person, location in zip(people, positions.tolist()):
+                person.location = location
+        else:
+            for person in self.simu_graph.id_to_person.values():
+                if self.brownian:
+                    person.make_move_brownian(NODE_RADIUS, upper)
+                else:
+                    person.make_move_person(NODE_RADIUS, upper)
+        if profiler is not None:
+            moved = time.perf_counter()
+            profiler.record('movement', moved - start)
         # infect
         # has_none = False
-        for person in self.infected:
-            # print(self.simu_graph.make_infection(self.close_contact_distance))
-            person.state = INFECTED
-            person.infection_frame = self.frame_num
-            self.simu_graph.susceptible.remove(person)
-            self.simu_graph.infected.add(person)
-        self.simu_graph.update_edge(self.frame_num, self.recover_period, self.close_contact_distance)
+        self._infect_all(sorted(self.infected, key=person_id))
+        if profiler is not None:
+            transitioned = time.perf_counter()
+            profiler.record('transitions', transitioned - moved)
+        self.simu_graph.update_edge(self.frame_num, self.close_contact_distance)
+        if profiler is not None:
+            updated = time.perf_counter()
+            profiler.record('update_edge', updated - transitioned)
 
-        self.infected = self.simu_graph.make_infection(self.close_contact_distance)
+        self.infected = self.simu_graph.make_infection(self.close_contact_distance, self.frame_num)
+        if profiler is not None:
+            end = time.perf_counter()
+            profiler.record('make_infection', end - updated)
+            profiler.record('simulation_frame', end - start)
+
+    def _speeds(self, people: list[Person]) -> np.ndarray:
+        """Return how far each of people moves in one frame, for the mobility model."""
+        return np.array([person.speed / person.frames_per_second for person in people], dtype=np.float64)
+
+    def set_brownian(self, brownian: bool) -> None:
+        """Make everyone move in brownian motion from now on if brownian is True, and in straight lines otherwise,
+        with make_move_brownian and make_move_person instead of any mobility model.
+        """
+        self.brownian = brownian
+        self.mobility = None
+
+    def _infect_all(self, people: list[Person]) -> None:
+        """Infect people as of the current frame, drawing their recovery periods in the order of people."""
+        periods = recovery_periods(self.rng.generator, self.recover_period, self.recovery_shape, len(people))
+        for person, period in zip(people, periods.tolist()):
+            self.simu_graph.infect(person, self.frame_num, period)
+
+    def enable_profiling(self, profiler: Optional[FrameProfiler] = None) -> FrameProfiler:
+        """Start timing every phase of frame, and counting pairs tested, edges and infection trials, into profiler.
+        If profiler is None, use a new FrameProfiler. Return the profiler in use.
+        """
+        self.profiler = FrameProfiler() if profiler is None else profiler
+        self.simu_graph.profiler = self.profiler
+        return self.profiler
+
+    def disable_profiling(self) -> None:
+        """Stop profiling. frame goes back to doing no timing at all."""
+        self.profiler = None
+        self.simu_graph.profiler = None
+
+    def counts(self) -> tuple[int, int, int]:
+        """Return the number of (susceptible, infected, recovered) people."""
+        return len(self.simu_graph.susceptible), len(self.simu_graph.infected), len(self.simu_graph.recovered)
+
+    def family_count(self, family_id: int) -> tuple[int, int, int]:
+        """Return the number of (susceptible, infected, recovered) people in the family with id family_id.
+
+        Preconditions:
+        - family_id in self.id_to_family
+        """
+        susceptible, infected, recovered = self.simu_graph.family_counts[family_id]
+        return susceptible, infected, recovered
+
+    def get_state(self) -> dict[str, Any]:
+        """Return everything needed to carry on this simulation exactly where it is, as numbers and NumPy arrays
+        with one row per person in order of id. The profiler is not part of the state, and recovery_shape and
+        mobility are left out when they are None.
+        """
+        people = list(self.simu_graph.id_to_person.values())
+        contacts = sorted({(edge.person1.id, edge.person2.id) for patient in self.simu_graph.infected
+                           for edge in patient.close_contact.values()})
+        state = {
+            'engine': 'simulation', 'num_family': self.num_family, 'family_size': self.family_size,
+            'recover_period': self.recover_period, 'close_contact_distance': self.close_contact_distance,
+            'fps': self.fps, 'infectivity': self.simu_graph.infectivity, 'brownian': self.brownian,
+            'world_size': self.world_size, 'frame_num': self.frame_num,
+            'locations': np.array([person.location for person in people], dtype=np.float64).reshape(-1, 2),
+            'moves': np.array([person.move for person in people], dtype=np.int64).reshape(-1, 2),
+            'speeds': np.array([person.speed for person in people], dtype=np.float64),
+            'last_moves': np.array([person.last_move for person in people], dtype=np.float64).reshape(-1, 2),
+            'states': np.array([person.state for person in people], dtype=np.int8),
+            'family_ids': np.array([person.family_id for person in people], dtype=np.int32),
+            'infection_frames': np.array([-1 if person.infection_frame is None else person.infection_frame
+                                          for person in people], dtype=np.int64),
+            'recovery_frames': np.array([-1 if person.recovery_frame is None else person.recovery_frame
+                                         for person in people], dtype=np.int64),
+            'contacts': np.array(contacts, dtype=np.int64).reshape(-1, 2),
+            'pending': np.array(sorted(person.id for person in self.infected), dtype=np.int64)
+        }
+        if self.recovery_shape is not None:
+            state['recovery_shape'] = self.recovery_shape
+        if self.mobility is not None:
+            state['mobility'] = self.mobility.name
+            state.update({'mobility_' + key: value for key, value in self.mobility.get_state().items()})
+        state.update({'rng_' + key: value for key, value in self.rng.get_state().items()})
+        if self.infection_log is not None:
+            state.update({'log_' + key: value for key, value in self.infection_log.get_state().items()})
+        return state
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any], seed: Optional[int] = None) -> Simulation:
+        """Return a simulation that carries on from a state returned by get_state, running exactly as the simulation
+        it was taken from would have. If seed is not None, the simulation draws from a new random stream seeded with
+        seed instead, which forks the run into a different future from the same present.
+
+        Preconditions:
+        - state['engine'] == 'simulation'
+        """
+        simulation = cls.__new__(cls)
+        simulation.num_family = int(state['num_family'])
+        simulation.family_size = int(state['family_size'])
+        simulation.recover_period = int(state['recover_period'])
+        simulation.recovery_shape = float(state['recovery_shape']) if 'recovery_shape' in state else None
+        simulation.close_contact_distance = int(state['close_contact_distance'])
+        simulation.fps = int(state['fps'])
+        simulation.world_size = int(state['world_size'])
+        simulation.brownian = bool(state['brownian'])
+        simulation.mobility = None
+        if 'mobility' in state:
+            simulation.mobility = mobility_from_state(str(state['mobility']), {key[9:]: state[key] for key in state
+                                                                               if key.startswith('mobility_')})
+        simulation.frame_num = int(state['frame_num'])
+        simulation.profiler = None
+        if seed is None:
+            simulation.rng = RandomStream.from_state({key[4:]: state[key] for key in state if key.startswith('rng_')})
+        else:
+            simulation.rng = RandomStream(seed)
+        simulation.simu_graph = Graph(float(state['infectivity']), simulation.rng)
+
+        for i, (location, move, speed, last_move, person_state, family_id, infection_frame, recovery_frame) in \
+                enumerate(zip(state['locations'].tolist(), state['moves'].tolist(), state['speeds'].tolist(),
+                              state['last_moves'].tolist(), state['states'].tolist(), state['family_ids'].tolist(),
+                              state['infection_frames'].tolist(), state['recovery_frames'].tolist())):
+            person = Person(location[0], location[1], 1, family_id, i, simulation.fps, simulation.rng, move)
+            person.location = location
+            person.speed = speed
+            person.last_move = tuple(last_move)
+            person.state = person_state
+            person.infection_frame = None if infection_frame < 0 else infection_frame
+            person.recovery_frame = None if recovery_frame < 0 else recovery_frame
+            simulation.simu_graph.add_person(person)
+        simulation.id_to_family = simulation.simu_graph.id_to_family
+
+        people = simulation.simu_graph.id_to_person
+        for infected_id, susceptible_id in state['contacts'].tolist():
+            simulation.simu_graph.add_close_contact(people[infected_id], people[susceptible_id])
+        simulation.infected = {people[i] for i in state['pending'].tolist()}
+
+        simulation.infection_log = None
+        if 'log_frames' in state:
+            simulation.infection_log = InfectionLog.from_state({key[4:]: state[key] for key in state
+                                                                if key.startswith('log_')})
+        simulation.simu_graph.infection_log = simulation.infection_log
+        return simulation
+
+    def snapshot(self) -> Snapshot:
+        """Return a Snapshot of the current frame, which stays the same while the simulation carries on."""
+        people = list(self.simu_graph.id_to_person.values())
+        sources = []
+        targets = []
+        for patient in self.simu_graph.infected:
+            for other in patient.close_contact:
+                sources.append(patient.id)
+                targets.append(other)
+        family_counts = np.zeros((self.num_family + 1, 3), dtype=np.int64)
+        for family, counts in self.simu_graph.family_counts.items():
+            family_counts[family] = counts
+        return Snapshot(self.frame_num, self.num_family, self.family_size, self.world_size,
+                        np.array([person.location for person in people], dtype=np.float64).reshape(-1, 2),
+                        np.array([person.state for person in people], dtype=np.int8),
+                        np.array([person.family_id for person in people], dtype=np.int32),
+                        np.array(sources, dtype=np.int64), np.array(targets, dtype=np.int64),
+                        self.counts(), family_counts)
 
 
 if __name__ == '__main__':
     import python_ta
 
     python_ta.check_all(config={
-        'extra-imports': [],  # the names (strs) of imported modules
+        'extra-imports': ['numpy'],  # the names (strs) of imported modules
         'allowed-io': [],  # the names (strs) of functions that call print/open/input
         'disable': ['E9999', 'R0902', 'R0913', 'R0914'],
         'max-line-length': 120
@@ -0,0 +1,89 @@
+"""
+The snapshot class
+A Snapshot is a copy of everything the frontend draws from one frame of a simulation, stored as a few compact
+arrays. Both Simulation and VectorSimulation can make one, and a snapshot never changes after it is made, so the
+frontend can draw it while the simulation carries on in another thread.
+"""
+from __future__ import annotations
+import numpy as np
+# from python_ta.contracts import check_contracts
+
+
+# @check_contracts
+class Snapshot:
+    """The state of a simulation at the end of one frame. Row i of every per person array belongs to the person with
+    id i, and people are numbered family by family, so family f holds the ids (f - 1) * family_size up to
+    f * family_size - 1. The arrays are read only.
+
+    Instance Attributes:
+    - frame_num: the frame of the simulation this is a snapshot of
+    - num_family: number of families in the simulation
+    - family_size: number of people in one family
+    - world_size: the side of the square people move in, in pixels
+    - positions: an (n, 2) float array of the location of every person
+    - states: the state of every person, SUSCEPTIBLE, INFECTED or RECOVERED
+    - family_ids: the family of every person
+    - contact_sources: the infected side of every close contact
+    - contact_targets: the susceptible side of every close contact, so contact i joins contact_sources[i] and
+    contact_targets[i]
+    - counts: the number of (susceptible, infected, recovered) people
+    - family_counts: a (num_family + 1, 3) int array whose row f is the number of (susceptible, infected,
+    recovered) people in family f. Row 0 is unused.
+
+    Representation Invariants:
+    - self.positions.shape == (self.num_family * self.family_size, 2)
+    - len(self.states) == len(self.family_ids) == self.num_family * self.family_size
+    - len(self.contact_sources) == len(self.contact_targets)
+    - sum(self.counts) == len(self.states)
+    """
+    frame_num: int
+    num_family: int
+    family_size: int
+    world_size: int
+    positions: np.ndarray
+    states: np.ndarray
+    family_ids: np.ndarray
+    contact_sources: np.ndarray
+    contact_targets: np.ndarray
+    counts: tuple[int, int, int]
+    family_counts: np.ndarray
+
+    def __init__(self, frame_num: int, num_family: int, family_size: int, world_size: int, positions: np.ndarray,
+                 states: np.ndarray, family_ids: np.ndarray, contact_sources: np.ndarray,
+                 contact_targets: np.ndarray, counts: tuple[int, int, int], family_counts: np.ndarray) -> None:
+        """Initialize the snapshot. The arrays are made read only, so they must not be arrays the simulation will
+        go on changing.
+        """
+        self.frame_num = frame_num
+        self.num_family = num_family
+        self.family_size = family_size
+        self.world_size = world_size
+        self.positions = positions
+        self.states = states
+        self.family_ids = family_ids
+        self.contact_sources = contact_sources
+        self.contact_targets = contact_targets
+        self.counts = counts
+        self.family_counts = family_counts
+        for array in (positions, states, family_ids, contact_sources, contact_targets, family_counts):
+            array.flags.writeable = False
+
+    def family_count(self, family_id: int) -> tuple[int, int, int]:
+        """Return the number of (susceptible, infected, recovered) people in the family with id family_id.
+
+        Preconditions:
+        - 1 <= family_id <= self.num_family
+        """
+        susceptible, infected, recovered = self.family_counts[family_id]
+        return int(susceptible), int(infected), int(recovered)
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['numpy'],  # the names (strs) of imported modules
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'disable': ['E9999', 'R0902', 'R0913'],
+        'max-line-length': 120
+    })
@@ -0,0 +1,141 @@
+"""
+The spatial grid class
+This class buckets Persons into square cells by location so that the people near a given point can be found
+without checking every Person in the simulation. The close_pairs function does the same search over arrays of
+locations.
+"""
+
+from __future__ import annotations
+from typing import Iterable
+import numpy as np
+# from python_ta.contracts import check_contracts
+from person_edge import Person
+
+
+# @check_contracts
+class SpatialGrid:
+    """A uniform grid over the simulation square. Each Person is stored in the cell that contains its location, so
+    every Person within cell_size of a point is in that point's cell or one of the eight cells around it.
+
+    Instance Attributes:
+    - cell_size: the side length of one cell in pixels, this is the largest radius near() can answer
+    - cells: a dictionary mapping the (column, row) of a cell to the list of Persons inside that cell
+
+    Representation Invariants:
+    - self.cell_size > 0
+    - all(self.cell_of(person.location) == cell for cell in self.cells for person in self.cells[cell])
+    """
+    cell_size: float
+    cells: dict[tuple[int, int], list[Person]]
+
+    def __init__(self, cell_size: float) -> None:
+        """Initialize an empty grid with square cells of side cell_size.
+
+        Preconditions:
+        - cell_size > 0
+        """
+        self.cell_size = cell_size
+        self.cells = {}
+
+    def cell_of(self, location: list[float] | tuple[float, float]) -> tuple[int, int]:
+        """Return the (column, row) of the cell containing location."""
+        return int(location[0] // self.cell_size), int(location[1] // self.cell_size)
+
+    def rebuild(self, people: Iterable[Person]) -> None:
+        """Empty the grid and insert every Person in people at their current location. This is called once per
+        frame after everyone has moved, which costs one dictionary insert per Person.
+        """
+        self.cells = {}
+        for person in people:
+            self.insert(person)
+
+    def insert(self, person: Person) -> None:
+        """Add person to the cell containing their current location."""
+        cell = self.cell_of(person.location)
+        if cell in self.cells:
+            self.cells[cell].append(person)
+        else:
+            self.cells[cell] = [person]
+
+    def near(self, location: list[float] | tuple[float, float]) -> list[Person]:
+        """Return every Person in the cell containing location and the eight cells around it. This includes
+        everyone within cell_size of location, along with some people who are further away.
+        """
+        column, row = self.cell_of(location)
+        found = []
+        for i in range(column - 1, column + 2):
+            for j in range(row - 1, row + 2):
+                if (i, j) in self.cells:
+                    found.extend(self.cells[(i, j)])
+        return found
+
+
+def close_pairs(positions: np.ndarray, sources: np.ndarray, targets: np.ndarray,
+                radius: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Return (source indices, target indices, distances) for every pair of one index in sources and one index in
+    targets whose rows of positions are less than radius apart. This is the array version of SpatialGrid: the
+    targets are sorted by cell, and each source looks up where the nine cells around it start in that order.
+
+    Preconditions:
+    - positions.ndim == 2 and positions.shape[1] == 2
+    - radius >= 0
+    """
+    # Nothing is less than a radius of 0 apart
+    if len(sources) == 0 or len(targets) == 0 or radius <= 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0)
+    cells = np.floor(positions / radius).astype(np.int64)
+    # Shift the cells so that every cell and its neighbours have a non-negative column and row
+    cells -= cells.min(axis=0) - 1
+    rows = int(cells[:, 1].max()) + 2
+    keys = cells[:, 0] * rows + cells[:, 1]
+
+    order = np.argsort(keys[targets], kind='stable')
+    sorted_keys = keys[targets][order]
+    source_keys = keys[sources]
+    num_cells = int(keys.max()) + rows + 2
+    if num_cells <= 8 * len(positions):
+        # Few enough cells for a table of where each cell starts in sorted_keys, which is faster to look up
+        # than a binary search
+        cell_counts = np.bincount(sorted_keys, minlength=num_cells)
+        cell_starts = np.cumsum(cell_counts) - cell_counts
+    else:
+        cell_counts, cell_starts = None, None
+
+    found_sources, found_targets = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            query = source_keys + dx * rows + dy
+            if cell_counts is not None:
+                low, counts = cell_starts[query], cell_counts[query]
+            else:
+                low = np.searchsorted(sorted_keys, query, side='left')
+                counts = np.searchsorted(sorted_keys, query, side='right') - low
+            total = int(counts.sum())
+            if total == 0:
+                continue
+            # For each source, the indices low, low + 1, ..., low + count - 1 into the sorted targets
+            offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            found_sources.append(np.repeat(sources, counts))
+            found_targets.append(targets[order[np.repeat(low, counts) + offsets]])
+    if not found_sources:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, np.empty(0)
+
+    source_index = np.concatenate(found_sources)
+    target_index = np.concatenate(found_targets)
+    difference = positions[source_index] - positions[target_index]
+    distance_squared = np.einsum('ij,ij->i', difference, difference)
+    in_range = distance_squared < radius * radius
+    return source_index[in_range], target_index[in_range], np.sqrt(distance_squared[in_range])
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['numpy'],  # the names (strs) of imported modules
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'disable': ['E9999'],
+        'max-line-length': 120
+    })
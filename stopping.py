@@ -0,0 +1,167 @@
+"""
+This file contains the criteria a batch run stops on.
+A run steps its simulation until one of its stopping criteria is met. By default that is extinction, when nobody is
+infected, but a sweep can also stop its runs once they reach a target attack rate, a frame count, or a steady state
+where the counts have stopped changing, so no CPU is spent on frames that add nothing to the results. Every
+criterion only looks at the counts of the frames so far, so the same criteria can be handed to any number of
+worker processes.
+"""
+from __future__ import annotations
+import argparse
+from typing import Optional
+# from python_ta.contracts import check_contracts
+
+
+class StoppingCriterion:
+    """A condition that ends a run. This is an abstract class: use one of its subclasses.
+
+    Instance Attributes:
+    - name: the name of the criterion, as reported by first_met
+    """
+    name: str
+
+    def should_stop(self, frame_num: int, series: list[tuple[int, int, int]]) -> bool:
+        """Return whether the run should stop now, at frame frame_num, after the (susceptible, infected, recovered)
+        counts in series.
+
+        Preconditions:
+        - series != []
+        """
+        raise NotImplementedError
+
+
+# @check_contracts
+class Extinction(StoppingCriterion):
+    """Stops a run once nobody is infected, after which nothing can change."""
+
+    def __init__(self) -> None:
+        self.name = 'extinction'
+
+    def should_stop(self, frame_num: int, series: list[tuple[int, int, int]]) -> bool:
+        """Return whether nobody is infected."""
+        return series[-1][1] == 0
+
+
+# @check_contracts
+class AttackRate(StoppingCriterion):
+    """Stops a run once at least a given fraction of the people have been infected.
+
+    Instance Attributes:
+    - target: the fraction of the people who have to have been infected
+
+    Representation Invariants:
+    - 0 <= self.target <= 1
+    """
+    target: float
+
+    def __init__(self, target: float) -> None:
+        self.name = 'attack_rate'
+        self.target = target
+
+    def should_stop(self, frame_num: int, series: list[tuple[int, int, int]]) -> bool:
+        """Return whether the fraction of people who are no longer susceptible has reached target."""
+        population = sum(series[-1])
+        return population - series[-1][0] >= self.target * population
+
+
+# @check_contracts
+class MaxFrames(StoppingCriterion):
+    """Stops a run at a given frame of the simulation, counted from the start of the simulation even if the run
+    started later, such as from a checkpoint.
+
+    Instance Attributes:
+    - max_frames: the frame to stop at
+
+    Representation Invariants:
+    - self.max_frames >= 0
+    """
+    max_frames: int
+
+    def __init__(self, max_frames: int) -> None:
+        self.name = 'max_frames'
+        self.max_frames = max_frames
+
+    def should_stop(self, frame_num: int, series: list[tuple[int, int, int]]) -> bool:
+        """Return whether the simulation has reached max_frames."""
+        return frame_num >= self.max_frames
+
+
+# @check_contracts
+class SteadyState(StoppingCriterion):
+    """Stops a run once none of the counts has moved by more than a given fraction of the people over a window of
+    frames, such as when an outbreak has settled into a level it stays at.
+
+    Instance Attributes:
+    - window: the number of frames the counts have to stay steady for
+    - tolerance: the most each count may move over the window, as a fraction of the people
+
+    Representation Invariants:
+    - self.window >= 1
+    - 0 <= self.tolerance <= 1
+    """
+    window: int
+    tolerance: float
+
+    def __init__(self, window: int, tolerance: float = 0.0) -> None:
+        self.name = 'steady_state'
+        self.window = window
+        self.tolerance = tolerance
+
+    def should_stop(self, frame_num: int, series: list[tuple[int, int, int]]) -> bool:
+        """Return whether every count has stayed within tolerance of the people over the last window frames."""
+        if len(series) <= self.window:
+            return False
+        recent = series[-self.window - 1:]
+        allowed = self.tolerance * sum(series[-1])
+        return all(max(counts[i] for counts in recent) - min(counts[i] for counts in recent) <= allowed
+                   for i in range(3))
+
+
+def default_criteria(max_frames: Optional[int] = None) -> list[StoppingCriterion]:
+    """Return the criteria a run stops on when none are given: extinction, and max_frames if it is not None."""
+    criteria = [Extinction()]
+    if max_frames is not None:
+        criteria.append(MaxFrames(max_frames))
+    return criteria
+
+
+def first_met(criteria: list[StoppingCriterion], frame_num: int,
+              series: list[tuple[int, int, int]]) -> Optional[StoppingCriterion]:
+    """Return the first of criteria that says the run should stop now, or None if the run should go on."""
+    for criterion in criteria:
+        if criterion.should_stop(frame_num, series):
+            return criterion
+    return None
+
+
+def add_stopping_arguments(parser: argparse.ArgumentParser) -> None:
+    """Add the command line arguments for the stopping criteria to parser, besides --max-frames."""
+    parser.add_argument('--target-attack-rate', type=float, default=None,
+                        help='stop once this fraction of the people has been infected')
+    parser.add_argument('--steady-window', type=int, default=None,
+                        help='stop once the counts have been steady for this many frames')
+    parser.add_argument('--steady-tolerance', type=float, default=0.0,
+                        help='the fraction of the people the counts may move by and still be steady')
+
+
+def criteria_from_arguments(args: argparse.Namespace) -> list[StoppingCriterion]:
+    """Return the stopping criteria of the command line arguments added by add_stopping_arguments, along with
+    extinction and --max-frames.
+    """
+    criteria = default_criteria(args.max_frames)
+    if args.target_attack_rate is not None:
+        criteria.append(AttackRate(args.target_attack_rate))
+    if args.steady_window is not None:
+        criteria.append(SteadyState(args.steady_window, args.steady_tolerance))
+    return criteria
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['argparse'],  # the names (strs) of imported modules
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'disable': ['E9999'],
+        'max-line-length': 120
+    })
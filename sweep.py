@@ -0,0 +1,271 @@
+"""
+This file runs parameter sweeps.
+A sweep runs every combination of a grid of parameters several times, spreading the runs over a pool of processes,
+and collects the headline numbers of every run into one table. Finished runs can be written to a CSV file as they
+arrive, so a sweep that is cancelled part way through picks up where it left off when it is run again. For example:
+
+    python sweep.py --infectivity 0.1 0.2 0.3 --close-contact-distance 50 100 --replicates 10 --output sweep.csv
+"""
+from __future__ import annotations
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import sys
+import threading
+from typing import Any, Callable, Optional
+import numpy as np
+from batch import run_headless, summarize
+from mobility import MOBILITY_MODELS
+from simulation import WORLD_SIZE
+from stopping import StoppingCriterion, add_stopping_arguments, criteria_from_arguments
+
+# The parameters of run_headless, with the defaults used for any parameter a grid leaves out
+DEFAULT_PARAMETERS = {
+    'num_family': 5, 'family_size': 5, 'speed': 6, 'recover_period': 72, 'initial_infected': 1,
+    'close_contact_distance': 100, 'fps': 24, 'infectivity': 0.2, 'brownian': False, 'vectorized': False,
+    'max_frames': None, 'recovery_shape': None, 'world_size': WORLD_SIZE, 'mobility': None
+}
+METRICS = ['peak_infected', 'time_to_peak', 'attack_rate', 'duration']
+
+
+def parameter_grid(**axes: list[Any]) -> list[dict[str, Any]]:
+    """Return one dictionary of parameters for every combination of the values in axes, filling in
+    DEFAULT_PARAMETERS for the parameters that are not given.
+
+    >>> len(parameter_grid(infectivity=[0.1, 0.2], speed=[1, 5, 10]))
+    6
+    """
+    names = list(axes)
+    points = []
+    for values in itertools.product(*(axes[name] for name in names)):
+        point = dict(DEFAULT_PARAMETERS)
+        point.update(zip(names, values))
+        points.append(point)
+    return points
+
+
+def replicate_seed(base_seed: int, parameters: dict[str, Any], replicate: int) -> int:
+    """Return the seed of one replicate of one point of a sweep. The seed only depends on its arguments, so a
+    resumed sweep gives its remaining runs the same seeds they would have had.
+    """
+    digest = [ord(character) for character in parameter_key(parameters)]
+    return int(np.random.SeedSequence([base_seed, replicate, *digest]).generate_state(1)[0])
+
+
+def parameter_key(parameters: dict[str, Any]) -> str:
+    """Return a string that identifies parameters, the same for any order of the keys."""
+    return json.dumps(parameters, sort_keys=True)
+
+
+def run_replicate(task: tuple[dict[str, Any], int, int, Optional[list[StoppingCriterion]]]) -> dict[str, Any]:
+    """Run one replicate in a worker process and return its row of the results table. task is
+    (parameters, replicate, seed, criteria), where criteria are the stopping criteria of the run, or None to stop
+    when nobody is infected.
+    """
+    parameters, replicate, seed, criteria = task
+    series = run_headless(**parameters, seed=seed, criteria=criteria)
+    row = dict(parameters)
+    row.update({'replicate': replicate, 'seed': seed})
+    row.update(summarize(series))
+    return row
+
+
+class Sweep:
+    """A grid of parameters, each run replicates times over a pool of processes.
+
+    Instance Attributes:
+    - points: the parameters of every point in the grid
+    - replicates: how many times each point is run
+    - base_seed: the seed the seed of every run is derived from
+    - results_path: a CSV file that finished runs are appended to, or None to keep them only in memory
+    - processes: the number of worker processes, or None to use every core
+    - criteria: the stopping criteria of every run, or None to run until nobody is infected
+    - results: the rows of every finished run, including the ones read back from results_path
+
+    Representation Invariants:
+    - self.replicates >= 1
+    - self.processes is None or self.processes >= 1
+    """
+    points: list[dict[str, Any]]
+    replicates: int
+    base_seed: int
+    results_path: Optional[str]
+    processes: Optional[int]
+    criteria: Optional[list[StoppingCriterion]]
+    results: list[dict[str, Any]]
+    _cancelled: threading.Event
+
+    def __init__(self, points: list[dict[str, Any]], replicates: int, base_seed: int = 0,
+                 results_path: Optional[str] = None, processes: Optional[int] = None,
+                 criteria: Optional[list[StoppingCriterion]] = None) -> None:
+        """Initialize the sweep, reading back any runs already finished in results_path."""
+        self.points = points
+        self.replicates = replicates
+        self.base_seed = base_seed
+        self.results_path = results_path
+        self.processes = processes
+        self.criteria = criteria
+        self.results = []
+        self._cancelled = threading.Event()
+        if results_path is not None and os.path.exists(results_path):
+            self.results = read_results(results_path)
+
+    def rows_by_point(self) -> dict[str, list[dict[str, Any]]]:
+        """Return the finished rows of every point of the grid, by the parameter_key of the point. A row belongs to
+        a point when it has the same value for every parameter of the point.
+        """
+        by_point = {parameter_key(point): [] for point in self.points}
+        for names in {tuple(sorted(point)) for point in self.points}:
+            for row in self.results:
+                key = parameter_key({name: row.get(name) for name in names})
+                if key in by_point:
+                    by_point[key].append(row)
+        return by_point
+
+    def pending_tasks(self) -> list[tuple[dict[str, Any], int, int, Optional[list[StoppingCriterion]]]]:
+        """Return (parameters, replicate, seed, criteria) for every run that has not finished yet."""
+        by_point = self.rows_by_point()
+        tasks = []
+        for point in self.points:
+            done = {row['replicate'] for row in by_point[parameter_key(point)]}
+            for replicate in range(self.replicates):
+                if replicate not in done:
+                    tasks.append((point, replicate, replicate_seed(self.base_seed, point, replicate), self.criteria))
+        return tasks
+
+    def run(self, on_result: Optional[Callable[[dict[str, Any]], None]] = None) -> list[dict[str, Any]]:
+        """Run every pending replicate and return the rows of all finished runs. Rows arrive in the order the runs
+        finish; each one is added to results, appended to results_path and passed to on_result as it arrives.
+
+        If cancel is called or the user presses Ctrl+C, the worker processes are stopped and the rows finished so
+        far are returned. Running the sweep again only runs the replicates that are still missing.
+        """
+        self._cancelled.clear()
+        tasks = self.pending_tasks()
+        if not tasks:
+            return self.results
+        pool = multiprocessing.Pool(self.processes)
+        try:
+            for row in pool.imap_unordered(run_replicate, tasks):
+                self.results.append(row)
+                if self.results_path is not None:
+                    append_result(self.results_path, row)
+                if on_result is not None:
+                    on_result(row)
+                if self._cancelled.is_set():
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pool.terminate()
+            pool.join()
+        return self.results
+
+    def cancel(self) -> None:
+        """Stop a running sweep once the next run finishes. This is safe to call from another thread."""
+        self._cancelled.set()
+
+    def table(self) -> list[dict[str, Any]]:
+        """Return one row per point of the grid with the mean of every metric over the finished replicates of that
+        point, along with the number of finished replicates.
+        """
+        by_point = self.rows_by_point()
+        table = []
+        for point in self.points:
+            rows = by_point[parameter_key(point)]
+            summary = dict(point)
+            summary['replicates'] = len(rows)
+            for metric in METRICS:
+                summary[metric] = sum(row[metric] for row in rows) / len(rows) if rows else None
+            table.append(summary)
+        return table
+
+
+def append_result(path: str, row: dict[str, Any]) -> None:
+    """Append row to the CSV file at path, writing the header first if the file is new."""
+    is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+    with open(path, 'a', newline='', encoding='utf-8') as file:
+        writer = csv.DictWriter(file, fieldnames=list(row))
+        if is_new:
+            writer.writeheader()
+        writer.writerow(row)
+
+
+def read_results(path: str) -> list[dict[str, Any]]:
+    """Return the rows of a results file written by append_result, with every value converted back from text."""
+    with open(path, newline='', encoding='utf-8') as file:
+        return [{name: read_value(value) for name, value in row.items()} for row in csv.DictReader(file)]
+
+
+def read_value(value: str) -> Any:
+    """Return a value of a results file converted back from text: None for an empty cell, the number or bool it
+    spells, or otherwise the text itself, such as the name of a mobility model.
+
+    >>> [read_value(''), read_value('True'), read_value('0.5'), read_value('brownian')]
+    [None, True, 0.5, 'brownian']
+    """
+    if value == '':
+        return None
+    try:
+        return json.loads(value.lower())
+    except ValueError:
+        return value
+
+
+def parse_bool(text: str) -> bool:
+    """Return the bool a command line value spells, true or false in any case."""
+    if text.lower() not in ('true', 'false'):
+        raise argparse.ArgumentTypeError(f'{text!r} is not true or false')
+    return text.lower() == 'true'
+
+
+def parse_arguments(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    """Return the command line arguments of a sweep. Every parameter takes one or more values."""
+    parser = argparse.ArgumentParser(description='Run a grid of simulations over every core.')
+    parser.add_argument('--families', type=int, nargs='+', default=[5])
+    parser.add_argument('--family-size', type=int, nargs='+', default=[5])
+    parser.add_argument('--speed', type=int, nargs='+', default=[6])
+    parser.add_argument('--recover-period', type=int, nargs='+', default=[72])
+    parser.add_argument('--recovery-shape', type=float, nargs='+', default=[None],
+                        help='draw each recovery period from a gamma distribution with this shape')
+    parser.add_argument('--initial-infected', type=int, nargs='+', default=[1])
+    parser.add_argument('--close-contact-distance', type=int, nargs='+', default=[100])
+    parser.add_argument('--infectivity', type=float, nargs='+', default=[0.2])
+    parser.add_argument('--world-size', type=int, nargs='+', default=[WORLD_SIZE])
+    parser.add_argument('--fps', type=int, nargs='+', default=[24])
+    parser.add_argument('--brownian', type=parse_bool, nargs='+', default=[False],
+                        help='true to move people in brownian motion, false for straight lines')
+    parser.add_argument('--mobility', choices=list(MOBILITY_MODELS), nargs='+', default=[None],
+                        help='move people with these mobility models instead')
+    parser.add_argument('--vectorized', action='store_true', help='use VectorSimulation')
+    parser.add_argument('--max-frames', type=int, default=None, help='stop every run after this many frames')
+    add_stopping_arguments(parser)
+    parser.add_argument('--replicates', type=int, default=10, help='runs of every point in the grid')
+    parser.add_argument('--seed', type=int, default=0, help='the seed every run seed is derived from')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes, every core by default')
+    parser.add_argument('--output', default=None, help='CSV file of finished runs, used to resume the sweep')
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """Run a sweep from the command line arguments and print the mean of every metric for each point."""
+    args = parse_arguments(argv)
+    points = parameter_grid(num_family=args.families, family_size=args.family_size, speed=args.speed,
+                            recover_period=args.recover_period, recovery_shape=args.recovery_shape,
+                            initial_infected=args.initial_infected,
+                            close_contact_distance=args.close_contact_distance, infectivity=args.infectivity,
+                            world_size=args.world_size, fps=args.fps, brownian=args.brownian,
+                            mobility=args.mobility, vectorized=[args.vectorized])
+    sweep = Sweep(points, args.replicates, args.seed, args.output, args.processes, criteria_from_arguments(args))
+    sweep.run()
+    names = list(dict.fromkeys(name for point in points for name in point))
+    writer = csv.DictWriter(sys.stdout, fieldnames=names + ['replicates'] + METRICS)
+    writer.writeheader()
+    writer.writerows(sweep.table())
+
+
+if __name__ == '__main__':
+    main()
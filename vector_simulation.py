@@ -0,0 +1,408 @@
+"""
+This file contains the array based simulation.
+It runs the same model as Simulation, but stores every person as one row of a few NumPy arrays, so each step of a
+frame is a single array operation over all people instead of one method call per Person.
+"""
+from __future__ import annotations
+import json
+import time
+from typing import Any, Optional
+import numpy as np
+# from python_ta.contracts import check_contracts
+from infection_log import InfectionLog
+from mobility import MobilityModel, make_mobility, mobility_from_state
+from person_edge import SUSCEPTIBLE, INFECTED, RECOVERED, CONTACT, FAMILY, contact_infection_chance, \
+    family_infections
+from profiler import FrameProfiler
+from recovery import RecoverySchedule, recovery_periods
+from simulation import NODE_RADIUS, WORLD_SIZE
+from snapshot import Snapshot
+from spatial_grid import close_pairs
+
+LOWER_BOUND = NODE_RADIUS
+
+
+class PersonView:
+    """A read only view of one person in a VectorSimulation, with the same attributes the frontend reads from a
+    Person. Nothing is copied, so the view always shows the current frame.
+
+    Instance Attributes:
+    - id: the id of the person, which is also their row in the simulation arrays
+
+    Representation Invariants:
+    - 0 <= self.id < len(self._simulation.states)
+    """
+    __slots__ = ('_simulation', 'id')
+    _simulation: VectorSimulation
+    id: int
+
+    def __init__(self, simulation: VectorSimulation, identification: int) -> None:
+        """Initialize a view of the person with id identification in simulation."""
+        self._simulation = simulation
+        self.id = identification
+
+    @property
+    def family_id(self) -> int:
+        """The family this person belongs to."""
+        return int(self._simulation.family_ids[self.id])
+
+    @property
+    def state(self) -> int:
+        """The state of this person: SUSCEPTIBLE, INFECTED or RECOVERED."""
+        return int(self._simulation.states[self.id])
+
+    @property
+    def location(self) -> tuple[float, float]:
+        """The location of this person in pixels."""
+        x, y = self._simulation.positions[self.id]
+        return float(x), float(y)
+
+    @property
+    def infection_frame(self) -> Optional[int]:
+        """The frame this person was infected, or None if they have never been infected."""
+        frame = int(self._simulation.infection_frames[self.id])
+        return None if frame < 0 else frame
+
+
+# @check_contracts
+class VectorSimulation:
+    """A simulation that stores people as a structure of arrays, where row i of every array belongs to the person
+    with id i. People are numbered family by family, so family f holds the ids (f - 1) * family_size up to
+    f * family_size - 1.
+
+    Instance Attributes:
+    - num_family: number of family in this simulation
+    - family_size: number of people in one family
+    - close_contact_distance: the distance in pixels under which two people are close contacts
+    - recover_period: after recover_period number of frames a person will recover, or on average if
+    recovery_shape is not None
+    - recovery_shape: the shape of the gamma distribution each person's recovery period is drawn from when they are
+    infected, or None for everyone to recover after exactly recover_period frames
+    - infectivity: the rate of infection in the simulation
+    - mobility: the MobilityModel that moves everyone each frame
+    - fps: frames per second in this simulation
+    - world_size: the side of the square people move in, in pixels. People stay NODE_RADIUS away from its edges.
+    - frame_num: the number of frames that have passed in this simulation
+    - positions: an (n, 2) float array of the location of every person
+    - speeds: how far each person moves each frame, which each mobility model uses in its own way
+    - states: the state of every person, SUSCEPTIBLE, INFECTED or RECOVERED
+    - family_ids: the family of every person
+    - infection_frames: the frame every person was infected, or -1 if they have never been infected
+    - recovery_frames: the frame every person recovers in, or -1 if they have never been infected
+    - recovery_schedule: a RecoverySchedule of the ids of every infected person by the frame they recover in
+    - pending: the ids of the people who become infected at the start of the next frame
+    - contact_sources: the infected side of every close contact found in the last frame
+    - contact_targets: the susceptible side of every close contact found in the last frame
+    - rng: the random number generator this simulation draws from
+    - id_to_family: a dictionary mapping the id of each family to PersonViews of its members
+    - family_counts: a (num_family + 1, 3) int array whose row f is the number of (susceptible, infected,
+    recovered) people in family f, updated whenever people change state. Row 0 is unused.
+    - profiler: the FrameProfiler that times each phase of frame, or None when profiling is off
+    - infection_log: the InfectionLog of every infection in this simulation, including the people infected at the
+    start, or None to log nothing
+
+    Representation Invariants:
+    - self.positions.shape == (self.num_family * self.family_size, 2)
+    - all(state in {SUSCEPTIBLE, INFECTED, RECOVERED} for state in self.states)
+    - all(self.states[self.infection_frames < 0] == SUSCEPTIBLE)
+    - self.frame_num >= 0
+    """
+    num_family: int
+    family_size: int
+    close_contact_distance: int
+    recover_period: int
+    recovery_shape: Optional[float]
+    infectivity: float
+    mobility: MobilityModel
+    fps: int
+    world_size: int
+    frame_num: int
+    positions: np.ndarray
+    speeds: np.ndarray
+    states: np.ndarray
+    family_ids: np.ndarray
+    infection_frames: np.ndarray
+    recovery_frames: np.ndarray
+    recovery_schedule: RecoverySchedule
+    pending: np.ndarray
+    contact_sources: np.ndarray
+    contact_targets: np.ndarray
+    rng: np.random.Generator
+    id_to_family: dict[int, list[PersonView]]
+    family_counts: np.ndarray
+    profiler: Optional[FrameProfiler]
+    infection_log: Optional[InfectionLog]
+
+    def __init__(self, num_family: int, family_size: int, speed: int, recover_period: int, initial_infected: int,
+                 close_contact_distance: int, fps: int, infectivity: float, brownian: bool = False,
+                 seed: Optional[int] = None, recovery_shape: Optional[float] = None,
+                 world_size: int = WORLD_SIZE, mobility: Optional[MobilityModel] = None) -> None:
+        """Initialize the simulation with the same parameters as Simulation. Passing the same seed gives the same
+        run every time. People move with mobility, which is started here, or if mobility is None, in brownian motion
+        if brownian is True and in straight lines otherwise.
+
+        Preconditions:
+            - initial_infected <= num_family * family_size
+            - speed >= 1
+            - recovery_shape is None or recovery_shape > 0
+            - world_size > 2 * NODE_RADIUS
+        """
+        self.num_family = num_family
+        self.family_size = family_size
+        self.close_contact_distance = close_contact_distance
+        self.recover_period = recover_period
+        self.recovery_shape = recovery_shape
+        self.infectivity = infectivity
+        self.fps = fps
+        self.world_size = world_size
+        self.frame_num = 0
+        self.rng = np.random.default_rng(seed)
+        self.profiler = None
+
+        population = num_family * family_size
+        self.positions = self.rng.integers(LOWER_BOUND, world_size - NODE_RADIUS, size=(population, 2),
+                                           endpoint=True)
+        self.positions = self.positions.astype(np.float64)
+        self.speeds = np.full(population, float(speed))
+        self.states = np.full(population, SUSCEPTIBLE, dtype=np.int8)
+        self.family_ids = np.repeat(np.arange(1, num_family + 1, dtype=np.int32), family_size)
+        self.mobility = make_mobility('brownian' if brownian else 'straight') if mobility is None else mobility
+        self.mobility.start(self.positions, self.speeds, self.family_ids, self.rng, LOWER_BOUND,
+                            world_size - NODE_RADIUS)
+        self.infection_frames = np.full(population, -1, dtype=np.int64)
+        self.recovery_frames = np.full(population, -1, dtype=np.int64)
+        self.recovery_schedule = RecoverySchedule()
+        self.pending = np.empty(0, dtype=np.int64)
+        self.contact_sources = np.empty(0, dtype=np.int64)
+        self.contact_targets = np.empty(0, dtype=np.int64)
+
+        initial = self.rng.choice(population, size=initial_infected, replace=False)
+        self.family_counts = np.zeros((num_family + 1, 3), dtype=np.int64)
+        self.family_counts[1:, 0] = family_size
+        self._infect(initial)
+        self.infection_log = InfectionLog(population)
+        self.infection_log.record_initial(0, initial)
+
+        self.id_to_family = {family: [PersonView(self, i) for i in range((family - 1) * family_size,
+                                                                         family * family_size)]
+                             for family in range(1, num_family + 1)}
+
+    def frame(self) -> None:
+        """Update every array for the next frame: move everyone, infect the people found last frame, recover the
+        people scheduled to recover in this frame, and find who is infected next frame.
+        """
+        profiler = self.profiler
+        if profiler is not None:
+            start = time.perf_counter()
+        self.frame_num += 1
+        self.positions = self.mobility.move(self.positions, self.speeds, self.rng, LOWER_BOUND,
+                                            self.world_size - NODE_RADIUS)
+        if profiler is not None:
+            moved = time.perf_counter()
+            profiler.record('movement', moved - start)
+
+        self._infect(self.pending)
+        recovering = self.recovery_schedule.pop_ids(self.frame_num)
+        self.states[recovering] = RECOVERED
+        self._move_between_counts(recovering, 1, 2)
+        if profiler is not None:
+            transitioned = time.perf_counter()
+            profiler.record('transitions', transitioned - moved)
+
+        self.pending = self._find_infections()
+        if profiler is not None:
+            end = time.perf_counter()
+            profiler.record('find_infections', end - transitioned)
+            profiler.record('simulation_frame', end - start)
+
+    def _infect(self, people: np.ndarray) -> None:
+        """Infect people as of the current frame and schedule their recoveries."""
+        self.states[people] = INFECTED
+        self.infection_frames[people] = self.frame_num
+        periods = recovery_periods(self.rng, self.recover_period, self.recovery_shape, len(people))
+        self.recovery_frames[people] = self.frame_num + periods + 1
+        self.recovery_schedule.add_many(self.recovery_frames[people], np.asarray(people, dtype=np.int64))
+        self._move_between_counts(people, 0, 1)
+
+    def _move_between_counts(self, people: np.ndarray, old: int, new: int) -> None:
+        """Move people from column old to column new of family_counts."""
+        moved = np.bincount(self.family_ids[people], minlength=self.num_family + 1)
+        self.family_counts[:, old] -= moved
+        self.family_counts[:, new] += moved
+
+    def set_brownian(self, brownian: bool) -> None:
+        """Make everyone move in brownian motion from now on if brownian is True, and in straight lines in new
+        random directions otherwise.
+        """
+        self.mobility = make_mobility('brownian' if brownian else 'straight')
+        self.mobility.start(self.positions, self.speeds, self.family_ids, self.rng, LOWER_BOUND,
+                            self.world_size - NODE_RADIUS)
+
+    def _find_infections(self) -> np.ndarray:
+        """Return the ids of the susceptible people who get infected this frame.
+
+        The chances are the same as Edge.infect: a close contact in a different family infects with chance
+        infectivity - ((close_contact_distance - distance) / close_contact_distance) ** 2, and each infected
+        family member infects with chance infectivity / 100. A susceptible person with k infected family members
+        therefore escapes their family with chance (1 - infectivity / 100) ** k.
+        """
+        infected = np.flatnonzero(self.states == INFECTED)
+        susceptible_mask = self.states == SUSCEPTIBLE
+        susceptible = np.flatnonzero(susceptible_mask)
+        self.contact_sources, self.contact_targets, distances = close_pairs(
+            self.positions, infected, susceptible, self.close_contact_distance)
+
+        if self.profiler is not None:
+            self.profiler.record('contacts_found', len(self.contact_sources))
+            self.profiler.record('infection_trials', len(self.contact_sources) + len(susceptible))
+        newly_infected = np.zeros(len(self.states), dtype=bool)
+        other_family = self.family_ids[self.contact_sources] != self.family_ids[self.contact_targets]
+        chance = contact_infection_chance(distances[other_family], self.close_contact_distance, self.infectivity)
+        contact_hits = np.flatnonzero(other_family)[self.rng.random(len(chance)) < chance]
+        newly_infected[self.contact_targets[contact_hits]] = True
+
+        infected_per_family = np.bincount(self.family_ids[infected], minlength=self.num_family + 1)
+        exposure = infected_per_family[self.family_ids[susceptible]]
+        family_hits, picks = family_infections(self.rng.random(len(susceptible)), exposure, self.infectivity)
+        newly_infected[susceptible[family_hits]] = True
+
+        if self.infection_log is not None:
+            # picks are the first infected family member in order of id to infect each person, as in Graph
+            self._log_infections(infected, infected_per_family, contact_hits, distances, susceptible[family_hits],
+                                 picks)
+        return np.flatnonzero(newly_infected & susceptible_mask)
+
+    def _log_infections(self, infected: np.ndarray, infected_per_family: np.ndarray, contact_hits: np.ndarray,
+                        distances: np.ndarray, family_infectees: np.ndarray, picks: np.ndarray) -> None:
+        """Log the infections found in this frame, which happen at the start of the next frame. contact_hits are
+        the indices of the close contacts that infected, and family member picks[i] of the infected members of the
+        family of family_infectees[i] infected them. Someone infected by more than one person is logged as infected
+        through their first close contact, or through their family if no close contact infected them.
+        """
+        contact_infectees, first = np.unique(self.contact_targets[contact_hits], return_index=True)
+        contact_hits = contact_hits[first]
+        by_family = ~np.isin(family_infectees, contact_infectees)
+        family_infectees = family_infectees[by_family]
+        picks = picks[by_family]
+        # People are numbered family by family, so the infected ids are grouped by family
+        family_starts = np.concatenate(([0], np.cumsum(infected_per_family)[:-1]))
+        family_infectors = infected[family_starts[self.family_ids[family_infectees]] + picks]
+        family_distances = np.linalg.norm(self.positions[family_infectors] - self.positions[family_infectees], axis=1)
+        self.infection_log.record(
+            self.frame_num + 1,
+            np.concatenate((self.contact_sources[contact_hits], family_infectors)),
+            np.concatenate((contact_infectees, family_infectees)),
+            np.concatenate((np.full(len(contact_hits), CONTACT), np.full(len(family_infectees), FAMILY))),
+            np.concatenate((distances[contact_hits], family_distances)))
+
+    def enable_profiling(self, profiler: Optional[FrameProfiler] = None) -> FrameProfiler:
+        """Start timing every phase of frame into profiler, or into a new FrameProfiler if profiler is None.
+        Return the profiler in use.
+        """
+        self.profiler = FrameProfiler() if profiler is None else profiler
+        return self.profiler
+
+    def disable_profiling(self) -> None:
+        """Stop profiling. frame goes back to doing no timing at all."""
+        self.profiler = None
+
+    def counts(self) -> tuple[int, int, int]:
+        """Return the number of (susceptible, infected, recovered) people."""
+        counts = np.bincount(self.states, minlength=RECOVERED + 1)
+        return int(counts[SUSCEPTIBLE]), int(counts[INFECTED]), int(counts[RECOVERED])
+
+    def family_count(self, family_id: int) -> tuple[int, int, int]:
+        """Return the number of (susceptible, infected, recovered) people in the family with id family_id.
+
+        Preconditions:
+        - 1 <= family_id <= self.num_family
+        """
+        susceptible, infected, recovered = self.family_counts[family_id]
+        return int(susceptible), int(infected), int(recovered)
+
+    def get_state(self) -> dict[str, Any]:
+        """Return everything needed to carry on this simulation exactly where it is: its parameters, a copy of
+        every array and the state of its random number generator. The profiler is not part of the state, and
+        recovery_shape is left out when it is None.
+        """
+        state = {
+            'engine': 'vector', 'num_family': self.num_family, 'family_size': self.family_size,
+            'recover_period': self.recover_period, 'close_contact_distance': self.close_contact_distance,
+            'fps': self.fps, 'infectivity': self.infectivity, 'mobility': self.mobility.name,
+            'world_size': self.world_size, 'frame_num': self.frame_num,
+            'rng': json.dumps(self.rng.bit_generator.state)
+        }
+        if self.recovery_shape is not None:
+            state['recovery_shape'] = self.recovery_shape
+        for name in ('positions', 'speeds', 'states', 'family_ids', 'infection_frames',
+                     'recovery_frames', 'pending', 'contact_sources', 'contact_targets', 'family_counts'):
+            state[name] = getattr(self, name).copy()
+        state.update({'mobility_' + key: value for key, value in self.mobility.get_state().items()})
+        if self.infection_log is not None:
+            state.update({'log_' + key: value for key, value in self.infection_log.get_state().items()})
+        return state
+
+    @classmethod
+    def from_state(cls, state: dict[str, Any], seed: Optional[int] = None) -> VectorSimulation:
+        """Return a simulation that carries on from a state returned by get_state, running exactly as the simulation
+        it was taken from would have. If seed is not None, the simulation draws from a new generator seeded with
+        seed instead, which forks the run into a different future from the same present.
+
+        Preconditions:
+        - state['engine'] == 'vector'
+        """
+        simulation = cls.__new__(cls)
+        simulation.num_family = int(state['num_family'])
+        simulation.family_size = int(state['family_size'])
+        simulation.recover_period = int(state['recover_period'])
+        simulation.recovery_shape = float(state['recovery_shape']) if 'recovery_shape' in state else None
+        simulation.close_contact_distance = int(state['close_contact_distance'])
+        simulation.infectivity = float(state['infectivity'])
+        simulation.fps = int(state['fps'])
+        simulation.world_size = int(state['world_size'])
+        simulation.frame_num = int(state['frame_num'])
+        simulation.profiler = None
+        simulation.rng = np.random.default_rng(seed)
+        if seed is None:
+            simulation.rng.bit_generator.state = json.loads(str(state['rng']))
+        for name in ('positions', 'speeds', 'states', 'family_ids', 'infection_frames',
+                     'recovery_frames', 'pending', 'contact_sources', 'contact_targets', 'family_counts'):
+            setattr(simulation, name, np.array(state[name]))
+        simulation.mobility = mobility_from_state(str(state['mobility']), {key[9:]: state[key] for key in state
+                                                                           if key.startswith('mobility_')})
+        simulation.recovery_schedule = RecoverySchedule()
+        infected = np.flatnonzero(simulation.states == INFECTED)
+        simulation.recovery_schedule.add_many(simulation.recovery_frames[infected], infected)
+        simulation.id_to_family = {family: [PersonView(simulation, i) for i in range(
+            (family - 1) * simulation.family_size, family * simulation.family_size)]
+            for family in range(1, simulation.num_family + 1)}
+        simulation.infection_log = None
+        if 'log_frames' in state:
+            simulation.infection_log = InfectionLog.from_state({key[4:]: state[key] for key in state
+                                                                if key.startswith('log_')})
+        return simulation
+
+    def snapshot(self) -> Snapshot:
+        """Return a Snapshot of the current frame, which stays the same while the simulation carries on."""
+        return Snapshot(self.frame_num, self.num_family, self.family_size, self.world_size, self.positions.copy(),
+                        self.states.copy(), self.family_ids.copy(), self.contact_sources.copy(),
+                        self.contact_targets.copy(), self.counts(), self.family_counts.copy())
+
+    def person(self, identification: int) -> PersonView:
+        """Return a view of the person with the given id.
+
+        Preconditions:
+        - 0 <= identification < len(self.states)
+        """
+        return PersonView(self, identification)
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['json', 'numpy'],  # the names (strs) of imported modules
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'disable': ['E9999', 'R0902', 'R0913'],
+        'max-line-length': 120
+    })
@@ -0,0 +1,246 @@
+"""
+The simulation worker class
+A SimulationWorker steps a simulation in a background thread, so a slow frame of the simulation never holds up the
+pygame event loop. The frontend talks to the worker only through commands, such as run, stop and replace, and reads
+the simulation only through the Snapshots the worker publishes.
+"""
+from __future__ import annotations
+import queue
+import threading
+import time
+from typing import Any, Optional
+from recording import Recorder
+from simulation import Simulation
+from snapshot import Snapshot
+from vector_simulation import VectorSimulation
+
+# The most steps owed time can add up to at a multiplier of 1, so a long stall does not make the simulation jump
+# ahead
+MAX_STEPS_BEHIND = 4
+# How often, in seconds, a stopped worker checks whether the frontend has taken the last snapshot
+POLL_INTERVAL = 0.01
+
+
+class SimulationWorker:
+    """Steps a simulation in a background thread on a fixed timestep of 1 / fps seconds, times a fast forward
+    multiplier, and publishes a Snapshot of the latest frame whenever the frontend has taken the previous one.
+
+    Publishing a snapshot only swaps one reference, so the frontend always reads a whole snapshot: either the one it
+    drew last time or the newest one.
+
+    Instance Attributes:
+    - running: whether the frontend last asked the worker to run or to stop
+
+    Private Instance Attributes:
+    - _commands: the commands the frontend has sent and the worker has not carried out yet, as (name, value)
+    - _generation: the number of simulations the frontend has handed over, so a snapshot of a replaced simulation
+    is never returned
+    - _latest: (generation, snapshot) of the newest snapshot published, or None before the first
+    - _wanted: set when the frontend has taken the latest snapshot and wants a new one
+    - _thread: the thread the simulation runs in
+
+    The remaining private attributes belong to the worker thread:
+    - _simulation: the simulation being stepped, or None before the first is handed over
+    - _simulation_generation: the generation of _simulation
+    - _stepping: whether the simulation is being stepped
+    - _multiplier: simulation seconds per real second, or 0 to step as fast as possible
+    - _stale: whether the simulation has changed since the last snapshot was published
+    - _recorder: the Recorder every frame of the simulation is recorded with, or None when not recording
+
+    Representation Invariants:
+    - self._multiplier >= 0
+    """
+    running: bool
+    _commands: queue.Queue
+    _generation: int
+    _latest: Optional[tuple[int, Snapshot]]
+    _wanted: threading.Event
+    _thread: threading.Thread
+    _simulation: Optional[Simulation | VectorSimulation]
+    _simulation_generation: int
+    _stepping: bool
+    _multiplier: int
+    _stale: bool
+    _recorder: Optional[Recorder]
+
+    def __init__(self) -> None:
+        """Initialize the worker and start its thread, which waits for a simulation to be handed over."""
+        self.running = False
+        self._commands = queue.Queue()
+        self._generation = 0
+        self._latest = None
+        self._wanted = threading.Event()
+        self._wanted.set()
+        self._simulation = None
+        self._simulation_generation = 0
+        self._stepping = False
+        self._multiplier = 1
+        self._stale = False
+        self._recorder = None
+        self._thread = threading.Thread(target=self._work, daemon=True)
+        self._thread.start()
+
+    def replace(self, simulation: Simulation | VectorSimulation) -> None:
+        """Hand simulation over to the worker in place of the current one. The frontend must not touch simulation
+        afterwards.
+        """
+        self._generation += 1
+        self._commands.put(('replace', (self._generation, simulation)))
+
+    def run(self) -> None:
+        """Start stepping the simulation."""
+        self.running = True
+        self._commands.put(('run', None))
+
+    def stop(self) -> None:
+        """Stop stepping the simulation."""
+        self.running = False
+        self._commands.put(('stop', None))
+
+    def set_speed(self, multiplier: int) -> None:
+        """Step multiplier simulation seconds per real second, or as fast as possible if multiplier is 0.
+
+        Preconditions:
+        - multiplier >= 0
+        """
+        self._commands.put(('speed', multiplier))
+
+    def set_brownian(self, brownian: bool) -> None:
+        """Make people in the simulation move in brownian motion or not."""
+        self._commands.put(('brownian', brownian))
+
+    def set_profiler(self, profiler: Any) -> None:
+        """Profile the simulation into profiler, a FrameProfiler, or stop profiling if profiler is None."""
+        self._commands.put(('profiler', profiler))
+
+    def set_recorder(self, recorder: Optional[Recorder]) -> None:
+        """Record every frame of the simulation from now on with recorder, or stop recording if recorder is None.
+        The worker closes the recorder when recording stops, so the frontend must not touch it afterwards.
+        """
+        self._commands.put(('recorder', recorder))
+
+    def latest(self) -> Optional[Snapshot]:
+        """Return the newest snapshot of the simulation handed over last, or None if there is none yet, and ask the
+        worker for a new one.
+        """
+        latest = self._latest
+        self._wanted.set()
+        if latest is None or latest[0] != self._generation:
+            return None
+        return latest[1]
+
+    def quit(self) -> None:
+        """Stop the worker thread and wait for it to finish."""
+        self._commands.put(('quit', None))
+        self._thread.join()
+
+    def _work(self) -> None:
+        """Carry out commands and step the simulation until told to quit. This runs in the worker thread."""
+        # The first step runs as soon as stepping starts
+        step_debt = 1.0
+        was_stepping = False
+        last_time = time.perf_counter()
+        while True:
+            stepping = self._stepping and self._simulation is not None
+            if stepping and (self._multiplier == 0 or step_debt >= 1):
+                timeout = 0
+            elif stepping:
+                timeout = (1 - step_debt) / (self._simulation.fps * self._multiplier)
+            else:
+                # Nothing to step, so wait for the next command, or until the frontend takes the last snapshot
+                timeout = POLL_INTERVAL if self._stale else None
+            if not self._apply_commands(timeout):
+                return
+
+            now = time.perf_counter()
+            if not self._stepping or self._simulation is None:
+                step_debt = 1.0
+                was_stepping = False
+            elif self._multiplier == 0:
+                self._step(1)
+                was_stepping = True
+            else:
+                if was_stepping:
+                    step_debt += (now - last_time) * self._simulation.fps * self._multiplier
+                steps = min(int(step_debt), MAX_STEPS_BEHIND * self._multiplier)
+                # Time the simulation could not catch up on is dropped instead of being owed forever
+                step_debt = min(step_debt - steps, 1.0)
+                self._step(steps)
+                was_stepping = True
+            last_time = now
+            self._publish()
+
+    def _step(self, steps: int) -> None:
+        """Run steps frames of the simulation."""
+        for _ in range(steps):
+            self._simulation.frame()
+            if self._recorder is not None:
+                self._recorder.record(self._simulation.snapshot())
+        if steps > 0:
+            self._stale = True
+            if self._simulation.profiler is not None:
+                self._simulation.profiler.record('steps', steps)
+
+    def _apply_commands(self, timeout: Optional[float]) -> bool:
+        """Carry out every command sent so far, first waiting up to timeout seconds for one, or for ever if timeout
+        is None. Return False if the worker was told to quit.
+        """
+        try:
+            name, value = self._commands.get(timeout=timeout) if timeout != 0 else self._commands.get_nowait()
+            while True:
+                if name == 'quit':
+                    self._apply('recorder', None)
+                    return False
+                self._apply(name, value)
+                name, value = self._commands.get_nowait()
+        except queue.Empty:
+            return True
+
+    def _apply(self, name: str, value: Any) -> None:
+        """Carry out the command name with its value."""
+        if name == 'replace':
+            # A recording only ever holds one simulation
+            self._apply('recorder', None)
+            self._simulation_generation, self._simulation = value
+            self._stale = True
+        elif name == 'recorder':
+            if self._recorder is not None:
+                self._recorder.close()
+            self._recorder = value
+            if value is not None and self._simulation is not None:
+                value.record(self._simulation.snapshot())
+        elif name == 'run':
+            self._stepping = True
+        elif name == 'stop':
+            self._stepping = False
+        elif name == 'speed':
+            self._multiplier = value
+        elif name == 'brownian' and self._simulation is not None:
+            self._simulation.set_brownian(value)
+        elif name == 'profiler' and self._simulation is not None:
+            if value is None:
+                self._simulation.disable_profiling()
+            else:
+                self._simulation.enable_profiling(value)
+
+    def _publish(self) -> None:
+        """Publish a snapshot of the simulation if it has changed and the frontend has taken the last one."""
+        if self._stale and self._simulation is not None and self._wanted.is_set():
+            self._wanted.clear()
+            profiler = self._simulation.profiler
+            start = time.perf_counter()
+            self._latest = (self._simulation_generation, self._simulation.snapshot())
+            self._stale = False
+            if profiler is not None:
+                profiler.record('snapshot', time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    import python_ta
+
+    python_ta.check_all(config={
+        'extra-imports': ['queue', 'threading', 'time'],  # the names (strs) of imported modules
+        'allowed-io': [],  # the names (strs) of functions that call print/open/input
+        'disable': ['E9999', 'R0902'],
+        'max-line-length': 120
+    })